@@ -1,6 +1,8 @@
 from pydantic import BaseModel
 from typing import Optional
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from database.async_db import executar_no_banco
 from services.ia import gerar_configuracao_grafico
 from utils.planilhas import ler_planilha
 from api.v1.endpoints.chat import user_dataframes  # importa o contexto em memória
@@ -16,14 +18,15 @@ router = APIRouter()
 async def gerar_grafico(req: RequisicaoGrafico):
     try:
         from services.user_facebook import buscar_user_id_por_facebook_id
-        from services.meta_extractor import carregar_account_ads_facebook_dataframe
-        user_id = buscar_user_id_por_facebook_id(req.facebook_id)
+        from services.meta_extractor import carregar_account_ads_facebook_dataframe, COLUNAS_ANALISE
+        # Consultas ao banco e chamada à IA fora do event loop
+        user_id = await executar_no_banco(buscar_user_id_por_facebook_id, req.facebook_id)
         if not user_id:
             raise HTTPException(status_code=400, detail="Usuário do Facebook não encontrado.")
-        df = carregar_account_ads_facebook_dataframe(user_id=user_id)
+        df = await executar_no_banco(carregar_account_ads_facebook_dataframe, user_id=user_id, colunas=COLUNAS_ANALISE)
         if df is None or df.empty:
             raise HTTPException(status_code=400, detail="Não há dados suficientes no banco para gerar o gráfico.")
-        return gerar_configuracao_grafico(df, req.pedido)
+        return await run_in_threadpool(gerar_configuracao_grafico, df, req.pedido)
     except Exception as e:
         import traceback
         print("\n🔴 ERRO NA ROTA /gerar-grafico:")
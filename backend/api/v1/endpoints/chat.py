@@ -1,16 +1,75 @@
-from fastapi import APIRouter, Form, File, UploadFile, HTTPException, Request, Body
-from services.ia import gerar_insight_ia, gerar_configuracao_grafico
+from fastapi import APIRouter, Form, File, UploadFile, HTTPException, Request, Body, Query
+from fastapi.responses import StreamingResponse
+from services.ia import gerar_insight_ia, gerar_insight_ia_stream, gerar_configuracao_grafico, ErroRespostaIA
+from services.pipeline import executar_em_thread
 from utils.planilhas import ler_planilha
-from typing import Optional
+from typing import Literal, Optional
 import json
 import pandas as pd
 import traceback
+from fastapi.concurrency import run_in_threadpool, iterate_in_threadpool
+from database.async_db import executar_no_banco
+from utils.paginacao import codificar_cursor, decodificar_cursor, blocos_dataframe, fluxo_lista_json, fluxo_objeto_json, fluxo_ndjson, evento_sse, CABECALHOS_SSE
 
 # Armazenamento em memória (pode ser substituído por Redis/banco depois)
 user_dataframes = {}
+versoes_contexto = {}
 
 router = APIRouter()
 
+def carregar_dados_do_usuario(facebook_id: Optional[str], account_id: Optional[str], qualquer_conta: bool = False):
+    """
+    Resolve o usuário e a conta e carrega os insights (bloqueante: nos endpoints async, chamar via executar_no_banco).
+    Com qualquer_conta=True, se a conta não tiver dados usa qualquer dado do usuário.
+    """
+    from services.user_facebook import buscar_user_id_por_facebook_id
+    from services.meta_extractor import carregar_account_ads_facebook_dataframe, buscar_id_conta_por_identificador, COLUNAS_ANALISE
+
+    if not facebook_id or facebook_id == 'default':
+        return None
+    user_id = buscar_user_id_por_facebook_id(facebook_id)
+    if not user_id:
+        return None
+    # Se account_id for passado (como string "undefined" ou valor real), trate-o
+    acc_id = account_id if account_id and account_id != "undefined" else None
+
+    # Tenta resolver ID da plataforma para ID interno
+    if acc_id and isinstance(acc_id, str):
+        resolved_id = buscar_id_conta_por_identificador(acc_id)
+        if resolved_id:
+            acc_id = resolved_id
+
+    df = carregar_account_ads_facebook_dataframe(account_id=acc_id, user_id=user_id, colunas=COLUNAS_ANALISE)
+    if (df is None or df.empty) and qualquer_conta:
+        # Verificar se há dados na tabela global sem filtro de conta
+        df_check = carregar_account_ads_facebook_dataframe(user_id=user_id, limit=5, colunas=COLUNAS_ANALISE)
+        if not df_check.empty:
+            df = df_check # Usa qualquer dado do usuário se o filtro de conta falhar
+    return df
+
+TERMOS_GRAFICO = ["gráfico", "visualização", "barras", "pizza", "linha", "mostrar gráfico", "plotar"]
+AVISO_GRAFICO_SEM_DADOS = "Para gerar gráficos, por favor selecione uma conta de anúncios com dados nas configurações ou na barra lateral."
+
+async def carregar_dados_da_pergunta(facebook_id: Optional[str], account_id: Optional[str]) -> pd.DataFrame:
+    # Consultas ao banco rodam no pool de threads do banco, sem travar o event loop
+    df = await executar_no_banco(carregar_dados_do_usuario, facebook_id, account_id, qualquer_conta=True)
+    
+    # Se não achou usuário ou dados, cria um DataFrame vazio ou tenta responder sem dados
+    if df is None or df.empty:
+        # Em vez de erro, vamos tentar responder genericamente usando a IA
+        # Criamos um DF dummy apenas para não quebrar a função, ou adaptamos a função de IA
+        # Mas a função gerar_insight_ia espera um DF.
+        # Vamos criar um DF com uma linha de aviso.
+        df = pd.DataFrame([{"Aviso": "Nenhum dado de conta conectado ou selecionado. Responda com base no conhecimento geral."}])
+    return df
+
+def pede_grafico(pergunta: str) -> bool:
+    pedido = pergunta.lower()
+    return any(t in pedido for t in TERMOS_GRAFICO)
+
+def sem_dados(df: pd.DataFrame) -> bool:
+    return df.shape[0] <= 1 and "Aviso" in df.columns
+
 @router.post("/perguntar", tags=["IA"])
 async def responder(
     request: Request,
@@ -19,55 +78,18 @@ async def responder(
     account_id: Optional[str] = Form(None)
 ):
     try:
-        from services.user_facebook import buscar_user_id_por_facebook_id
-        from services.meta_extractor import carregar_account_ads_facebook_dataframe, buscar_id_conta_por_identificador
-        
-        # Tenta buscar dados se houver facebook_id
-        df = None
-        user_id = None
-        
-        if facebook_id and facebook_id != 'default':
-            user_id = buscar_user_id_por_facebook_id(facebook_id)
-            if user_id:
-                # Se account_id for passado (como string "undefined" ou valor real), trate-o
-                acc_id = account_id if account_id and account_id != "undefined" else None
-                
-                # Tenta resolver ID da plataforma para ID interno
-                if acc_id and isinstance(acc_id, str):
-                    resolved_id = buscar_id_conta_por_identificador(acc_id)
-                    if resolved_id:
-                        acc_id = resolved_id
-                        
-                df = carregar_account_ads_facebook_dataframe(account_id=acc_id, user_id=user_id)
-        
-        # Se não achou usuário ou dados, cria um DataFrame vazio ou tenta responder sem dados
-        if df is None or df.empty:
-            # Em vez de erro, vamos tentar responder genericamente usando a IA
-            # Criamos um DF dummy apenas para não quebrar a função, ou adaptamos a função de IA
-            # Mas a função gerar_insight_ia espera um DF.
-            # Vamos criar um DF com uma linha de aviso.
-            # Verificar se há dados na tabela global sem filtro de conta
-            if user_id:
-                 df_check = carregar_account_ads_facebook_dataframe(user_id=user_id, limit=5)
-                 if not df_check.empty:
-                     df = df_check # Usa qualquer dado do usuário se o filtro de conta falhar
-            
-            if df is None or df.empty:
-                 df = pd.DataFrame([{"Aviso": "Nenhum dado de conta conectado ou selecionado. Responda com base no conhecimento geral."}])
-        
-        pedido = pergunta.lower()
-        termos_grafico = ["gráfico", "visualização", "barras", "pizza", "linha", "mostrar gráfico", "plotar"]
+        df = await carregar_dados_da_pergunta(facebook_id, account_id)
         
-        if any(t in pedido for t in termos_grafico):
+        if pede_grafico(pergunta):
              # Se pediu gráfico sem dados, aí sim pode ser problema, mas vamos deixar a IA tentar ou avisar
-             if df.shape[0] <= 1 and "Aviso" in df.columns:
-                  return {"resposta": "Para gerar gráficos, por favor selecione uma conta de anúncios com dados nas configurações ou na barra lateral."}
+             if sem_dados(df):
+                  return {"resposta": AVISO_GRAFICO_SEM_DADOS}
                   
-             configuracao = gerar_configuracao_grafico(df, pergunta)
+             configuracao = await run_in_threadpool(gerar_configuracao_grafico, df, pergunta)
              comando_chart = f"[CHART:{json.dumps(configuracao)}]"
              return {"resposta": comando_chart}
              
-        resposta_ia = gerar_insight_ia(df, pergunta)
+        resposta_ia = await run_in_threadpool(gerar_insight_ia, df, pergunta)
         return {"resposta": resposta_ia}
 
     except HTTPException as http_error:
@@ -78,6 +100,48 @@ async def responder(
         # Não retornar 500 para o frontend não mostrar erro genérico, tentar mensagem amigável
         return {"resposta": f"Desculpe, tive um problema técnico: {str(e)}"}
 
+@router.post("/perguntar/stream", tags=["IA"])
+async def responder_stream(
+    request: Request,
+    pergunta: str = Form(...),
+    facebook_id: str = Form(None),
+    account_id: Optional[str] = Form(None)
+):
+    """
+    Variante de /perguntar em server-sent events (text/event-stream). Eventos:
+      - texto: {"texto": pedaço da resposta}, à medida que o Gemini gera;
+      - chart: {"resposta": "[CHART:{...}]"}, o comando de gráfico inteiro num evento só;
+      - erro: {"resposta": mensagem amigável}, como o /perguntar devolveria (inclusive falhas do Gemini no
+        meio do fluxo: os pedaços de texto já enviados não fazem parte de uma resposta válida);
+      - fim: {} ao terminar.
+    """
+    async def eventos():
+        # Comentário SSE logo de saída: cabeçalhos e o primeiro byte chegam antes da consulta ao banco
+        yield ": ok\n\n"
+        try:
+            df = await carregar_dados_da_pergunta(facebook_id, account_id)
+            if pede_grafico(pergunta):
+                if sem_dados(df):
+                    yield evento_sse("texto", {"texto": AVISO_GRAFICO_SEM_DADOS})
+                else:
+                    configuracao = await run_in_threadpool(gerar_configuracao_grafico, df, pergunta)
+                    yield evento_sse("chart", {"resposta": f"[CHART:{json.dumps(configuracao)}]"})
+            else:
+                # O iterador do Gemini fica numa thread só (executar_em_thread); o loop só aguarda os pedaços
+                pedacos = executar_em_thread(lambda: gerar_insight_ia_stream(df, pergunta))
+                async for pedaco in iterate_in_threadpool(pedacos):
+                    yield evento_sse("texto", {"texto": pedaco})
+        except ErroRespostaIA as e:
+            print(f"[ERRO] Resposta da IA em streaming: {e}")
+            yield evento_sse("erro", {"resposta": str(e)})
+        except Exception as e:
+            print("ERRO DETALHADO:")
+            traceback.print_exc()
+            yield evento_sse("erro", {"resposta": f"Desculpe, tive um problema técnico: {str(e)}"})
+        yield evento_sse("fim", {})
+
+    return StreamingResponse(eventos(), media_type="text/event-stream", headers=CABECALHOS_SSE)
+
 @router.post("/gerar-grafico", tags=["IA"])
 async def gerar_grafico_endpoint(
     request: Request,
@@ -86,26 +150,7 @@ async def gerar_grafico_endpoint(
     account_id: Optional[str] = Body(None)
 ):
     try:
-        from services.user_facebook import buscar_user_id_por_facebook_id
-        from services.meta_extractor import carregar_account_ads_facebook_dataframe, buscar_id_conta_por_identificador
-
-        # Tenta buscar dados se houver facebook_id
-        df = None
-        user_id = None
-        
-        if facebook_id and facebook_id != 'default':
-            user_id = buscar_user_id_por_facebook_id(facebook_id)
-            if user_id:
-                # Se account_id for passado (como string "undefined" ou valor real), trate-o
-                acc_id = account_id if account_id and account_id != "undefined" else None
-                
-                # Tenta resolver ID da plataforma para ID interno
-                if acc_id and isinstance(acc_id, str):
-                    resolved_id = buscar_id_conta_por_identificador(acc_id)
-                    if resolved_id:
-                        acc_id = resolved_id
-
-                df = carregar_account_ads_facebook_dataframe(account_id=acc_id, user_id=user_id)
+        df = await executar_no_banco(carregar_dados_do_usuario, facebook_id, account_id)
         
         if df is None or df.empty:
             # Tenta verificar se há contexto de planilha carregado em memória
@@ -116,7 +161,7 @@ async def gerar_grafico_endpoint(
             # Se ainda assim não tiver dados, erro
             raise HTTPException(status_code=400, detail="Nenhum dado disponível para gerar gráfico. Conecte uma conta ou carregue uma planilha.")
 
-        configuracao = gerar_configuracao_grafico(df, pedido)
+        configuracao = await run_in_threadpool(gerar_configuracao_grafico, df, pedido)
         return configuracao
 
     except Exception as e:
@@ -131,11 +176,36 @@ async def set_ia_contexto(request: Request):
     dados = body['dados']
     df = pd.DataFrame(dados)
     user_dataframes[user_id] = df
+    # Cursores de GET /contexto deixam de valer quando o contexto é trocado
+    versoes_contexto[user_id] = versoes_contexto.get(user_id, 0) + 1
     return {"ok": True, "columns": df.columns.tolist(), "rows": len(df)}
 
 @router.get("/contexto", tags=["IA"])
-async def get_ia_contexto(user_id: str = 'default'):
+async def get_ia_contexto(user_id: str = 'default', limite: Optional[int] = Query(None, ge=1),
+                          cursor: Optional[str] = None, formato: Literal["json", "ndjson"] = "json"):
+    # Sem limite/cursor: todas as linhas, na mesma lista JSON de antes, enviada em blocos.
+    # Com limite: {"dados": [...], "proximo_cursor": ...}; formato=ndjson: uma linha por registro
+    # (o próximo cursor vai no cabeçalho X-Proximo-Cursor).
     df = user_dataframes.get(user_id)
-    if df is not None:
-        return df.to_dict(orient='records')
-    return {"erro": "Nenhum contexto carregado"}
+    if df is None:
+        return {"erro": "Nenhum contexto carregado"}
+    versao = versoes_contexto.get(user_id, 0)
+    inicio = 0
+    if cursor:
+        try:
+            posicao = decodificar_cursor(cursor)
+            inicio = int(posicao["linha"])
+        except (ValueError, KeyError, TypeError):
+            raise HTTPException(status_code=400, detail="cursor inválido")
+        if posicao.get("versao") != versao:
+            raise HTTPException(status_code=409, detail="O contexto foi alterado desde a página anterior; recomece sem cursor.")
+    fim = inicio + limite if limite is not None else len(df)
+    proximo_cursor = codificar_cursor({"versao": versao, "linha": fim}) if fim < len(df) else None
+
+    blocos = blocos_dataframe(df, inicio, fim)
+    if formato == "ndjson":
+        cabecalhos = {"X-Proximo-Cursor": proximo_cursor} if proximo_cursor else {}
+        return StreamingResponse(fluxo_ndjson(blocos), media_type="application/x-ndjson", headers=cabecalhos)
+    if limite is None and not cursor:
+        return StreamingResponse(fluxo_lista_json(blocos), media_type="application/json")
+    return StreamingResponse(fluxo_objeto_json({"proximo_cursor": proximo_cursor}, "dados", blocos), media_type="application/json")
@@ -1,14 +1,24 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List, Any, Dict
+import json
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
+from typing import List, Any, Dict, Literal, Optional
 from schemas.connector import FacebookDataConfig, DataSourceCreate, DataSourceResponse
-from services import facebook_connector
+from services import facebook_connector, data_source_store
+from services.pipeline import executar_em_thread
+from utils.paginacao import codificar_cursor, decodificar_cursor, linhas_json, fluxo_ndjson, fluxo_objeto_json
 
 router = APIRouter()
 
 @router.post("/facebook/preview")
-def preview_facebook_data(config: FacebookDataConfig):
+def preview_facebook_data(config: FacebookDataConfig, formato: str = "json"):
+    # formato=ndjson: uma linha por item, enviada conforme as páginas chegam da Graph API
+    if formato == "ndjson":
+        def linhas():
+            for pagina in facebook_connector.fetch_facebook_data(config):
+                yield "".join(json.dumps(item) + "\n" for item in pagina)
+        return StreamingResponse(linhas(), media_type="application/x-ndjson")
     try:
-        data = facebook_connector.fetch_facebook_data(config)
+        data = [item for pagina in facebook_connector.fetch_facebook_data(config) for item in pagina]
         return {"data": data, "count": len(data)}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -23,6 +33,7 @@ def save_facebook_data_source(payload: DataSourceCreate):
         
         data_to_save = payload.data
         if not data_to_save:
+             # As páginas vão direto para os blocos gravados, sem juntar tudo na memória
              data_to_save = facebook_connector.fetch_facebook_data(payload.config)
              
         result = facebook_connector.save_data_source_db(payload.name, payload.config, data_to_save)
@@ -34,9 +45,64 @@ def save_facebook_data_source(payload: DataSourceCreate):
 def list_data_sources():
     return facebook_connector.list_data_sources()
 
-@router.get("/data-sources/{source_id}")
-def get_data_source(source_id: int):
-    source = facebook_connector.get_data_source_by_id(source_id)
+@router.get("/data-sources/{source_id}/metadados")
+def get_data_source_metadata(source_id: int):
+    source = data_source_store.buscar_metadados(source_id)
     if not source:
         raise HTTPException(status_code=404, detail="Data source not found")
     return source
+
+@router.get("/data-sources/{source_id}")
+def get_data_source(source_id: int, inicio: int = Query(0, ge=0), limite: Optional[int] = Query(None, ge=1),
+                    pagina: Optional[int] = Query(None, ge=1), colunas: Optional[str] = None,
+                    cursor: Optional[str] = None, formato: Literal["json", "ndjson"] = "json"):
+    # inicio/limite: intervalo de linhas; pagina: atalho para inicio = (pagina - 1) * limite; colunas: "a,b,c"
+    # cursor: continua de onde a página anterior parou (proximo_cursor); formato=ndjson: uma linha por registro
+    if cursor:
+        try:
+            inicio = int(decodificar_cursor(cursor)["linha"])
+        except (ValueError, KeyError, TypeError):
+            raise HTTPException(status_code=400, detail="cursor inválido")
+    elif pagina is not None:
+        if limite is None:
+            raise HTTPException(status_code=400, detail="pagina exige limite")
+        inicio = (pagina - 1) * limite
+    lista_colunas = [c.strip() for c in colunas.split(",") if c.strip()] if colunas else None
+
+    metadados = data_source_store.buscar_metadados(source_id)
+    if not metadados:
+        raise HTTPException(status_code=404, detail="Data source not found")
+    total = metadados.get("row_count")
+    if total is None:
+        # Data source antiga (JSON inteiro em data_sources.data): sem contagem gravada, lida de uma vez
+        source = facebook_connector.get_data_source_by_id(source_id, colunas=lista_colunas)
+        total = len(source["data"])
+        source["data"] = source["data"][inicio:inicio + limite if limite is not None else None]
+    else:
+        source = None
+
+    paginacao = {}
+    if limite is not None:
+        retornadas = max(0, min(limite, total - inicio))
+        paginacao = {"inicio": inicio, "limite": limite, "retornadas": retornadas}
+        if inicio + limite < total:
+            paginacao["proximo_cursor"] = codificar_cursor({"linha": inicio + limite})
+
+    if source is not None:
+        if formato == "ndjson":
+            return StreamingResponse(fluxo_ndjson([linhas_json(source["data"])]), media_type="application/x-ndjson",
+                                     headers=_cabecalhos_paginacao(paginacao))
+        if paginacao:
+            source["paginacao"] = paginacao
+        return source
+
+    # Os blocos são lidos do banco numa thread só (conexões SQLite não trocam de thread) e enviados conforme saem
+    blocos = lambda: (linhas_json(bloco) for bloco in data_source_store.iterar_linhas(source_id, inicio, limite, lista_colunas))
+    if formato == "ndjson":
+        return StreamingResponse(executar_em_thread(lambda: fluxo_ndjson(blocos())), media_type="application/x-ndjson",
+                                 headers=_cabecalhos_paginacao(paginacao))
+    campos = dict(metadados, **({"paginacao": paginacao} if paginacao else {}))
+    return StreamingResponse(executar_em_thread(lambda: fluxo_objeto_json(campos, "data", blocos())), media_type="application/json")
+
+def _cabecalhos_paginacao(paginacao: Dict[str, Any]) -> Dict[str, str]:
+    return {"X-Proximo-Cursor": paginacao["proximo_cursor"]} if paginacao.get("proximo_cursor") else {}
@@ -1,7 +1,10 @@
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
-from services.meta_extractor import buscar_dados_meta
+from typing import List, Literal, Optional
+from services.meta_extractor import buscar_dados_meta, buscar_dados_meta_contas, stream_dados_meta
+from services.pipeline import executar_em_thread
+from services.meta_scheduler import get_agendador
 
 router = APIRouter()
 
@@ -11,7 +14,43 @@ class RequisicaoMeta(BaseModel):
     data_inicial: Optional[str] = None
     data_final: Optional[str] = None
     fields: Optional[str] = None
+    janela_dias: Optional[int] = None
+    sincronizacao_completa: bool = False
+    # completo: resumo + todos os registros em "dados"; resumo: só os totais; ndjson: registros em streaming
+    formato: Literal["completo", "resumo", "ndjson"] = "completo"
+
+class RequisicaoMetaContas(BaseModel):
+    account_ids: List[str]
+    user_facebook_id: str
+    data_inicial: Optional[str] = None
+    data_final: Optional[str] = None
+    fields: Optional[str] = None
+    janela_dias: Optional[int] = None
+    sincronizacao_completa: bool = False
+    formato: Literal["completo", "resumo"] = "resumo"
 
 @router.post("/meta/dados")
 def carregar_dados_meta(req: RequisicaoMeta):
-    return buscar_dados_meta(req.account_id, req.user_facebook_id, req.data_inicial, req.data_final, req.fields)
\ No newline at end of file
+    args = (req.account_id, req.user_facebook_id, req.data_inicial, req.data_final, req.fields, req.janela_dias, req.sincronizacao_completa)
+    if req.formato == "ndjson":
+        return StreamingResponse(executar_em_thread(lambda: stream_dados_meta(*args)), media_type="application/x-ndjson")
+    return buscar_dados_meta(*args, incluir_dados=req.formato == "completo")
+
+@router.post("/meta/dados/contas")
+def carregar_dados_meta_contas(req: RequisicaoMetaContas):
+    return buscar_dados_meta_contas(req.account_ids, req.user_facebook_id, req.data_inicial, req.data_final, req.fields, req.janela_dias, req.sincronizacao_completa, req.formato == "completo")
+
+@router.get("/meta/sincronizacao")
+def status_sincronizacao():
+    """Estado do agendador e, por conta: estado, última duração, linhas ingeridas e próxima execução."""
+    return get_agendador().status()
+
+@router.post("/meta/sincronizacao/executar")
+def executar_sincronizacao(account_id: Optional[int] = None):
+    agendador = get_agendador()
+    if not agendador.ativo:
+        raise HTTPException(status_code=409, detail="Sincronização automática desativada (META_SYNC_AUTOMATICO) ou em execução em outro processo")
+    antecipadas = agendador.executar_agora(account_id)
+    if account_id is not None and not antecipadas:
+        raise HTTPException(status_code=404, detail="Conta não agendada (inativa ou sem usuário associado)")
+    return {"antecipadas": antecipadas}
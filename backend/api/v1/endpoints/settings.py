@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from database.connection import get_db_connection
 from schemas.settings import SettingCreate, SettingResponse
+from services.settings_store import invalidar_settings
 import sqlite3
 
 router = APIRouter()
@@ -46,6 +47,8 @@ def create_or_update_setting(setting: SettingCreate):
     
     conn.commit()
     conn.close()
+    # Leituras em cache (ex.: API key do Gemini) passam a ver o novo valor
+    invalidar_settings()
     
     return {
         "id": setting_id,
@@ -0,0 +1,91 @@
+"""
+Compara a leitura de insights como era antes (pd.read_sql com SELECT *, tudo object/float64, pd.to_numeric
+coluna a coluna) com carregar_account_ads_facebook_dataframe tipada (formato pandas e arrow).
+
+Antes de medir, confere que os gráficos montados pelos dois DataFrames (services/ia.montar_json_final) saem
+iguais aos da leitura antiga, valor a valor.
+
+Use uma cópia do banco com insights gravados, por exemplo:
+
+    DB_TYPE=sqlite DB_NAME=/tmp/copia.sqlite python benchmark_carregamento.py --conta 3 --limite 0
+"""
+import argparse
+import time
+import pandas as pd
+from database.connection import get_db_connection
+from services.ia import montar_json_final
+from services.insights_dataframe import FORMATOS
+from services.meta_extractor import carregar_account_ads_facebook_dataframe, COLUNAS_ANALISE
+
+
+def _leitura_antiga(account_id, limite):
+    conn = get_db_connection()
+    query = "SELECT * FROM account_ads_facebook_dataframe"
+    params = []
+    if account_id:
+        query += " WHERE account_id = %s"
+        params.append(account_id)
+    query += " ORDER BY data_extracao DESC, date_start ASC"
+    if limite:
+        query += f" LIMIT {limite}"
+    df = pd.read_sql(query, conn, params=params)
+    conn.close()
+    for col in ["impressions", "reach", "clicks", "cpc", "spend", "ctr", "cpm", "frequency"]:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df
+
+
+# (type, xKey, yKey, aggregation, groupBy) dos gráficos conferidos
+GRAFICOS = [
+    ("line", "date_start", "clicks", "sum", "date_start"),
+    ("pie", "campaign_name", "spend", "sum", "campaign_name"),
+    ("bar", "adset_name", "cpc", "mean", "adset_name"),
+    ("line", "date_start", "ctr", "mean", "date_start"),
+    ("bar", "ad_name", "impressions", "count", "ad_name"),
+    ("bar", "campaign_name", "cpm", None, None),
+]
+
+
+def _conferir_graficos(account_id):
+    """Os gráficos da leitura tipada têm que ser idênticos aos da leitura antiga (sem ruído de precisão)."""
+    antigo = _leitura_antiga(account_id, None)
+    for formato in FORMATOS:
+        tipado = carregar_account_ads_facebook_dataframe(account_id, limit=None, fonte="banco", colunas=COLUNAS_ANALISE, formato=formato)
+        # Sem os filtros a agregação é feita em pandas nos dois DataFrames (e não pelos rollups gold)
+        tipado.attrs = {}
+        for tipo, x, y, agregacao, grupo in GRAFICOS:
+            params = {"type": tipo, "xKey": x, "yKey": y, "aggregation": agregacao, "groupBy": grupo, "title": "t"}
+            esperado = montar_json_final(antigo.copy(), params)["data"]
+            obtido = montar_json_final(tipado.copy(), params)["data"]
+            assert obtido == esperado, f"gráfico {params} ({formato}) diverge: {obtido[:3]} != {esperado[:3]}"
+    print(f"gráficos conferidos: {len(GRAFICOS)} x {len(FORMATOS)} formatos iguais à leitura antiga")
+
+
+def _medir(nome, carregar, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        df = carregar()
+        tempos.append(time.perf_counter() - inicio)
+    memoria = df.memory_usage(deep=True).sum() / 1024 / 1024
+    print(f"{nome:<28} {len(df):>8} {min(tempos) * 1000:>10.0f} {memoria:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo e memória da leitura de insights")
+    parser.add_argument("--conta", type=int, default=None, help="id interno da conta (accounts_ads_facebook.id)")
+    parser.add_argument("--limite", type=int, default=5000, help="0 = todas as linhas")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    args = parser.parse_args()
+    limite = args.limite or None
+
+    _conferir_graficos(args.conta)
+    print(f"{'leitura':<28} {'linhas':>8} {'tempo (ms)':>10} {'memória (MB)':>12}")
+    _medir("antes (read_sql + to_numeric)", lambda: _leitura_antiga(args.conta, limite), args.repeticoes)
+    _medir("tipada (pandas)", lambda: carregar_account_ads_facebook_dataframe(args.conta, limit=limite, fonte="banco"), args.repeticoes)
+    _medir("tipada (arrow)", lambda: carregar_account_ads_facebook_dataframe(args.conta, limit=limite, fonte="banco", formato="arrow"), args.repeticoes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Mede a vazão de POST /gerar-grafico com vários usuários simultâneos, com o acesso ao banco
+no pool de threads (database/async_db.py) e no modo antigo, chamado direto dentro do endpoint async
+(bloqueando o event loop).
+
+A geração da configuração pela IA é trocada por uma função local para medir só o acesso aos dados.
+Use uma cópia do banco com insights gravados, por exemplo:
+
+    DB_TYPE=sqlite DB_NAME=/tmp/copia.sqlite python benchmark_concorrencia.py --facebook-id 765972609717482 --conta 1374941636159329
+    DB_TYPE=sqlite DB_NAME=/tmp/copia.sqlite python benchmark_concorrencia.py ... --latencia-ms 20
+
+--latencia-ms soma uma espera a cada consulta, simulando o round-trip de um Postgres remoto.
+"""
+import argparse
+import asyncio
+import time
+import httpx
+from main import app
+from api.v1.endpoints import chat
+from services import meta_extractor
+
+_executar_no_banco = chat.executar_no_banco
+
+
+async def _no_event_loop(funcao, *args, **kwargs):
+    # Comportamento antigo: a consulta roda no próprio event loop
+    return funcao(*args, **kwargs)
+
+
+def _configuracao_local(df, pedido):
+    return {"type": "bar", "linhas": len(df)}
+
+
+async def rodada(usuarios: int, requisicoes: int, corpo: dict) -> float:
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        async def usuario():
+            for _ in range(requisicoes):
+                resposta = await cliente.post("/gerar-grafico", json=corpo)
+                resposta.raise_for_status()
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(usuario() for _ in range(usuarios)))
+        return usuarios * requisicoes / (time.perf_counter() - inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vazão de /gerar-grafico com usuários simultâneos")
+    parser.add_argument("--facebook-id", required=True)
+    parser.add_argument("--conta", default=None, help="identificador da conta de anúncios")
+    parser.add_argument("--usuarios", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--requisicoes", type=int, default=10, help="requisições por usuário")
+    parser.add_argument("--latencia-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    chat.gerar_configuracao_grafico = _configuracao_local
+    if args.latencia_ms:
+        carregar = meta_extractor.carregar_account_ads_facebook_dataframe
+
+        def carregar_com_latencia(*a, **kw):
+            time.sleep(args.latencia_ms / 1000)
+            return carregar(*a, **kw)
+        meta_extractor.carregar_account_ads_facebook_dataframe = carregar_com_latencia
+
+    corpo = {"pedido": "gasto por campanha", "facebook_id": args.facebook_id, "account_id": args.conta}
+    print(f"{'usuários':>8} {'event loop (req/s)':>19} {'pool do banco (req/s)':>22}")
+    for usuarios in args.usuarios:
+        chat.executar_no_banco = _no_event_loop
+        bloqueante = asyncio.run(rodada(usuarios, args.requisicoes, corpo))
+        chat.executar_no_banco = _executar_no_banco
+        pool = asyncio.run(rodada(usuarios, args.requisicoes, corpo))
+        print(f"{usuarios:>8} {bloqueante:>19.1f} {pool:>22.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Mede o parser local de pedidos de gráfico (services/intencao_grafico.py) num conjunto de pedidos:
+quantos ele resolve sem o Gemini (taxa de acerto), se a especificação bate com a esperada e quanto tempo leva.
+
+O conjunto embutido tem pedidos do chat com a especificação esperada (tipo, métrica, agrupamento, agregação) ou
+None quando o pedido deve ir para o Gemini. Com --arquivo, um pedido por linha (sem especificação esperada).
+O DataFrame tem as colunas de análise dos insights; com --conta, usa os insights gravados no banco.
+
+O tempo economizado é acertos x latência do Gemini: informe a latência (--latencia-llm-ms) ou meça com --gemini,
+que chama o Gemini nos pedidos que o parser resolveu (desligue o cache para medir a chamada real):
+
+    python benchmark_intencao_grafico.py
+    python benchmark_intencao_grafico.py --arquivo pedidos.txt --latencia-llm-ms 1800
+    IA_CACHE_HABILITADO=false python benchmark_intencao_grafico.py --gemini 5
+"""
+import argparse
+import statistics
+import time
+import pandas as pd
+from services.intencao_grafico import interpretar_pedido_local
+from services.ia import interpretar_pedido_usuario
+
+# (pedido, (type, yKey, groupBy, aggregation) ou None)
+PEDIDOS = [
+    ("gráfico de linha de cliques por dia", ("line", "clicks", "date_start", "sum")),
+    ("pizza de spend por campanha", ("pie", "spend", "campaign_name", "sum")),
+    ("Gráfico de barras com o gasto por campanha", ("bar", "spend", "campaign_name", "sum")),
+    ("mostrar gráfico de impressões por dia", ("bar", "impressions", "date_start", "sum")),
+    ("gráfico de cliques dividido por dias", ("bar", "clicks", "date_start", "sum")),
+    ("Faça um gráfico de pizza com a distribuição de cliques por campanha", ("pie", "clicks", "campaign_name", "sum")),
+    ("gráfico da evolução do gasto", ("line", "spend", "date_start", "sum")),
+    ("gráfico de linha do CTR por dia", ("line", "ctr", "date_start", "mean")),
+    ("média de CPC por conjunto de anúncios em barras", ("bar", "cpc", "adset_name", "mean")),
+    ("gráfico de barras do custo por clique por campanha", ("bar", "cpc", "campaign_name", "mean")),
+    ("plotar alcance por anúncio", ("bar", "reach", "ad_name", "sum")),
+    ("gráfico de pizza do investimento por objetivo", ("pie", "spend", "objective", "sum")),
+    ("gráfico do total de cliques por dia", ("bar", "clicks", "date_start", "sum")),
+    ("gráfico de linha com a média de cliques por dia", ("line", "clicks", "date_start", "mean")),
+    ("gráfico de impressões diárias", ("bar", "impressions", "date_start", "sum")),
+    ("gráfico de linha da frequência por dia", ("line", "frequency", "date_start", "mean")),
+    ("visualização do CPM por campanha", ("bar", "cpm", "campaign_name", "mean")),
+    ("altera o gráfico de cliques por dia para linha", ("line", "clicks", "date_start", "sum")),
+    ("muda o gráfico de gasto por dia para barras com datas dd/mm", ("bar", "spend", "date_start", "sum")),
+    ("gráfico de pizza com a participação do gasto por conjunto", ("pie", "spend", "adset_name", "sum")),
+    ("gráfico de barras de cliques por campanhas", ("bar", "clicks", "campaign_name", "sum")),
+    ("gráfico de linha da taxa de cliques ao longo do tempo", ("line", "ctr", "date_start", "mean")),
+    ("gráfico de barras com o alcance por público", ("bar", "reach", "adset_name", "sum")),
+    ("gráfico de pizza de impressões por status", ("pie", "impressions", "status", "sum")),
+    ("gráfico de barras do valor investido por cada campanha", ("bar", "spend", "campaign_name", "sum")),
+    ("gráfico de linha de cliques por dia no formato dd/mm/yyyy", ("line", "clicks", "date_start", "sum")),
+    # Precisam do Gemini: mais de uma métrica, ranking, período, comparação, pedido vago
+    ("gráfico de cliques e impressões por dia", None),
+    ("gráfico das 5 campanhas com maior gasto", None),
+    ("gráfico de cliques por dia na última semana", None),
+    ("gráfico comparando o CTR das campanhas", None),
+    ("gráfico de gasto por mês", None),
+    ("faça um gráfico bonito dos meus dados", None),
+    ("gráfico de barras com os melhores anúncios", None),
+    ("muda para pizza", None),
+    ("gráfico de linha e barras de cliques por dia", None),
+    ("gráfico de cliques por campanha e por dia", None),
+    ("gráfico do custo por resultado por campanha", None),
+    ("gráfico de conversões por dia", None),
+    # Filtros e períodos sem palavra-chave: qualquer palavra fora das neutras vai para o Gemini
+    ("cliques por dia da campanha Black Friday", None),
+    ("gasto por dia em janeiro", None),
+    ("cliques por dia de 2024", None),
+    ("gasto por dia excluindo a campanha A", None),
+    ("cliques por campanha ontem", None),
+    ("gasto por campanha ativa", None),
+    ("cliques por campanha A", None),
+    ("cliques por campanha A em barras", None),
+]
+
+
+def _dataframe(conta):
+    if conta:
+        from services.meta_extractor import carregar_account_ads_facebook_dataframe, COLUNAS_ANALISE
+        return carregar_account_ads_facebook_dataframe(account_id=conta, limit=50, colunas=COLUNAS_ANALISE)
+    return pd.DataFrame([{
+        "data_extracao": pd.Timestamp("2024-01-02 10:00:00"), "campaign_name": "Campanha A", "adset_name": "Conjunto A",
+        "ad_name": "Anúncio A", "impressions": 1000, "reach": 800, "clicks": 25, "cpc": 0.5, "spend": 12.5,
+        "ad_id": "1", "frequency": 1.25, "ctr": 2.5, "cpm": 12.5, "date_start": pd.Timestamp("2024-01-01"),
+        "date_stop": pd.Timestamp("2024-01-01"), "nivel": "ad", "status": "ACTIVE", "objective": "OUTCOME_TRAFFIC",
+        "actions": None, "campaign_id": "10", "adset_id": "20",
+    }])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Taxa de acerto e latência do parser local de pedidos de gráfico")
+    parser.add_argument("--arquivo", help="arquivo com um pedido por linha (no lugar do conjunto embutido)")
+    parser.add_argument("--conta", type=int, default=None, help="id interno da conta para usar as colunas reais")
+    parser.add_argument("--repeticoes", type=int, default=200)
+    parser.add_argument("--latencia-llm-ms", type=float, default=None, help="latência média de uma chamada ao Gemini")
+    parser.add_argument("--gemini", type=int, default=0, help="mede a latência do Gemini em N pedidos")
+    args = parser.parse_args()
+
+    if args.arquivo:
+        with open(args.arquivo, encoding="utf-8") as f:
+            pedidos = [(linha.strip(), ...) for linha in f if linha.strip()]
+    else:
+        pedidos = PEDIDOS
+    df = _dataframe(args.conta)
+
+    acertos = 0
+    divergentes = []
+    tempos = []
+    resolvidos = []
+    for pedido, esperado in pedidos:
+        inicio = time.perf_counter()
+        for _ in range(args.repeticoes):
+            spec = interpretar_pedido_local(df, pedido)
+        tempos.append((time.perf_counter() - inicio) / args.repeticoes)
+        obtido = None if spec is None else (spec["type"], spec["yKey"], spec["groupBy"], spec["aggregation"])
+        if spec is not None:
+            acertos += 1
+            resolvidos.append(pedido)
+        if esperado is not ... and obtido != esperado:
+            divergentes.append((pedido, esperado, obtido))
+
+    print(f"pedidos:                 {len(pedidos)}")
+    print(f"resolvidos localmente:   {acertos} ({acertos / len(pedidos):.0%})")
+    print(f"latência do parser:      média {statistics.mean(tempos) * 1e6:.0f} µs, máx {max(tempos) * 1e6:.0f} µs")
+    if not args.arquivo:
+        print(f"divergências:            {len(divergentes)}")
+        for pedido, esperado, obtido in divergentes:
+            print(f"  {pedido!r}: esperado {esperado}, obtido {obtido}")
+
+    latencia_llm = args.latencia_llm_ms
+    if args.gemini and resolvidos:
+        medidas = []
+        for pedido in resolvidos[:args.gemini]:
+            inicio = time.perf_counter()
+            interpretar_pedido_usuario(df, pedido, usar_regras=False)
+            medidas.append((time.perf_counter() - inicio) * 1000)
+        latencia_llm = statistics.median(medidas)
+        print(f"latência do Gemini:      mediana {latencia_llm:.0f} ms em {len(medidas)} pedidos")
+    if latencia_llm is not None:
+        economia = acertos * (latencia_llm - statistics.mean(tempos) * 1000)
+        print(f"tempo economizado:       {economia / 1000:.1f} s nos {len(pedidos)} pedidos "
+              f"({economia / len(pedidos):.0f} ms por pedido em média)")
+
+
+if __name__ == "__main__":
+    main()
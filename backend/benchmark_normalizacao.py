@@ -0,0 +1,162 @@
+"""
+Compara o custo de CPU da normalização dos insights: o caminho antigo (dict por item + parse_numeric/int_or_none
+por valor antes do insert) e o atual (cada página vira colunas em listas Python comuns e as métricas são
+convertidas uma vez por coluna com NumPy; não há DataFrame por página, que na prática saiu mais lento).
+
+O ganho medido fica em torno de 1,5-1,8x (páginas de 200, 1000 e 10000 linhas), longe das 10x pedidas:
+montar as tuplas por linha para o driver do banco e o json.dumps de actions custam o mesmo nos dois caminhos.
+
+Uso:
+    python benchmark_normalizacao.py --linhas 10000 --pagina 200 --repeticoes 5
+    python benchmark_normalizacao.py --sem-actions
+
+As linhas vêm do gerador do graph_stub_server.py (mesmo formato da Insights API). Antes de medir,
+confere coluna a coluna, pelo nome, que os dois caminhos produzem os mesmos valores para o banco
+(e as colunas que só o caminho atual grava contra os itens da API).
+"""
+import argparse
+import json
+import math
+import time
+from datetime import date, timedelta
+from graph_stub_server import gerar_itens
+from services.meta_extractor import _normalizar_pagina, _campos_nivel
+from services.meta_loader import COLUNAS_INSIGHTS, ID_POR_NIVEL, preparar_linhas
+
+CAMPOS = "campaign_name,adset_name,ad_name,ad_id,impressions,reach,clicks,cpc,spend,ctr,cpm,frequency,actions,objective"
+
+
+# --- caminho antigo (cópia da implementação anterior, só para comparação) ---
+
+def _parse_numeric(value):
+    try:
+        if value in (None, '', '-', 'null'):
+            return None
+        return float(value)
+    except Exception:
+        return None
+
+
+def _int_or_none(value):
+    try:
+        if value in (None, '', '-', 'null'):
+            return None
+        return int(float(value))
+    except Exception:
+        return None
+
+
+def _normalizar_item_antigo(item: dict, campos: set, nivel: str) -> dict:
+    registro = {}
+    for campo in campos:
+        if campo:
+            registro[campo] = item.get(campo, "-")
+    registro["campaign_name"] = item.get("campaign_name", "")
+    registro["adset_name"] = item.get("adset_name", "") or item.get("addset_name", "")
+    registro["ad_name"] = item.get("ad_name", "")
+    registro["status"] = item.get("status", "ACTIVE")
+    registro["impressions"] = int(float(item.get("impressions", 0) or 0)) if item.get("impressions") not in [None, "-"] else 0
+    registro["reach"] = int(float(item.get("reach", 0) or 0)) if item.get("reach") not in [None, "-"] else 0
+    registro["clicks"] = int(float(item.get("clicks", 0) or 0)) if item.get("clicks") not in [None, "-"] else 0
+    registro["cpc"] = float(item.get("cpc", 0) or 0) if item.get("cpc") not in [None, "-"] else 0
+    registro["spend"] = float(item.get("spend", 0) or 0) if item.get("spend") not in [None, "-"] else 0
+    registro["date_start"] = item.get("date_start", "")
+    registro["date_stop"] = item.get("date_stop", "")
+    for campo in campos:
+        if campo and campo not in registro:
+            registro[campo] = "-"
+    registro["nivel"] = nivel
+    return registro
+
+
+def _preparar_linha_antiga(registro: dict, account_db_id, user_id) -> tuple:
+    return (
+        account_db_id, user_id,
+        registro.get("campaign_name"), registro.get("adset_name"), registro.get("ad_name"),
+        _int_or_none(registro.get("impressions")), _int_or_none(registro.get("reach")), _int_or_none(registro.get("clicks")),
+        _parse_numeric(registro.get("cpc")), _parse_numeric(registro.get("spend")),
+        registro.get("ad_id"),
+        _parse_numeric(registro.get("frequency")), _parse_numeric(registro.get("ctr")), _parse_numeric(registro.get("cpm")),
+        registro.get("date_start"), registro.get("date_stop"), registro.get("nivel"), registro.get("status"),
+        registro.get("objective"),
+        json.dumps(registro.get("actions")) if registro.get("actions") else None,
+    )
+
+
+def caminho_antigo(paginas, campos, nivel):
+    return [_preparar_linha_antiga(_normalizar_item_antigo(item, campos, nivel), 1, 1) for pagina in paginas for item in pagina]
+
+
+def caminho_vetorizado(paginas, campos, nivel):
+    return [linha for pagina in paginas for linha in preparar_linhas(_normalizar_pagina(pagina, campos, nivel), 1, 1)]
+
+
+# Colunas das tuplas do caminho antigo (antes de campaign_id, adset_id e entidade_id)
+COLUNAS_ANTIGAS = (
+    "account_id", "user_id", "campaign_name", "adset_name", "ad_name",
+    "impressions", "reach", "clicks", "cpc", "spend", "ad_id", "frequency", "ctr", "cpm",
+    "date_start", "date_stop", "nivel", "status", "objective", "actions",
+)
+
+
+def _igual(x, y) -> bool:
+    return x == y or (isinstance(x, float) and isinstance(y, float) and math.isclose(x, y))
+
+
+def _conferir(antigas, novas, itens, nivel):
+    """
+    Compara as tuplas coluna a coluna, pelo nome. As colunas que o caminho antigo não tinha
+    (campaign_id, adset_id, entidade_id) são conferidas contra os itens da Insights API.
+    """
+    assert len(antigas) == len(novas) == len(itens), "quantidade de linhas diferente"
+    campo_id = ID_POR_NIVEL[nivel][0]
+    for antiga, nova, item in zip(antigas, novas, itens):
+        assert len(antiga) == len(COLUNAS_ANTIGAS), f"linha antiga com {len(antiga)} colunas"
+        assert len(nova) == len(COLUNAS_INSIGHTS), f"linha nova com {len(nova)} colunas"
+        esperado = dict(zip(COLUNAS_ANTIGAS, antiga))
+        esperado.update(campaign_id=item.get("campaign_id"), adset_id=item.get("adset_id"), entidade_id=item.get(campo_id))
+        obtido = dict(zip(COLUNAS_INSIGHTS, nova))
+        assert set(esperado) == set(obtido), f"colunas diferentes: {set(esperado) ^ set(obtido)}"
+        for coluna in COLUNAS_INSIGHTS:
+            assert _igual(esperado[coluna], obtido[coluna]), f"{coluna}: {esperado[coluna]!r} != {obtido[coluna]!r}"
+
+
+def medir(funcao, paginas, campos, nivel, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.process_time()
+        funcao(paginas, campos, nivel)
+        tempos.append(time.process_time() - inicio)
+    return min(tempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da normalização de páginas da Insights API")
+    parser.add_argument("--linhas", type=int, default=10000)
+    parser.add_argument("--pagina", type=int, nargs="+", default=[200, 1000, 10000], help="tamanhos de página a comparar")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--sem-actions", action="store_true", help="não pede actions (a serialização JSON dele custa igual nos dois caminhos)")
+    args = parser.parse_args()
+
+    nivel = "ad"
+    campos, fields = _campos_nivel(nivel, CAMPOS.replace(",actions", "") if args.sem_actions else CAMPOS)
+    anuncios = 100
+    dias = math.ceil(args.linhas / anuncios)
+    until = (date(2025, 1, 1) + timedelta(days=dias - 1)).isoformat()
+    itens = gerar_itens("act_1", nivel, fields.split(","), {"since": "2025-01-01", "until": until}, anuncios)[:args.linhas]
+
+    antigas = caminho_antigo([itens], campos, nivel)
+    novas = caminho_vetorizado([itens], campos, nivel)
+    _conferir(antigas, novas, itens, nivel)
+
+    print(f"{len(itens)} linhas, melhor de {args.repeticoes} (tempo de CPU)")
+    print(f"{'página':>8} {'antigo (ms)':>12} {'vetorizado (ms)':>16} {'ganho':>7}")
+    for tamanho in args.pagina:
+        paginas = [itens[i:i + tamanho] for i in range(0, len(itens), tamanho)]
+        antigo = medir(caminho_antigo, paginas, campos, nivel, args.repeticoes)
+        novo = medir(caminho_vetorizado, paginas, campos, nivel, args.repeticoes)
+        print(f"{tamanho:>8} {antigo * 1000:>12.1f} {novo * 1000:>16.1f} {antigo / novo:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
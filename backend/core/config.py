@@ -0,0 +1,57 @@
+import os
+import tempfile
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Extração Meta Ads: chamadas simultâneas permitidas por access token
+META_MAX_CONCORRENCIA_POR_TOKEN = int(os.getenv("META_MAX_CONCORRENCIA_POR_TOKEN", "3"))
+# Quantas contas podem ser sincronizadas ao mesmo tempo em /meta/dados/contas
+META_MAX_CONTAS_PARALELAS = int(os.getenv("META_MAX_CONTAS_PARALELAS", "4"))
+# Intervalos longos são quebrados em janelas de N dias, buscadas em paralelo
+META_JANELA_DIAS = int(os.getenv("META_JANELA_DIAS", "30"))
+# Tentativas por janela antes de desistir dela (as demais janelas não são afetadas)
+META_TENTATIVAS_JANELA = int(os.getenv("META_TENTATIVAS_JANELA", "3"))
+# Sincronização incremental: dias antes do watermark que são buscados de novo (a Meta reatribui conversões)
+META_JANELA_REATRIBUICAO_DIAS = int(os.getenv("META_JANELA_REATRIBUICAO_DIAS", "7"))
+# Base da Graph API (aponte para um servidor local, ex.: graph_stub_server.py, em testes)
+META_GRAPH_URL = os.getenv("META_GRAPH_URL", "https://graph.facebook.com/v19.0").rstrip("/")
+# Relatórios assíncronos da Insights API: usados acima destes limiares de intervalo (dias) ou linhas estimadas
+META_ASYNC_LIMIAR_DIAS = int(os.getenv("META_ASYNC_LIMIAR_DIAS", "90"))
+META_ASYNC_LIMIAR_LINHAS = int(os.getenv("META_ASYNC_LIMIAR_LINHAS", "20000"))
+META_ASYNC_TIMEOUT_SEGUNDOS = int(os.getenv("META_ASYNC_TIMEOUT_SEGUNDOS", "600"))
+META_ASYNC_LIMITE_PAGINA = int(os.getenv("META_ASYNC_LIMITE_PAGINA", "1000"))
+# Cliente HTTP da Graph API: conexões mantidas no pool, tentativas em erros transitórios e timeout por chamada
+META_GRAPH_POOL = int(os.getenv("META_GRAPH_POOL", "20"))
+META_GRAPH_TENTATIVAS = int(os.getenv("META_GRAPH_TENTATIVAS", "5"))
+META_GRAPH_TIMEOUT = float(os.getenv("META_GRAPH_TIMEOUT", "60"))
+# Acima deste percentual de uso (cabeçalhos X-*-Usage) as chamadas do token são desaceleradas
+META_GRAPH_LIMIAR_USO = float(os.getenv("META_GRAPH_LIMIAR_USO", "80"))
+# Espera máxima (s) entre tentativas ou por causa do uso
+META_GRAPH_ESPERA_MAXIMA = float(os.getenv("META_GRAPH_ESPERA_MAXIMA", "300"))
+# Páginas da Graph API que podem esperar na fila entre a busca e a gravação (limita a memória da extração)
+META_FILA_MAXIMA_PAGINAS = int(os.getenv("META_FILA_MAXIMA_PAGINAS", "8"))
+# Sincronização automática das contas ativas (services/meta_scheduler.py). Desligada por padrão: ligue em um
+# único servidor; entre processos da mesma máquina (workers do uvicorn) só quem pegar META_SYNC_TRAVA agenda
+META_SYNC_AUTOMATICO = os.getenv("META_SYNC_AUTOMATICO", "false").lower() in ("1", "true", "sim", "yes")
+META_SYNC_TRAVA = os.getenv("META_SYNC_TRAVA", os.path.join(tempfile.gettempdir(), "dashboardai_meta_sync.lock"))
+META_SYNC_INTERVALO_MINUTOS = float(os.getenv("META_SYNC_INTERVALO_MINUTOS", "60"))
+# Variação aleatória (±s) do horário de cada conta, para as contas não sincronizarem todas juntas
+META_SYNC_JITTER_SEGUNDOS = float(os.getenv("META_SYNC_JITTER_SEGUNDOS", "300"))
+# Contas do mesmo access token sincronizadas ao mesmo tempo pelo agendador
+META_SYNC_CONTAS_POR_TOKEN = int(os.getenv("META_SYNC_CONTAS_POR_TOKEN", "1"))
+# De quanto em quanto tempo a lista de contas ativas é relida do banco
+META_SYNC_VERIFICACAO_SEGUNDOS = float(os.getenv("META_SYNC_VERIFICACAO_SEGUNDOS", "60"))
+# Cópia colunar dos insights em Parquet (services/parquet_store.py), particionada por conta e mês
+META_PARQUET_HABILITADO = os.getenv("META_PARQUET_HABILITADO", "false").lower() in ("1", "true", "sim", "yes")
+META_PARQUET_DIR = os.getenv("META_PARQUET_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "insights"))
+# Linhas por bloco ao gravar os dados de uma data source (tabela data_source_chunks)
+DATA_SOURCES_LINHAS_POR_CHUNK = int(os.getenv("DATA_SOURCES_LINHAS_POR_CHUNK", "1000"))
+# Cache em memória da tabela settings (services/settings_store.py): POST /settings invalida na hora;
+# o tempo de vida cobre alterações feitas por outros processos (vários workers) ou direto no banco
+SETTINGS_CACHE_SEGUNDOS = float(os.getenv("SETTINGS_CACHE_SEGUNDOS", "60"))
+# Cache das respostas da IA (services/cache_ia.py): LRU em memória + arquivo SQLite que sobrevive a reinícios
+IA_CACHE_HABILITADO = os.getenv("IA_CACHE_HABILITADO", "true").lower() in ("1", "true", "sim", "yes")
+IA_CACHE_TTL_SEGUNDOS = float(os.getenv("IA_CACHE_TTL_SEGUNDOS", "86400"))
+IA_CACHE_MAX_MEMORIA = int(os.getenv("IA_CACHE_MAX_MEMORIA", "256"))
+IA_CACHE_ARQUIVO = os.getenv("IA_CACHE_ARQUIVO", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "cache_ia.sqlite"))
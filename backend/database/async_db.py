@@ -0,0 +1,17 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from database.connection import DB_POOL_MAX
+
+# Acesso ao banco a partir de endpoints async: sqlite3 e psycopg2 são bloqueantes, então as funções
+# de serviço rodam num pool de threads próprio e o event loop fica livre para outras requisições.
+# O pool tem o mesmo tamanho do pool de conexões (DB_POOL_MAX): mais threads só esperariam conexão.
+# No SQLite cada thread do pool mantém as suas conexões persistentes (database/connection.py).
+
+_executor = ThreadPoolExecutor(max_workers=DB_POOL_MAX, thread_name_prefix="db")
+
+
+async def executar_no_banco(funcao, *args, **kwargs):
+    """Executa funcao(*args, **kwargs) (bloqueante) no pool do banco e aguarda o resultado sem bloquear o loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(funcao, *args, **kwargs))
@@ -0,0 +1,100 @@
+"""
+Compactação de account_ads_facebook_dataframe: aplica as migrações pendentes (a 006 cria a chave por nível),
+remove de uma vez as linhas repetidas pela chave por nível e devolve ao disco o espaço liberado
+(VACUUM no SQLite, VACUUM FULL da tabela no Postgres).
+
+No Postgres o VACUUM FULL bloqueia a tabela enquanto roda; use --sem-vacuum para só remover as duplicatas
+(o espaço fica livre para novas linhas, mas o arquivo não diminui).
+
+Uso:
+    python -m database.compactacao
+    python -m database.compactacao --sem-vacuum
+"""
+import sys
+from typing import Any, Dict
+from database.connection import get_db_connection, is_sqlite
+from database.migrations import TABELA_INSIGHTS, aplicar_migracoes, remover_duplicatas_insights
+
+
+def _tamanho_bytes(cur, sqlite: bool) -> int:
+    if sqlite:
+        cur.execute("PRAGMA page_count")
+        paginas = cur.fetchone()[0]
+        cur.execute("PRAGMA page_size")
+        return paginas * cur.fetchone()[0]
+    cur.execute("SELECT pg_total_relation_size(%s)", (TABELA_INSIGHTS,))
+    return cur.fetchone()[0]
+
+
+def _contar_linhas(cur) -> int:
+    cur.execute(f"SELECT COUNT(*) FROM {TABELA_INSIGHTS}")
+    return cur.fetchone()[0]
+
+
+def compactar_insights(conn, vacuum: bool = True) -> Dict[str, Any]:
+    """
+    Remove as duplicatas de account_ads_facebook_dataframe e recupera o espaço.
+    Retorna linhas antes/depois, linhas removidas e o tamanho (banco inteiro no SQLite, tabela e índices no Postgres)
+    antes e depois, em bytes.
+    """
+    sqlite = is_sqlite(conn)
+    cur = conn.cursor()
+    bytes_antes = _tamanho_bytes(cur, sqlite)
+    linhas_antes = _contar_linhas(cur)
+    cur.close()
+
+    # A migração 006 já remove as duplicatas antes de criar o índice da chave por nível
+    aplicar_migracoes(conn)
+    cur = conn.cursor()
+    try:
+        remover_duplicatas_insights(cur)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        cur.close()
+        raise
+    linhas_depois = _contar_linhas(cur)
+
+    if vacuum:
+        if sqlite:
+            cur.execute("VACUUM")
+            cur.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            cur.execute("ANALYZE")
+        else:
+            # VACUUM não roda dentro de transação
+            conn.autocommit = True
+            cur.execute(f"VACUUM FULL ANALYZE {TABELA_INSIGHTS}")
+    bytes_depois = _tamanho_bytes(cur, sqlite)
+    cur.close()
+
+    return {
+        "linhas_antes": linhas_antes,
+        "linhas_depois": linhas_depois,
+        "removidas": linhas_antes - linhas_depois,
+        "bytes_antes": bytes_antes,
+        "bytes_depois": bytes_depois,
+        "bytes_recuperados": max(bytes_antes - bytes_depois, 0),
+    }
+
+
+def _mb(valor: int) -> str:
+    return f"{valor / 1024 / 1024:.1f} MB"
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if any(arg not in ("--sem-vacuum",) for arg in argv):
+        print(__doc__)
+        return 1
+    conn = get_db_connection()
+    try:
+        resultado = compactar_insights(conn, vacuum="--sem-vacuum" not in argv)
+    finally:
+        conn.close()
+    print(f"Linhas: {resultado['linhas_antes']} -> {resultado['linhas_depois']} ({resultado['removidas']} duplicatas removidas)")
+    print(f"Tamanho: {_mb(resultado['bytes_antes'])} -> {_mb(resultado['bytes_depois'])} ({_mb(resultado['bytes_recuperados'])} recuperados)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,69 @@
 import os
+import queue
 import sqlite3
+import threading
+import time
+import weakref
 import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+from contextlib import contextmanager
+from functools import lru_cache
+from psycopg2.pool import ThreadedConnectionPool
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Pool de conexões: no Postgres, mínimo/máximo de conexões abertas; no SQLite, máximo de conexões ociosas por thread
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+# Segundos esperando uma conexão livre antes de desistir
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Conexões ociosas há mais que isso passam por um SELECT 1 antes de serem reusadas
+DB_POOL_VERIFICAR_APOS = float(os.getenv("DB_POOL_VERIFICAR_APOS", "30"))
+
+# Perfil do SQLite: WAL deixa leitores e o escritor trabalharem ao mesmo tempo, e com synchronous=NORMAL
+# o commit não espera o fsync (um crash do SO pode perder as últimas transações, mas não corrompe o banco)
+DB_SQLITE_JOURNAL_MODE = os.getenv("DB_SQLITE_JOURNAL_MODE", "WAL")
+DB_SQLITE_SYNCHRONOUS = os.getenv("DB_SQLITE_SYNCHRONOUS", "NORMAL")
+# Megabytes do arquivo lidos via mmap e de cache de páginas por conexão
+DB_SQLITE_MMAP_MB = int(os.getenv("DB_SQLITE_MMAP_MB", "256"))
+DB_SQLITE_CACHE_MB = int(os.getenv("DB_SQLITE_CACHE_MB", "64"))
+# Quanto tempo uma escrita espera o lock de outra conexão antes de falhar com "database is locked"
+DB_SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("DB_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+
+@lru_cache(maxsize=1024)
+def _traduzir_sql(query: str) -> str:
+    # Replace %s with ? for SQLite compatibility
+    # This is a simple replacement; strictly speaking, we should be careful about %s inside strings,
+    # but for this project's queries it should be fine.
+    return query.replace('%s', '?')
+
+
+def _abrir_sqlite(db_file):
+    conn = sqlite3.connect(db_file, detect_types=sqlite3.PARSE_DECLTYPES|sqlite3.PARSE_COLNAMES,
+                           timeout=DB_SQLITE_BUSY_TIMEOUT_MS / 1000)
+    conn.execute(f"PRAGMA busy_timeout = {DB_SQLITE_BUSY_TIMEOUT_MS}")
+    if DB_SQLITE_JOURNAL_MODE:
+        # journal_mode fica gravado no arquivo; nas demais conexões é só uma confirmação
+        conn.execute(f"PRAGMA journal_mode = {DB_SQLITE_JOURNAL_MODE}")
+    if DB_SQLITE_SYNCHRONOUS:
+        conn.execute(f"PRAGMA synchronous = {DB_SQLITE_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA mmap_size = {DB_SQLITE_MMAP_MB * 1024 * 1024}")
+    # Valor negativo = tamanho em KiB
+    conn.execute(f"PRAGMA cache_size = -{DB_SQLITE_CACHE_MB * 1024}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+
 class SQLiteCursorWrapper:
     def __init__(self, cursor, as_dict=False):
         self.cursor = cursor
         self.as_dict = as_dict
 
     def execute(self, query, params=None):
-        # Replace %s with ? for SQLite compatibility
-        # This is a simple replacement; strictly speaking, we should be careful about %s inside strings,
-        # but for this project's queries it should be fine.
-        query = query.replace('%s', '?')
+        query = _traduzir_sql(query)
         try:
             if params:
                 self.cursor.execute(query, params)
@@ -27,6 +76,16 @@ class SQLiteCursorWrapper:
             raise e
         return self
 
+    def executemany(self, query, seq_params):
+        query = _traduzir_sql(query)
+        try:
+            self.cursor.executemany(query, seq_params)
+        except Exception as e:
+            print(f"SQLite Execution Error: {e}")
+            print(f"Query: {query}")
+            raise e
+        return self
+
     def fetchone(self):
         row = self.cursor.fetchone()
         if row is None:
@@ -41,6 +100,12 @@ class SQLiteCursorWrapper:
             return [dict(row) for row in rows]
         return rows
 
+    def fetchmany(self, size=None):
+        rows = self.cursor.fetchmany(size or self.cursor.arraysize)
+        if self.as_dict:
+            return [dict(row) for row in rows]
+        return rows
+
     def close(self):
         self.cursor.close()
 
@@ -53,10 +118,12 @@ class SQLiteCursorWrapper:
         return self.cursor.description
 
 class SQLiteConnectionWrapper:
-    def __init__(self, db_file):
-        self.conn = sqlite3.connect(db_file, detect_types=sqlite3.PARSE_DECLTYPES|sqlite3.PARSE_COLNAMES)
+    def __init__(self, db_file, conn=None, devolver=None):
+        # Com `devolver`, a conexão veio do pool da thread e close() a devolve em vez de fechar
+        self.conn = conn or _abrir_sqlite(db_file)
         self.conn.row_factory = sqlite3.Row  # Enable name access
         self.autocommit = True # Dummy property to satisfy psycopg2 usage
+        self._devolver = devolver
 
     def cursor(self, cursor_factory=None):
         # If cursor_factory is provided (like RealDictCursor), we treat it as a request for dict output
@@ -70,35 +137,321 @@ class SQLiteConnectionWrapper:
         self.conn.rollback()
 
     def close(self):
-        self.conn.close()
+        if self._devolver is None:
+            self.conn.close()
+            return
+        if self.conn is not None:
+            devolver, conn = self._devolver, self.conn
+            self.conn = None
+            devolver(conn)
 
-def get_db_connection():
-    db_type = os.getenv("DB_TYPE", "postgres")
-    
-    if db_type == "sqlite":
-        # Ensure the database is initialized
-        db_file = os.getenv("DB_NAME", "app_db.sqlite")
-        
-        # If relative path, make it relative to the backend root (assuming this runs from backend root or consistent location)
-        # But safest is to use absolute path or rely on CWD. 
-        # Given we are in backend/database, let's look for it in backend/ or root.
-        # Let's assume it's in the current working directory or specify a path.
-        if not os.path.isabs(db_file):
-            # Try to locate it relative to this file
-            base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            db_path = os.path.join(base_dir, db_file)
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, tb):
+        _finalizar(self, tipo)
+        return False
+
+
+class PostgresPooledConnection:
+    """
+    Conexão emprestada do pool do Postgres; close() devolve ao pool. O resto é repassado à conexão psycopg2.
+    Se o objeto for coletado sem close() (ex.: exceção antes do close), a conexão é entregue a `abandonar`.
+    """
+
+    def __init__(self, conn, devolver, abandonar):
+        object.__setattr__(self, "_conn", conn)
+        object.__setattr__(self, "_devolver", devolver)
+        object.__setattr__(self, "_finalizador", weakref.finalize(self, abandonar, conn))
+
+    def __getattr__(self, nome):
+        conn = object.__getattribute__(self, "_conn")
+        if conn is None:
+            raise psycopg2.InterfaceError("connection already closed")
+        return getattr(conn, nome)
+
+    def __setattr__(self, nome, valor):
+        setattr(self._conn, nome, valor)
+
+    def close(self):
+        conn = object.__getattribute__(self, "_conn")
+        if conn is not None:
+            object.__setattr__(self, "_conn", None)
+            self._finalizador.detach()
+            self._devolver(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, tb):
+        _finalizar(self, tipo)
+        return False
+
+
+def _finalizar(conn, tipo_erro):
+    try:
+        if tipo_erro is None:
+            conn.commit()
         else:
-            db_path = db_file
-            
-        return SQLiteConnectionWrapper(db_path)
-
-    # Fallback to Postgres
-    conn = psycopg2.connect(
-        dbname=os.getenv("DB_NAME"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        host=os.getenv("DB_HOST"),
-        port=os.getenv("DB_PORT"),
-    )
-    conn.autocommit = True
-    return conn
+            conn.rollback()
+    finally:
+        conn.close()
+
+
+def is_sqlite(conn):
+    """Indica se a conexão aponta para o backend SQLite (o SQL gerado difere em alguns pontos)."""
+    return isinstance(conn, SQLiteConnectionWrapper)
+
+
+def _caminho_sqlite():
+    db_file = os.getenv("DB_NAME", "app_db.sqlite")
+    # If relative path, make it relative to the backend root (assuming this runs from backend root or consistent location)
+    if not os.path.isabs(db_file):
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return os.path.join(base_dir, db_file)
+    return db_file
+
+
+class _OciosasDaThread(dict):
+    def __init__(self):
+        super().__init__()
+        # Lista (e não int) para o finalizador enxergar o valor atualizado
+        self.contagem = [0]
+
+
+class _PoolSQLite:
+    """
+    Conexões SQLite persistentes por thread (o sqlite3 não deixa uma conexão trocar de thread).
+    Cada thread guarda as suas conexões ociosas; chamadas aninhadas na mesma thread recebem
+    conexões distintas. Ao devolver, o que não foi commitado é desfeito, como no close() antigo.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {"criadas": 0, "reaproveitadas": 0, "em_uso": 0, "abertas": 0}
+
+    def _ociosas(self, db_path):
+        por_banco = getattr(self._local, "ociosas", None)
+        if por_banco is None:
+            por_banco = self._local.ociosas = _OciosasDaThread()
+            # Quando a thread termina, as conexões ociosas dela são coletadas junto
+            weakref.finalize(por_banco, self._thread_encerrada, por_banco.contagem)
+        return por_banco.setdefault(db_path, [])
+
+    def _thread_encerrada(self, contagem):
+        with self._lock:
+            self._stats["abertas"] -= contagem[0]
+
+    def obter(self):
+        db_path = _caminho_sqlite()
+        ociosas = self._ociosas(db_path)
+        if ociosas:
+            conn = ociosas.pop()
+            self._local.ociosas.contagem[0] -= 1
+            with self._lock:
+                self._stats["reaproveitadas"] += 1
+                self._stats["em_uso"] += 1
+        else:
+            conn = _abrir_sqlite(db_path)
+            with self._lock:
+                self._stats["criadas"] += 1
+                self._stats["em_uso"] += 1
+                self._stats["abertas"] += 1
+        return SQLiteConnectionWrapper(db_path, conn=conn, devolver=lambda c: self._devolver(db_path, c))
+
+    def _devolver(self, db_path, conn):
+        with self._lock:
+            self._stats["em_uso"] -= 1
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            with self._lock:
+                self._stats["abertas"] -= 1
+            return
+        ociosas = self._ociosas(db_path)
+        if len(ociosas) >= DB_POOL_MAX:
+            conn.close()
+            with self._lock:
+                self._stats["abertas"] -= 1
+            return
+        ociosas.append(conn)
+        self._local.ociosas.contagem[0] = sum(map(len, self._local.ociosas.values()))
+
+    def estatisticas(self):
+        with self._lock:
+            return {"backend": "sqlite", "max_ociosas_por_thread": DB_POOL_MAX, **self._stats}
+
+
+class _PoolPostgres:
+    """
+    ThreadedConnectionPool com espera por vaga (em vez de erro quando esgota) e verificação de saúde:
+    conexões fechadas são descartadas e as ociosas há mais de DB_POOL_VERIFICAR_APOS segundos
+    passam por um SELECT 1 antes de serem entregues.
+
+    Conexões emprestadas e nunca fechadas (conn.close() pulado por uma exceção) voltam ao pool quando o
+    objeto emprestado é coletado: o finalizador só as coloca numa fila (pode rodar dentro de qualquer código,
+    inclusive com os locks do pool tomados) e obter() as devolve de fato.
+    """
+
+    def __init__(self):
+        self._pool = ThreadedConnectionPool(
+            DB_POOL_MIN, DB_POOL_MAX,
+            dbname=os.getenv("DB_NAME"),
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+            host=os.getenv("DB_HOST"),
+            port=os.getenv("DB_PORT"),
+        )
+        self._vagas = threading.BoundedSemaphore(DB_POOL_MAX)
+        self._devolvida_em = {}
+        self._lock = threading.Lock()
+        self._abandonadas = queue.SimpleQueue()
+        self._stats = {"emprestimos": 0, "descartadas": 0, "em_uso": 0, "esperas": 0, "espera_total_ms": 0.0, "abandonadas": 0}
+
+    def _saudavel(self, conn) -> bool:
+        if conn.closed:
+            return False
+        devolvida_em = self._devolvida_em.get(id(conn))
+        if devolvida_em is None or time.monotonic() - devolvida_em < DB_POOL_VERIFICAR_APOS:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _abandonar(self, conn):
+        # Finalizador: SimpleQueue.put pode ser chamado de qualquer ponto, sem tomar locks
+        self._abandonadas.put(conn)
+
+    def _recolher_abandonadas(self):
+        while True:
+            try:
+                conn = self._abandonadas.get_nowait()
+            except queue.Empty:
+                return
+            print("AVISO: conexão do pool coletada sem close(); devolvendo ao pool")
+            with self._lock:
+                self._stats["abandonadas"] += 1
+            self._devolver(conn)
+
+    def obter(self):
+        inicio = time.monotonic()
+        self._recolher_abandonadas()
+        # Espera em fatias curtas para devolver as conexões abandonadas enquanto aguarda uma vaga
+        while not self._vagas.acquire(timeout=min(0.1, DB_POOL_TIMEOUT)):
+            self._recolher_abandonadas()
+            if time.monotonic() - inicio >= DB_POOL_TIMEOUT:
+                raise psycopg2.pool.PoolError(f"Nenhuma conexão livre no pool após {DB_POOL_TIMEOUT}s (DB_POOL_MAX={DB_POOL_MAX})")
+        espera = time.monotonic() - inicio
+        try:
+            while True:
+                conn = self._pool.getconn()
+                if self._saudavel(conn):
+                    break
+                self._devolvida_em.pop(id(conn), None)
+                self._pool.putconn(conn, close=True)
+                with self._lock:
+                    self._stats["descartadas"] += 1
+            if conn.status != psycopg2.extensions.STATUS_READY:
+                conn.rollback()
+            conn.autocommit = True
+        except Exception:
+            self._vagas.release()
+            raise
+        with self._lock:
+            self._stats["emprestimos"] += 1
+            self._stats["em_uso"] += 1
+            if espera > 0.001:
+                self._stats["esperas"] += 1
+            self._stats["espera_total_ms"] += espera * 1000
+        return PostgresPooledConnection(conn, self._devolver, self._abandonar)
+
+    def _devolver(self, conn):
+        try:
+            descartar = bool(conn.closed)
+            if not descartar and conn.status != psycopg2.extensions.STATUS_READY:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    descartar = True
+            if descartar:
+                self._devolvida_em.pop(id(conn), None)
+            else:
+                self._devolvida_em[id(conn)] = time.monotonic()
+            self._pool.putconn(conn, close=descartar)
+            with self._lock:
+                self._stats["em_uso"] -= 1
+                if descartar:
+                    self._stats["descartadas"] += 1
+        finally:
+            self._vagas.release()
+
+    def estatisticas(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["espera_media_ms"] = round(stats.pop("espera_total_ms") / stats["emprestimos"], 3) if stats["emprestimos"] else 0.0
+        return {
+            "backend": "postgres",
+            "min": DB_POOL_MIN,
+            "max": DB_POOL_MAX,
+            "abertas": len(self._pool._pool) + len(self._pool._used),
+            "ociosas": len(self._pool._pool),
+            **stats,
+        }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _pool():
+    db_type = os.getenv("DB_TYPE", "postgres")
+    pool = _pools.get(db_type)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(db_type)
+            if pool is None:
+                pool = _pools[db_type] = _PoolSQLite() if db_type == "sqlite" else _PoolPostgres()
+    return pool
+
+
+def get_db_connection():
+    """
+    Empresta uma conexão do pool (Postgres) ou a conexão persistente da thread (SQLite).
+    conn.close() devolve a conexão; também pode ser usada como `with get_db_connection() as conn:`
+    (commit ao sair, rollback em caso de erro).
+    """
+    return _pool().obter()
+
+
+@contextmanager
+def conexao():
+    """Empresta uma conexão pelo bloco: commit ao final, rollback se houver erro, e devolve ao pool."""
+    conn = get_db_connection()
+    if not is_sqlite(conn):
+        # No Postgres as conexões ficam em autocommit; dentro do bloco vira uma transação só
+        conn.autocommit = False
+    try:
+        yield conn
+    except BaseException:
+        try:
+            conn.rollback()
+        finally:
+            conn.close()
+        raise
+    else:
+        try:
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def estatisticas_pool():
+    """Uso do pool de conexões do backend configurado (DB_TYPE)."""
+    return _pool().estatisticas()
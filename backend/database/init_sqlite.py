@@ -1,8 +1,10 @@
 import sqlite3
 import os
+import sys
 
 # Define the database path relative to this script
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
 DB_FILE = os.path.join(BASE_DIR, "app_db.sqlite")
 
 def init_db():
@@ -105,6 +107,13 @@ def init_db():
 
     conn.commit()
     conn.close()
+
+    # Índices e tabelas auxiliares vêm das migrações versionadas
+    from database.connection import SQLiteConnectionWrapper
+    from database.migrations import aplicar_migracoes
+    wrapper = SQLiteConnectionWrapper(DB_FILE)
+    aplicar_migracoes(wrapper)
+    wrapper.close()
     print(f"Database initialized successfully.")
 
 if __name__ == "__main__":
@@ -0,0 +1,431 @@
+"""
+Migrações versionadas do schema (SQLite e Postgres).
+
+Cada migração tem um número de versão e é aplicada uma única vez por banco; as já aplicadas ficam
+registradas em schema_migrations. Todas são idempotentes (IF NOT EXISTS), então um banco criado por
+init_sqlite.py ou com índices criados à mão também migra sem erro.
+
+Uso:
+    python -m database.migrations            # aplica as pendentes
+    python -m database.migrations status     # lista aplicadas e pendentes
+    python -m database.migrations explicar   # plano de execução das consultas principais
+"""
+import sys
+import threading
+from database.connection import get_db_connection, is_sqlite
+
+TABELA_INSIGHTS = "account_ads_facebook_dataframe"
+INDICE_CHAVE_INSIGHTS = "ux_account_ads_facebook_dataframe_chave"
+CHAVE_INSIGHTS_ANTIGA = ("account_id", "user_id", "ad_id", "date_start", "date_stop")
+# Chave por nível: entidade_id é o id da entidade do nível da linha (ad_id, adset_id ou campaign_id)
+INDICE_CHAVE_NIVEL = "ux_aafd_chave_nivel"
+CHAVE_INSIGHTS = ("account_id", "user_id", "nivel", "entidade_id", "date_start", "date_stop")
+# Chave do pg_advisory_xact_lock que serializa as migrações entre processos (número fixo qualquer)
+TRAVA_MIGRACOES = 7305318
+
+
+def _m1_meta_sync_state(cur, sqlite):
+    # Watermark da sincronização incremental (services/meta_sync_state.py)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS meta_sync_state (
+            account_id INTEGER NOT NULL,
+            nivel TEXT NOT NULL,
+            last_date_stop TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (account_id, nivel)
+        )
+    """)
+
+
+def _m2_chave_insights(cur, sqlite):
+    # Chave única usada pelo upsert em lote de services/meta_loader.py (trocada pela chave por nível na migração 6).
+    # Antes de criar o índice remove duplicatas antigas, mantendo o registro mais recente.
+    cur.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = %s" if sqlite
+        else "SELECT 1 FROM pg_indexes WHERE indexname = %s",
+        (INDICE_CHAVE_INSIGHTS,),
+    )
+    if cur.fetchone():
+        return
+    chave = ", ".join(CHAVE_INSIGHTS_ANTIGA)
+    cur.execute(f"""
+        DELETE FROM {TABELA_INSIGHTS}
+        WHERE ad_id IS NOT NULL AND id NOT IN (
+            SELECT MAX(id) FROM {TABELA_INSIGHTS}
+            WHERE ad_id IS NOT NULL
+            GROUP BY {chave}
+        )
+    """)
+    if cur.rowcount and cur.rowcount > 0:
+        print(f"[DEBUG] Removidas {cur.rowcount} duplicatas antes de criar {INDICE_CHAVE_INSIGHTS}")
+    cur.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {INDICE_CHAVE_INSIGHTS} ON {TABELA_INSIGHTS} ({chave})")
+
+
+def _m3_indices_insights(cur, sqlite):
+    # Leitura para IA/gráficos: filtro por conta e usuário, extração mais recente primeiro.
+    # Com o índice na mesma ordem do ORDER BY o LIMIT para cedo, sem ordenar a tabela inteira.
+    cur.execute(f"""
+        CREATE INDEX IF NOT EXISTS ix_aafd_conta_usuario_extracao
+        ON {TABELA_INSIGHTS} (account_id, user_id, data_extracao DESC, date_start)
+    """)
+    # Mesma leitura filtrando só por usuário (gráficos e checagem de dados do chat)
+    cur.execute(f"""
+        CREATE INDEX IF NOT EXISTS ix_aafd_usuario_extracao
+        ON {TABELA_INSIGHTS} (user_id, data_extracao DESC, date_start)
+    """)
+
+
+def _m4_indices_contas(cur, sqlite):
+    # buscar_id_conta_por_identificador e o token do conector comparam identificador_conta direto;
+    # o extractor compara TRIM(identificador_conta), que só usa um índice sobre a mesma expressão.
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_accounts_identificador ON accounts_ads_facebook (identificador_conta)")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_accounts_identificador_trim ON accounts_ads_facebook ((TRIM(identificador_conta)))")
+    # Vínculos usuário <-> conta são lidos pelos dois lados (contas do usuário e dono da conta)
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_user_accounts_usuario ON user_accounts (user_id, account_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_user_accounts_conta ON user_accounts (account_id, user_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_user_facebook_facebook_id ON user_facebook (facebook_id)")
+
+
+def _adicionar_coluna(cur, sqlite, tabela: str, coluna: str, tipo: str):
+    if sqlite:
+        cur.execute(f"PRAGMA table_info({tabela})")
+        if any(linha[1] == coluna for linha in cur.fetchall()):
+            return
+        cur.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {tipo}")
+    else:
+        cur.execute(f"ALTER TABLE {tabela} ADD COLUMN IF NOT EXISTS {coluna} {tipo}")
+
+
+def _m5_chunks_data_sources(cur, sqlite):
+    # Dados de uma data source em blocos de linhas (services/data_source_store.py), em vez do JSON único em data_sources.data.
+    # row_count/columns ficam em data_sources para listagens e metadados não lerem os dados.
+    _adicionar_coluna(cur, sqlite, "data_sources", "row_count", "INTEGER")
+    _adicionar_coluna(cur, sqlite, "data_sources", "columns", "TEXT")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS data_source_chunks (
+            data_source_id INTEGER NOT NULL,
+            chunk_index INTEGER NOT NULL,
+            row_start INTEGER NOT NULL,
+            row_count INTEGER NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (data_source_id, chunk_index)
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_data_source_chunks_linhas ON data_source_chunks (data_source_id, row_start)")
+
+
+def remover_duplicatas_insights(cur) -> int:
+    """
+    Remove de uma vez as linhas repetidas pela chave por nível, mantendo a mais recente (maior id).
+    Retorna quantas linhas foram removidas.
+    """
+    chave = ", ".join(CHAVE_INSIGHTS)
+    cur.execute(f"""
+        DELETE FROM {TABELA_INSIGHTS} WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (PARTITION BY {chave} ORDER BY id DESC) AS ordem
+                FROM {TABELA_INSIGHTS}
+                WHERE entidade_id IS NOT NULL
+            ) repetidas
+            WHERE ordem > 1
+        )
+    """)
+    return max(cur.rowcount or 0, 0)
+
+
+def _m6_chave_por_nivel(cur, sqlite):
+    # A chave antiga usava ad_id em todos os níveis: linhas de adset/campaign (ad_id "-" ou NULL) colidiam
+    # entre si ou nunca conflitavam, e eram inseridas de novo a cada sincronização.
+    for coluna in ("campaign_id", "adset_id", "entidade_id"):
+        _adicionar_coluna(cur, sqlite, TABELA_INSIGHTS, coluna, "TEXT")
+    cur.execute(f"UPDATE {TABELA_INSIGHTS} SET nivel = 'ad' WHERE nivel IS NULL")
+    # Anúncios gravados sem ad_id (sincronização sem o campo) recebem o ad_id das outras linhas da conta
+    # com o mesmo nome, quando o nome corresponde a um único anúncio
+    cur.execute("DROP TABLE IF EXISTS mapa_ad_id")
+    cur.execute(f"""
+        CREATE TEMPORARY TABLE mapa_ad_id AS
+        SELECT account_id, user_id, ad_name, MAX(ad_id) AS ad_id
+        FROM {TABELA_INSIGHTS}
+        WHERE nivel = 'ad' AND ad_id IS NOT NULL AND ad_id NOT IN ('', '-') AND ad_name IS NOT NULL
+        GROUP BY account_id, user_id, ad_name
+        HAVING COUNT(DISTINCT ad_id) = 1
+    """)
+    cur.execute("CREATE INDEX ix_mapa_ad_id ON mapa_ad_id (account_id, user_id, ad_name)")
+    cur.execute(f"""
+        UPDATE {TABELA_INSIGHTS} SET entidade_id = (
+            SELECT m.ad_id FROM mapa_ad_id m
+            WHERE m.account_id = {TABELA_INSIGHTS}.account_id AND m.user_id = {TABELA_INSIGHTS}.user_id
+              AND m.ad_name = {TABELA_INSIGHTS}.ad_name
+        )
+        WHERE nivel = 'ad' AND (ad_id IS NULL OR ad_id IN ('', '-'))
+    """)
+    cur.execute("DROP TABLE mapa_ad_id")
+    # Nos demais casos a entidade é o id do nível ou, sem ele, o nome do nível
+    # (mesma regra de services/meta_loader.entidades)
+    cur.execute(f"""
+        UPDATE {TABELA_INSIGHTS} SET entidade_id = CASE
+            WHEN nivel = 'ad' AND ad_id IS NOT NULL AND ad_id NOT IN ('', '-') THEN ad_id
+            ELSE 'nome:' || NULLIF(CASE nivel
+                WHEN 'campaign' THEN campaign_name
+                WHEN 'adset' THEN adset_name
+                ELSE ad_name
+            END, '')
+        END
+        WHERE entidade_id IS NULL
+    """)
+    removidas = remover_duplicatas_insights(cur)
+    if removidas:
+        print(f"[DEBUG] Removidas {removidas} duplicatas antes de criar {INDICE_CHAVE_NIVEL}")
+    cur.execute(f"DROP INDEX IF EXISTS {INDICE_CHAVE_INSIGHTS}")
+    # Sem o índice antigo, o ad_id encontrado pelo nome pode ser gravado na própria coluna
+    cur.execute(f"""
+        UPDATE {TABELA_INSIGHTS} SET ad_id = entidade_id
+        WHERE nivel = 'ad' AND (ad_id IS NULL OR ad_id IN ('', '-')) AND entidade_id NOT LIKE 'nome:%'
+    """)
+    cur.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {INDICE_CHAVE_NIVEL} ON {TABELA_INSIGHTS} ({', '.join(CHAVE_INSIGHTS)})")
+
+
+# Camada Gold (ROADMAP.md): totais diários por campanha e por conjunto, calculados das linhas de nível "ad".
+# Só métricas aditivas (somas de anúncios batem com o total da campanha); reach não soma entre anúncios
+# e as taxas (ctr, cpc, cpm) são derivadas das somas na leitura. "linhas" guarda quantas linhas de anúncio
+# entraram em cada total (médias e contagens por linha). Mantidas pela ingestão (services/meta_gold.py).
+METRICAS_ADITIVAS = ("impressions", "clicks", "spend")
+ROLLUPS = {
+    # tabela: (coluna de id da entidade, coluna de nome da entidade, demais colunas descritivas)
+    "gold_campanha_diario": ("campaign_id", "campaign_name", ()),
+    "gold_conjunto_diario": ("adset_id", "adset_name", ("campaign_id", "campaign_name")),
+}
+
+
+def sql_popular_rollup(tabela: str, filtro: str = "") -> str:
+    """INSERT ... SELECT que calcula o rollup a partir das linhas de anúncio; filtro é SQL extra ("AND ...")."""
+    coluna_id, coluna_nome, descritivas = ROLLUPS[tabela]
+    # Linhas antigas sem o id do nível agrupam pelo nome (mesma regra de entidade_id)
+    chave = f"COALESCE(NULLIF(NULLIF({coluna_id}, ''), '-'), 'nome:' || COALESCE({coluna_nome}, ''))"
+    nomes = (coluna_nome,) + descritivas
+    metricas = ", ".join(METRICAS_ADITIVAS)
+    return f"""
+        INSERT INTO {tabela} (account_id, user_id, dia, {coluna_id}, {", ".join(nomes)}, {metricas}, linhas)
+        SELECT account_id, user_id, date_start, {chave}, {", ".join(f"MAX({c})" for c in nomes)},
+               {", ".join(f"SUM({c})" for c in METRICAS_ADITIVAS)}, COUNT(*)
+        FROM {TABELA_INSIGHTS}
+        WHERE nivel = 'ad' AND date_start = date_stop AND account_id IS NOT NULL AND user_id IS NOT NULL {filtro}
+        GROUP BY account_id, user_id, date_start, {chave}
+    """
+
+
+def _m7_rollups_gold(cur, sqlite):
+    for tabela, (coluna_id, coluna_nome, descritivas) in ROLLUPS.items():
+        descricao = "".join(f"{c} TEXT, " for c in (coluna_nome,) + descritivas)
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {tabela} (
+                account_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                dia TEXT NOT NULL,
+                {coluna_id} TEXT NOT NULL,
+                {descricao}impressions INTEGER,
+                clicks INTEGER,
+                spend REAL,
+                linhas INTEGER NOT NULL,
+                PRIMARY KEY (account_id, user_id, dia, {coluna_id})
+            )
+        """)
+        # Leituras só por usuário (todas as contas dele)
+        cur.execute(f"CREATE INDEX IF NOT EXISTS ix_{tabela}_usuario ON {tabela} (user_id, dia)")
+        cur.execute(f"DELETE FROM {tabela}")
+        cur.execute(sql_popular_rollup(tabela))
+
+
+def _m8_watermark_por_usuario(cur, sqlite):
+    # Insights são gravados e lidos por usuário: cada usuário vinculado à conta tem o seu watermark.
+    # Os antigos (por conta) só são mantidos quando um único usuário tem insights da conta; nos outros casos
+    # não há como saber de quem eram e a próxima sincronização de cada usuário busca o ano inteiro.
+    cur.execute("DROP TABLE IF EXISTS meta_sync_state_nova")
+    cur.execute("""
+        CREATE TABLE meta_sync_state_nova (
+            account_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            nivel TEXT NOT NULL,
+            last_date_stop TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (account_id, user_id, nivel)
+        )
+    """)
+    cur.execute(f"""
+        INSERT INTO meta_sync_state_nova (account_id, user_id, nivel, last_date_stop, updated_at)
+        SELECT s.account_id, u.user_id, s.nivel, s.last_date_stop, s.updated_at
+        FROM meta_sync_state s
+        JOIN (
+            SELECT account_id, MIN(user_id) AS user_id FROM {TABELA_INSIGHTS}
+            WHERE user_id IS NOT NULL
+            GROUP BY account_id
+            HAVING COUNT(DISTINCT user_id) = 1
+        ) u ON u.account_id = s.account_id
+    """)
+    cur.execute("DROP TABLE meta_sync_state")
+    cur.execute("ALTER TABLE meta_sync_state_nova RENAME TO meta_sync_state")
+
+
+# (versão, nome, função). Novas migrações entram sempre no fim, com a próxima versão.
+MIGRACOES = [
+    (1, "tabela meta_sync_state", _m1_meta_sync_state),
+    (2, "chave única de account_ads_facebook_dataframe", _m2_chave_insights),
+    (3, "índices de leitura de account_ads_facebook_dataframe", _m3_indices_insights),
+    (4, "índices de contas e vínculos", _m4_indices_contas),
+    (5, "data_sources em blocos de linhas", _m5_chunks_data_sources),
+    (6, "chave de account_ads_facebook_dataframe por nível", _m6_chave_por_nivel),
+    (7, "rollups gold diários por campanha e conjunto", _m7_rollups_gold),
+    (8, "watermark de sincronização por usuário", _m8_watermark_por_usuario),
+]
+
+_schema_garantido = False
+_schema_lock = threading.Lock()
+
+
+def _garantir_tabela_migracoes(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            versao INTEGER PRIMARY KEY,
+            nome TEXT NOT NULL,
+            aplicada_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def versoes_aplicadas(conn) -> dict:
+    cur = conn.cursor()
+    _garantir_tabela_migracoes(cur)
+    conn.commit()
+    cur.execute("SELECT versao, aplicada_em FROM schema_migrations ORDER BY versao")
+    aplicadas = {versao: str(aplicada_em) for versao, aplicada_em in cur.fetchall()}
+    cur.close()
+    return aplicadas
+
+
+def aplicar_migracoes(conn) -> list:
+    """
+    Aplica, em ordem, as migrações ainda não registradas em schema_migrations. Retorna as versões aplicadas.
+
+    Cada migração roda numa transação própria (no Postgres as conexões do pool ficam em autocommit, que é
+    desligado aqui): se falhar no meio, nada dela fica no banco. Processos migrando ao mesmo tempo são
+    serializados por uma trava (advisory lock no Postgres, BEGIN IMMEDIATE no SQLite) e quem chega depois
+    pula a versão que o outro já registrou.
+    """
+    sqlite = is_sqlite(conn)
+    aplicadas = versoes_aplicadas(conn)
+    pendentes = [migracao for migracao in MIGRACOES if migracao[0] not in aplicadas]
+    if not pendentes:
+        return []
+    autocommit = conn.autocommit
+    if not sqlite:
+        conn.autocommit = False
+    novas = []
+    cur = conn.cursor()
+    try:
+        for versao, nome, migrar in pendentes:
+            try:
+                if sqlite:
+                    cur.execute("BEGIN IMMEDIATE")
+                else:
+                    cur.execute("SELECT pg_advisory_xact_lock(%s)", (TRAVA_MIGRACOES,))
+                cur.execute("SELECT 1 FROM schema_migrations WHERE versao = %s", (versao,))
+                if cur.fetchone():
+                    # Outro processo aplicou enquanto esperávamos a trava
+                    conn.rollback()
+                    continue
+                migrar(cur, sqlite)
+                cur.execute("INSERT INTO schema_migrations (versao, nome) VALUES (%s, %s)", (versao, nome))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            print(f"[MIGRAÇÃO] {versao:03d} aplicada: {nome}")
+            novas.append(versao)
+    finally:
+        cur.close()
+        if not sqlite:
+            conn.autocommit = autocommit
+    return novas
+
+
+def garantir_schema(conn):
+    """Aplica as migrações pendentes uma vez por processo (chamado antes de usar tabelas/índices migrados)."""
+    global _schema_garantido
+    if _schema_garantido:
+        return
+    with _schema_lock:
+        if _schema_garantido:
+            return
+        aplicar_migracoes(conn)
+        _schema_garantido = True
+
+
+# Consultas principais, com parâmetros de exemplo, para conferir os planos de execução
+CONSULTAS_PRINCIPAIS = {
+    "insights por conta e usuário": (
+        f"SELECT * FROM {TABELA_INSIGHTS} WHERE account_id = %s AND user_id = %s ORDER BY data_extracao DESC, date_start ASC LIMIT 5000",
+        (1, 1),
+    ),
+    "insights por usuário": (
+        f"SELECT * FROM {TABELA_INSIGHTS} WHERE user_id = %s ORDER BY data_extracao DESC, date_start ASC LIMIT 5000",
+        (1,),
+    ),
+    "chave do upsert": (
+        f"SELECT id FROM {TABELA_INSIGHTS} WHERE account_id = %s AND user_id = %s AND nivel = %s AND entidade_id = %s AND date_start = %s AND date_stop = %s",
+        (1, 1, "ad", "1", "2025-01-01", "2025-01-01"),
+    ),
+    "estimativa de linhas da conta": (
+        f"SELECT COUNT(*), COUNT(DISTINCT date_start) FROM {TABELA_INSIGHTS} WHERE account_id = %s",
+        (1,),
+    ),
+    "conta por identificador (TRIM)": (
+        "SELECT id, token FROM accounts_ads_facebook WHERE TRIM(identificador_conta) = %s AND plataforma = 'Facebook Ads' AND ativo = true",
+        ("1",),
+    ),
+    "conta por identificador": (
+        "SELECT id FROM accounts_ads_facebook WHERE identificador_conta = %s OR identificador_conta = %s OR identificador_conta = %s LIMIT 1",
+        ("1", "act_1", "1"),
+    ),
+}
+
+
+def explicar_consultas(conn) -> dict:
+    """Plano de execução de cada consulta principal (EXPLAIN QUERY PLAN no SQLite, EXPLAIN no Postgres)."""
+    prefixo = "EXPLAIN QUERY PLAN " if is_sqlite(conn) else "EXPLAIN "
+    planos = {}
+    cur = conn.cursor()
+    for nome, (sql, params) in CONSULTAS_PRINCIPAIS.items():
+        cur.execute(prefixo + sql, params)
+        # SQLite: (id, parent, notused, detail); Postgres: uma coluna de texto por linha
+        planos[nome] = [str(linha[-1]) for linha in cur.fetchall()]
+    cur.close()
+    return planos
+
+
+def main(argv=None):
+    comando = (argv or sys.argv[1:] or ["aplicar"])[0]
+    conn = get_db_connection()
+    try:
+        if comando == "aplicar":
+            novas = aplicar_migracoes(conn)
+            print(f"{len(novas)} migrações aplicadas." if novas else "Schema já está atualizado.")
+        elif comando == "status":
+            aplicadas = versoes_aplicadas(conn)
+            for versao, nome, _ in MIGRACOES:
+                situacao = f"aplicada em {aplicadas[versao]}" if versao in aplicadas else "pendente"
+                print(f"{versao:03d} {nome}: {situacao}")
+        elif comando == "explicar":
+            for nome, plano in explicar_consultas(conn).items():
+                print(f"\n== {nome}")
+                for linha in plano:
+                    print(f"   {linha}")
+        else:
+            print(__doc__)
+            return 1
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+"""
+Servidor local que imita a Graph API (Insights e descoberta de ativos) para testar a extração sem tocar na Meta.
+
+Uso:
+    python graph_stub_server.py --porta 8765 --anuncios 50
+    META_GRAPH_URL=http://localhost:8765/v19.0 uvicorn main:app
+
+Responde:
+    GET  /v19.0/act_X/insights            chamada síncrona paginada (level, fields, time_range, limit, after)
+    POST /v19.0/act_X/insights            cria um report run assíncrono e retorna report_run_id
+    GET  /v19.0/<report_run_id>           status do report run (async_status, async_percent_completion)
+    GET  /v19.0/<report_run_id>/insights  resultado paginado do report run
+    GET  /v19.0/me/businesses, /v19.0/me/adaccounts, /v19.0/<bm>/owned_ad_accounts, /v19.0/?ids=...
+    POST /v19.0                           requisição batch (lista de GETs relativos)
+
+Com --uso N, toda resposta traz X-App-Usage com N% de uso; com --falhas-transitorias N,
+as N primeiras requisições falham com o erro 17 (limite de chamadas do usuário).
+"""
+import argparse
+import itertools
+import json
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+VERSAO = "v19.0"
+_relatorios = {}
+_ids = itertools.count(1)
+_requisicoes = itertools.count(1)
+_lock = threading.Lock()
+
+
+def gerar_itens(account_id: str, nivel: str, fields: list, time_range: dict, anuncios: int) -> list:
+    """Gera linhas determinísticas: uma por entidade do nível e por dia do intervalo."""
+    inicio = datetime.strptime(time_range["since"], "%Y-%m-%d").date()
+    fim = datetime.strptime(time_range["until"], "%Y-%m-%d").date()
+    entidades = {"ad": anuncios, "adset": max(1, anuncios // 5), "campaign": max(1, anuncios // 25)}.get(nivel, 1)
+    itens = []
+    dia = inicio
+    while dia <= fim:
+        for indice in range(entidades):
+            # n: primeiro anúncio da entidade, para os ids de conjunto/campanha baterem entre os níveis
+            n = indice * {"adset": 5, "campaign": 25}.get(nivel, 1)
+            semente = (dia.toordinal() * 31 + n) % 997
+            impressions = 1000 + semente * 7
+            clicks = 10 + semente % 90
+            spend = round(5 + semente * 0.37, 2)
+            item = {
+                "account_id": account_id.replace("act_", ""),
+                "campaign_id": f"90{n // 25}",
+                "campaign_name": f"Campanha {n // 25}",
+                "adset_id": f"80{n // 5}",
+                "adset_name": f"Conjunto {n // 5}",
+                "ad_id": f"70{n}",
+                "ad_name": f"Anúncio {n}",
+                "impressions": str(impressions),
+                "reach": str(int(impressions * 0.8)),
+                "clicks": str(clicks),
+                "spend": f"{spend:.2f}",
+                "cpc": f"{spend / clicks:.6f}",
+                "ctr": f"{clicks / impressions * 100:.6f}",
+                "cpm": f"{spend / impressions * 1000:.6f}",
+                "frequency": "1.25",
+                "objective": "OUTCOME_TRAFFIC",
+                "actions": [{"action_type": "link_click", "value": str(clicks)}],
+                "date_start": dia.strftime("%Y-%m-%d"),
+                "date_stop": dia.strftime("%Y-%m-%d"),
+            }
+            if fields:
+                item = {k: v for k, v in item.items() if k in fields or k in ("date_start", "date_stop")}
+            itens.append(item)
+        dia += timedelta(days=1)
+    return itens
+
+
+def listar_bms(quantidade: int) -> list:
+    return [{"id": f"10{i}", "name": f"BM {i}", "verification_status": "verified", "created_time": "2024-01-01T00:00:00+0000"}
+            for i in range(quantidade)]
+
+
+def contas_bm(business_id: str, quantidade: int) -> list:
+    return [{"id": f"act_{business_id}0{j}", "name": f"Conta {business_id}-{j}", "account_status": 1,
+             "business": {"id": business_id}, "owner": {"id": business_id}}
+            for j in range(quantidade)]
+
+
+def contas_diretas(bms: int, contas_por_bm: int, diretas: int) -> list:
+    # Inclui parte das contas das BMs (como a Graph API faz) e contas só do usuário
+    contas = [conta for bm in listar_bms(min(bms, 2)) for conta in contas_bm(bm["id"], contas_por_bm)]
+    contas += [{"id": f"act_99{j}", "name": f"Conta direta {j}", "account_status": 1, "owner": {"id": "1000"}} for j in range(diretas)]
+    return contas
+
+
+class GraphStubHandler(BaseHTTPRequestHandler):
+    config = None
+
+    def log_message(self, formato, *args):
+        if not self.config.silencioso:
+            super().log_message(formato, *args)
+
+    def _responder(self, status: int, corpo):
+        conteudo = json.dumps(corpo).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(conteudo)))
+        if self.config.uso:
+            uso = self.config.uso
+            self.send_header("X-App-Usage", json.dumps({"call_count": uso, "total_time": uso, "total_cputime": uso}))
+        self.end_headers()
+        self.wfile.write(conteudo)
+
+    def _pagina(self, itens: list, params: dict, caminho: str) -> tuple:
+        limite = int(params.get("limit", 25))
+        inicio = int(params.get("after", 0))
+        corpo = {"data": itens[inicio:inicio + limite]}
+        if inicio + limite < len(itens):
+            proximo = dict(params, after=str(inicio + limite))
+            host = self.headers.get("Host", f"localhost:{self.config.porta}")
+            corpo["paging"] = {"next": f"http://{host}{caminho}?{urlencode(proximo)}"}
+        return 200, corpo
+
+    def _params(self, corpo: str = None) -> dict:
+        query = parse_qs(urlparse(self.path).query)
+        if corpo:
+            query.update(parse_qs(corpo))
+        return {k: v[-1] for k, v in query.items()}
+
+    def _itens(self, conta: str, params: dict) -> list:
+        fields = [f for f in params.get("fields", "").split(",") if f]
+        time_range = json.loads(params.get("time_range") or "{}") or {"since": "2025-01-01", "until": "2025-01-07"}
+        return gerar_itens(conta, params.get("level", "ad"), fields, time_range, self.config.anuncios)
+
+    def _resolver_get(self, caminho: str, params: dict) -> tuple:
+        partes = caminho.strip("/").split("/")
+        if not partes or partes[0] != VERSAO:
+            return 404, {"error": {"message": "Unknown path", "code": 803}}
+
+        if len(partes) == 1 and "ids" in params:
+            # ?ids=bm1,bm2&fields=owned_ad_accounts.limit(N){...}
+            limite = re.search(r"owned_ad_accounts\.limit\((\d+)\)", params.get("fields", ""))
+            corpo = {}
+            for business_id in params["ids"].split(","):
+                _, pagina = self._pagina(contas_bm(business_id, self.config.contas_por_bm),
+                                         {"limit": limite.group(1) if limite else "25"}, f"/{VERSAO}/{business_id}/owned_ad_accounts")
+                corpo[business_id] = {"id": business_id, "owned_ad_accounts": pagina}
+            return 200, corpo
+        if partes[1:] == ["me"]:
+            return 200, {"id": "1000", "name": "Usuário Stub"}
+        if partes[1:] == ["me", "businesses"]:
+            return self._pagina(listar_bms(self.config.bms), params, caminho)
+        if partes[1:] == ["me", "adaccounts"]:
+            return self._pagina(contas_diretas(self.config.bms, self.config.contas_por_bm, self.config.contas_diretas), params, caminho)
+        if len(partes) == 3 and partes[2] == "owned_ad_accounts":
+            return self._pagina(contas_bm(partes[1], self.config.contas_por_bm), params, caminho)
+
+        if len(partes) < 2:
+            return 404, {"error": {"message": "Unknown path", "code": 803}}
+        if partes[1].startswith("act_") and partes[2:] == ["insights"]:
+            time_range = json.loads(params.get("time_range") or "{}")
+            if time_range and self.config.limite_dias_sincrono:
+                dias = (datetime.strptime(time_range["until"], "%Y-%m-%d") - datetime.strptime(time_range["since"], "%Y-%m-%d")).days + 1
+                if dias > self.config.limite_dias_sincrono:
+                    return 500, {"error": {"message": "Please reduce the amount of data you're asking for, then retry your request", "code": 1}}
+            return self._pagina(self._itens(partes[1], params), params, caminho)
+
+        relatorio = _relatorios.get(partes[1])
+        if relatorio is None:
+            return 404, {"error": {"message": "Unknown report run", "code": 100}}
+        if partes[2:] == ["insights"]:
+            if relatorio["percentual"] < 100:
+                return 400, {"error": {"message": "Report not ready", "code": 100}}
+            return self._pagina(relatorio["itens"], params, caminho)
+        with _lock:
+            # Cada consulta de status avança o job; conclui depois de algumas consultas
+            relatorio["percentual"] = min(100, relatorio["percentual"] + self.config.passo_relatorio)
+            percentual = relatorio["percentual"]
+        status = "Job Completed" if percentual >= 100 else "Job Running"
+        return 200, {"id": partes[1], "async_status": status, "async_percent_completion": percentual}
+
+    def _falha_transitoria(self) -> bool:
+        if next(_requisicoes) <= self.config.falhas_transitorias:
+            self._responder(400, {"error": {"message": "User request limit reached", "code": 17}})
+            return True
+        return False
+
+    def do_GET(self):
+        time.sleep(self.config.latencia)
+        if self._falha_transitoria():
+            return
+        self._responder(*self._resolver_get(urlparse(self.path).path, self._params()))
+
+    def do_POST(self):
+        time.sleep(self.config.latencia)
+        if self._falha_transitoria():
+            return
+        caminho = urlparse(self.path).path
+        partes = caminho.strip("/").split("/")
+        tamanho = int(self.headers.get("Content-Length") or 0)
+        params = self._params(self.rfile.read(tamanho).decode("utf-8") if tamanho else None)
+        if partes == [VERSAO] and "batch" in params:
+            # Batch: executa cada sub-requisição GET e devolve [{code, body}] na mesma ordem
+            respostas = []
+            for requisicao in json.loads(params["batch"]):
+                relativa = urlparse(requisicao["relative_url"])
+                sub_params = {k: v[-1] for k, v in parse_qs(relativa.query).items()}
+                status, corpo = self._resolver_get(f"/{VERSAO}/{relativa.path.strip('/')}", sub_params)
+                respostas.append({"code": status, "body": json.dumps(corpo)})
+            return self._responder(200, respostas)
+        if len(partes) == 3 and partes[0] == VERSAO and partes[1].startswith("act_") and partes[2] == "insights":
+            report_run_id = str(6000000 + next(_ids))
+            with _lock:
+                _relatorios[report_run_id] = {"itens": self._itens(partes[1], params), "percentual": 0}
+            return self._responder(200, {"report_run_id": report_run_id})
+        self._responder(404, {"error": {"message": "Unknown path", "code": 803}})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in local da Graph API")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--anuncios", type=int, default=20, help="anúncios por dia no nível ad")
+    parser.add_argument("--latencia", type=float, default=0.0, help="segundos de atraso por requisição")
+    parser.add_argument("--passo-relatorio", type=int, default=50, help="percentual que o report run avança por consulta")
+    parser.add_argument("--limite-dias-sincrono", type=int, default=0, help="acima disso a chamada síncrona falha com 'reduce the amount of data'")
+    parser.add_argument("--bms", type=int, default=3, help="Business Managers do usuário")
+    parser.add_argument("--contas-por-bm", type=int, default=4)
+    parser.add_argument("--contas-diretas", type=int, default=2)
+    parser.add_argument("--uso", type=float, default=0, help="percentual informado no cabeçalho X-App-Usage")
+    parser.add_argument("--falhas-transitorias", type=int, default=0, help="primeiras N requisições falham com o erro 17")
+    parser.add_argument("--silencioso", action="store_true")
+    args = parser.parse_args()
+
+    GraphStubHandler.config = args
+    servidor = ThreadingHTTPServer(("127.0.0.1", args.porta), GraphStubHandler)
+    print(f"Graph API stub em http://127.0.0.1:{args.porta}/{VERSAO}")
+    servidor.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
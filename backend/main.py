@@ -5,6 +5,11 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from api.api_router import router
+from core.config import META_SYNC_AUTOMATICO
+from database.connection import estatisticas_pool, get_db_connection
+from database.migrations import garantir_schema
+from services.meta_scheduler import get_agendador
+from services.cache_ia import estatisticas_cache
 
 app = FastAPI(
     title="DashboardAI",
@@ -23,3 +28,34 @@ app.add_middleware(
 
 # Rotas
 app.include_router(router)
+
+# Migrações pendentes do schema
+@app.on_event("startup")
+def migrar_schema():
+    conn = get_db_connection()
+    try:
+        garantir_schema(conn)
+    except Exception as e:
+        print(f"[ERRO] Falha ao aplicar migrações: {e}")
+    finally:
+        conn.close()
+
+# Sincronização periódica das contas Meta em segundo plano
+@app.on_event("startup")
+def iniciar_sincronizacao():
+    if META_SYNC_AUTOMATICO:
+        get_agendador().iniciar()
+
+@app.on_event("shutdown")
+def parar_sincronizacao():
+    get_agendador().parar()
+
+# Uso do pool de conexões do banco
+@app.get("/status/banco")
+def status_banco():
+    return estatisticas_pool()
+
+
+@app.get("/status/cache-ia")
+def status_cache_ia():
+    return estatisticas_cache()
@@ -0,0 +1,184 @@
+"""
+Cache das respostas da IA (Gemini).
+
+A chave é um hash do tipo de resposta, do modelo, dos dados enviados no prompt (impressão digital) e da
+pergunta normalizada: a mesma pergunta sobre os mesmos dados não volta ao Gemini.
+
+Dois níveis:
+  - memória: LRU com até IA_CACHE_MAX_MEMORIA respostas, por processo;
+  - disco: arquivo SQLite próprio (IA_CACHE_ARQUIVO), que sobrevive a reinícios e é compartilhado pelos workers.
+Toda resposta expira depois de IA_CACHE_TTL_SEGUNDOS.
+
+Cada resposta guarda a conta/usuário dos dados; a ingestão de uma conta (services/meta_extractor.py) chama
+invalidar_conta, que descarta as respostas daquela conta e as respostas sem conta do mesmo usuário.
+As especificações de gráfico (tipo "grafico", services/ia.py) são chaveadas pelo schema do DataFrame e gravadas
+sem conta nem usuário: valem para todos os clientes com as mesmas colunas e só saem por expiração.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from core.config import IA_CACHE_HABILITADO, IA_CACHE_TTL_SEGUNDOS, IA_CACHE_MAX_MEMORIA, IA_CACHE_ARQUIVO
+
+# Expirados são apagados do disco a cada N gravações
+LIMPEZA_A_CADA = 200
+
+_memoria: "OrderedDict[str, tuple]" = OrderedDict()
+_lock = threading.Lock()
+_conexao: Optional[sqlite3.Connection] = None
+_gravacoes = 0
+_contadores = {"hits_memoria": 0, "hits_disco": 0, "misses": 0, "gravacoes": 0, "invalidadas": 0}
+
+
+def normalizar_pergunta(pergunta: str) -> str:
+    """Minúsculas, sem acentos, espaços e pontuação final colapsados: "Qual o CTR? " == "qual o ctr"."""
+    texto = unicodedata.normalize("NFKD", pergunta or "")
+    texto = "".join(c for c in texto if not unicodedata.combining(c)).lower()
+    texto = re.sub(r"\s+", " ", texto).strip()
+    return texto.rstrip(" ?!.;")
+
+
+def chave_cache(tipo: str, modelo: str, dados: str, pergunta: str) -> str:
+    impressao = hashlib.sha256((dados or "").encode("utf-8")).hexdigest()
+    return hashlib.sha256("\x1f".join((tipo, modelo or "", impressao, normalizar_pergunta(pergunta))).encode("utf-8")).hexdigest()
+
+
+def _arquivo() -> str:
+    if os.path.isabs(IA_CACHE_ARQUIVO):
+        return IA_CACHE_ARQUIVO
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), IA_CACHE_ARQUIVO)
+
+
+def _disco() -> sqlite3.Connection:
+    # Chamado com _lock adquirido
+    global _conexao
+    if _conexao is None:
+        arquivo = _arquivo()
+        os.makedirs(os.path.dirname(arquivo), exist_ok=True)
+        _conexao = sqlite3.connect(arquivo, check_same_thread=False, timeout=5)
+        _conexao.execute("PRAGMA journal_mode = WAL")
+        _conexao.execute("PRAGMA synchronous = NORMAL")
+        _conexao.execute("""
+            CREATE TABLE IF NOT EXISTS respostas_ia (
+                chave TEXT PRIMARY KEY,
+                tipo TEXT NOT NULL,
+                resposta TEXT NOT NULL,
+                account_id INTEGER,
+                user_id INTEGER,
+                criado_em REAL NOT NULL,
+                expira_em REAL NOT NULL
+            )
+        """)
+        _conexao.execute("CREATE INDEX IF NOT EXISTS ix_respostas_ia_conta ON respostas_ia (account_id, user_id)")
+        _conexao.commit()
+    return _conexao
+
+
+def _guardar_na_memoria(chave: str, resposta: str, expira_em: float, account_id, user_id):
+    _memoria[chave] = (resposta, expira_em, account_id, user_id)
+    _memoria.move_to_end(chave)
+    while len(_memoria) > IA_CACHE_MAX_MEMORIA:
+        _memoria.popitem(last=False)
+
+
+def obter_resposta(chave: str) -> Optional[str]:
+    """Resposta em cache (memória, depois disco) ou None."""
+    if not IA_CACHE_HABILITADO:
+        return None
+    agora = time.time()
+    with _lock:
+        item = _memoria.get(chave)
+        if item is not None:
+            if item[1] > agora:
+                _memoria.move_to_end(chave)
+                _contadores["hits_memoria"] += 1
+                return item[0]
+            del _memoria[chave]
+        try:
+            linha = _disco().execute(
+                "SELECT resposta, expira_em, account_id, user_id FROM respostas_ia WHERE chave = ? AND expira_em > ?",
+                (chave, agora),
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"[ERRO] Cache da IA em disco indisponível: {e}")
+            linha = None
+        if linha is None:
+            _contadores["misses"] += 1
+            return None
+        resposta, expira_em, account_id, user_id = linha
+        _guardar_na_memoria(chave, resposta, expira_em, account_id, user_id)
+        _contadores["hits_disco"] += 1
+        return resposta
+
+
+def gravar_resposta(chave: str, tipo: str, resposta: str, account_id=None, user_id=None):
+    global _gravacoes
+    if not IA_CACHE_HABILITADO or resposta is None:
+        return
+    agora = time.time()
+    expira_em = agora + IA_CACHE_TTL_SEGUNDOS
+    with _lock:
+        _guardar_na_memoria(chave, resposta, expira_em, account_id, user_id)
+        _contadores["gravacoes"] += 1
+        try:
+            conn = _disco()
+            conn.execute("""
+                INSERT INTO respostas_ia (chave, tipo, resposta, account_id, user_id, criado_em, expira_em)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (chave) DO UPDATE SET resposta = excluded.resposta, criado_em = excluded.criado_em,
+                    expira_em = excluded.expira_em, account_id = excluded.account_id, user_id = excluded.user_id
+            """, (chave, tipo, resposta, account_id, user_id, agora, expira_em))
+            _gravacoes += 1
+            if _gravacoes % LIMPEZA_A_CADA == 0:
+                conn.execute("DELETE FROM respostas_ia WHERE expira_em <= ?", (agora,))
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"[ERRO] Falha ao gravar no cache da IA em disco: {e}")
+
+
+def invalidar_conta(account_id, user_id=None) -> int:
+    """Descarta as respostas sobre os dados da conta (e as sem conta do usuário). Retorna quantas saíram do disco."""
+    with _lock:
+        for chave in [
+            chave for chave, (_, _, conta, usuario) in _memoria.items()
+            if conta == account_id or (conta is None and user_id is not None and usuario == user_id)
+        ]:
+            del _memoria[chave]
+        try:
+            conn = _disco()
+            cur = conn.execute(
+                "DELETE FROM respostas_ia WHERE account_id = ? OR (account_id IS NULL AND user_id = ?)",
+                (account_id, user_id),
+            )
+            conn.commit()
+            removidas = cur.rowcount
+        except sqlite3.Error as e:
+            print(f"[ERRO] Falha ao invalidar o cache da IA da conta {account_id}: {e}")
+            removidas = 0
+        _contadores["invalidadas"] += removidas
+        return removidas
+
+
+def limpar_cache():
+    with _lock:
+        _memoria.clear()
+        conn = _disco()
+        conn.execute("DELETE FROM respostas_ia")
+        conn.commit()
+
+
+def estatisticas_cache() -> Dict[str, Any]:
+    with _lock:
+        consultas = _contadores["hits_memoria"] + _contadores["hits_disco"] + _contadores["misses"]
+        acertos = _contadores["hits_memoria"] + _contadores["hits_disco"]
+        return {
+            **_contadores,
+            "taxa_acerto": round(acertos / consultas, 3) if consultas else None,
+            "em_memoria": len(_memoria),
+            "habilitado": IA_CACHE_HABILITADO,
+        }
@@ -0,0 +1,182 @@
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from psycopg2.extras import RealDictCursor
+from database.connection import get_db_connection
+from database.migrations import garantir_schema
+from core.config import DATA_SOURCES_LINHAS_POR_CHUNK
+
+# Dados das data sources guardados em blocos de linhas (data_source_chunks). Cada bloco é um JSON
+# {"colunas": [...], "linhas": [[...], ...]}; row_start/row_count de cada bloco permitem ler só os blocos
+# de um intervalo de linhas. data_sources guarda os metadados (row_count, columns) e, nas data sources
+# antigas, o JSON inteiro em data (lido só quando elas são consultadas).
+
+COLUNAS_METADADOS = "id, name, source_type, config, row_count, columns, created_at, updated_at"
+
+_codificar_json = json.JSONEncoder().encode
+
+
+def _codificar_chunk(linhas: List[Dict[str, Any]]):
+    colunas = list(dict.fromkeys(coluna for linha in linhas for coluna in linha))
+    valores = [[linha.get(coluna) for coluna in colunas] for linha in linhas]
+    return colunas, _codificar_json({"colunas": colunas, "linhas": valores})
+
+
+def _decodificar_chunk(data: str, colunas: Optional[List[str]], de: int, ate: int) -> List[Dict[str, Any]]:
+    chunk = json.loads(data)
+    nomes = chunk["colunas"]
+    if colunas:
+        posicoes = [(coluna, nomes.index(coluna)) for coluna in colunas if coluna in nomes]
+        return [{coluna: linha[i] for coluna, i in posicoes} for linha in chunk["linhas"][de:ate]]
+    return [dict(zip(nomes, linha)) for linha in chunk["linhas"][de:ate]]
+
+
+def _em_blocos(paginas: Iterable[List[Dict[str, Any]]], tamanho: int) -> Iterator[List[Dict[str, Any]]]:
+    bloco = []
+    for pagina in paginas:
+        for linha in pagina:
+            bloco.append(linha)
+            if len(bloco) >= tamanho:
+                yield bloco
+                bloco = []
+    if bloco:
+        yield bloco
+
+
+def salvar_data_source(name: str, source_type: str, config_json: str, paginas: Iterable[List[Dict[str, Any]]], linhas_por_chunk: int = None) -> Dict[str, Any]:
+    """
+    Grava uma data source e seus dados em blocos. `paginas` pode ser um gerador (ex.: páginas vindas da Graph API):
+    os dados nunca ficam inteiros na memória. Cada bloco é commitado ao ser gravado, para não segurar o lock
+    de escrita do banco enquanto as páginas chegam; se algo falhar no meio, a data source é removida.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    source_id = None
+    try:
+        garantir_schema(conn)
+        cur.execute("""
+            INSERT INTO data_sources (name, source_type, config)
+            VALUES (%s, %s, %s)
+            RETURNING id, name, source_type, created_at
+        """, (name, source_type, config_json))
+        resultado = dict(cur.fetchone())
+        conn.commit()
+        source_id = resultado["id"]
+
+        total = 0
+        colunas = {}
+        for indice, bloco in enumerate(_em_blocos(paginas, linhas_por_chunk or DATA_SOURCES_LINHAS_POR_CHUNK)):
+            nomes, data = _codificar_chunk(bloco)
+            colunas.update(dict.fromkeys(nomes))
+            cur.execute("""
+                INSERT INTO data_source_chunks (data_source_id, chunk_index, row_start, row_count, data)
+                VALUES (%s, %s, %s, %s, %s)
+            """, (source_id, indice, total, len(bloco), data))
+            conn.commit()
+            total += len(bloco)
+
+        # row_count só é preenchido no fim: até lá a data source está sendo gravada
+        cur.execute(
+            "UPDATE data_sources SET row_count = %s, columns = %s WHERE id = %s",
+            (total, _codificar_json(list(colunas)), source_id),
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        if source_id is not None:
+            cur.execute("DELETE FROM data_source_chunks WHERE data_source_id = %s", (source_id,))
+            cur.execute("DELETE FROM data_sources WHERE id = %s", (source_id,))
+            conn.commit()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+    resultado.update({"row_count": total, "columns": list(colunas)})
+    return resultado
+
+
+def _metadados(row: Dict[str, Any]) -> Dict[str, Any]:
+    row = dict(row)
+    for campo in ("config", "columns"):
+        if isinstance(row.get(campo), str):
+            row[campo] = json.loads(row[campo])
+    return row
+
+
+def listar_data_sources() -> List[Dict[str, Any]]:
+    conn = get_db_connection()
+    try:
+        garantir_schema(conn)
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute("SELECT id, name, source_type, row_count, created_at, updated_at FROM data_sources ORDER BY created_at DESC")
+        rows = cur.fetchall()
+        cur.close()
+        return rows
+    finally:
+        conn.close()
+
+
+def buscar_metadados(source_id: int) -> Optional[Dict[str, Any]]:
+    """Metadados da data source (sem ler os dados)."""
+    conn = get_db_connection()
+    try:
+        garantir_schema(conn)
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute(f"SELECT {COLUNAS_METADADOS} FROM data_sources WHERE id = %s", (source_id,))
+        row = cur.fetchone()
+        cur.close()
+        return _metadados(row) if row else None
+    finally:
+        conn.close()
+
+
+def iterar_linhas(source_id: int, inicio: int = 0, limite: Optional[int] = None, colunas: Optional[List[str]] = None) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Gera as linhas [inicio, inicio + limite) em listas, um bloco por vez; colunas limita os campos de cada linha.
+    Só os blocos que cobrem o intervalo são lidos. Data sources antigas (JSON inteiro em data) são lidas de lá.
+    """
+    fim = inicio + limite if limite is not None else None
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT data FROM data_sources WHERE id = %s AND data IS NOT NULL", (source_id,))
+        legado = cur.fetchone()
+        if legado:
+            dados = legado[0]
+            linhas = (json.loads(dados) if isinstance(dados, str) else dados)[inicio:fim]
+            if colunas:
+                linhas = [{coluna: linha[coluna] for coluna in colunas if coluna in linha} for linha in linhas]
+            yield linhas
+            return
+        filtro_fim = ""
+        params = [source_id, inicio]
+        if fim is not None:
+            filtro_fim = " AND row_start < %s"
+            params.append(fim)
+        cur.execute(f"""
+            SELECT row_start, row_count, data FROM data_source_chunks
+            WHERE data_source_id = %s AND row_start + row_count > %s{filtro_fim}
+            ORDER BY chunk_index
+        """, params)
+        while True:
+            row = cur.fetchone()
+            if row is None:
+                break
+            row_start, row_count, data = row
+            de = max(0, inicio - row_start)
+            ate = row_count if fim is None else min(row_count, fim - row_start)
+            yield _decodificar_chunk(data, colunas, de, ate)
+        cur.close()
+    finally:
+        conn.close()
+
+
+def buscar_data_source(source_id: int, inicio: int = 0, limite: Optional[int] = None, colunas: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+    """Metadados + as linhas pedidas em "data" (todas por padrão)."""
+    fonte = buscar_metadados(source_id)
+    if not fonte:
+        return None
+    fonte["data"] = [linha for bloco in iterar_linhas(source_id, inicio, limite, colunas) for linha in bloco]
+    if fonte.get("row_count") is None:
+        # Data source antiga: a contagem não foi gravada
+        fonte["row_count"] = len(fonte["data"]) if not inicio and limite is None else None
+    return fonte
@@ -1,171 +1,271 @@
-import requests
-from typing import List, Dict, Any, Optional
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterator, Optional
+from core.config import META_GRAPH_URL
+from services.graph_client import get_graph_client, GraphAPIError
+
+CAMPOS_BM = "id,name,verification_status,sharing_eligibility_status,created_time"
+CAMPOS_CONTA = "id,name,account_status,amount_spent,currency,business,owner"
+
+# Limites da Graph API: 50 requisições por batch e 50 ids por requisição ?ids=
+LIMITE_BATCH = 50
+LIMITE_IDS = 50
+MAX_PAGINACOES_PARALELAS = 8
+
+def _mensagem_erro(data: Any) -> str:
+    if isinstance(data, dict):
+        return data.get("error", {}).get("message", "Erro desconhecido")
+    return "Erro desconhecido"
+
+def _get(url: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    try:
+        return get_graph_client().get(url, params, token=(params or {}).get("access_token"))
+    except GraphAPIError as e:
+        raise Exception(str(e))
+
+def _batch(access_token: str, relative_urls: List[str]) -> List[Dict[str, Any]]:
+    """
+    Executa várias chamadas GET em uma única requisição batch da Graph API.
+    Retorna o corpo de cada resposta na mesma ordem; respostas com erro trazem a chave "error".
+    """
+    blocos = [relative_urls[i:i + LIMITE_BATCH] for i in range(0, len(relative_urls), LIMITE_BATCH)]
+
+    def enviar(bloco):
+        try:
+            data = get_graph_client().post(META_GRAPH_URL, data={
+                "access_token": access_token,
+                "include_headers": "false",
+                "batch": json.dumps([{"method": "GET", "relative_url": url} for url in bloco]),
+            }, token=access_token)
+        except GraphAPIError as e:
+            raise Exception(f"Falha na requisição batch: {e}")
+        if not isinstance(data, list):
+            raise Exception(f"Falha na requisição batch: {_mensagem_erro(data)}")
+        corpos = []
+        for item in data:
+            if not item:
+                # A Graph API devolve null para sub-requisições que expiraram dentro do batch
+                corpos.append({"error": {"message": "Sub-requisição do batch sem resposta"}})
+                continue
+            corpo = json.loads(item.get("body") or "{}")
+            if item.get("code") != 200 and "error" not in corpo:
+                corpo = {"error": {"message": f"HTTP {item.get('code')}"}}
+            corpos.append(corpo)
+        return corpos
+
+    if len(blocos) == 1:
+        return enviar(blocos[0])
+    with ThreadPoolExecutor(max_workers=min(len(blocos), MAX_PAGINACOES_PARALELAS)) as executor:
+        return [corpo for corpos in executor.map(enviar, blocos) for corpo in corpos]
+
+def _paginar(pagina: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Junta os itens da primeira página com os das páginas seguintes (paging.next)."""
+    itens = list(pagina.get("data", []))
+    proxima = pagina.get("paging", {}).get("next")
+    while proxima:
+        pagina = _get(proxima)
+        itens.extend(pagina.get("data", []))
+        proxima = pagina.get("paging", {}).get("next")
+    return itens
+
+def _paginar_varios(paginas: List[Dict[str, Any]], capturar_erros: bool = False) -> List[Any]:
+    """
+    Completa a paginação de várias listas ao mesmo tempo (as páginas de cada lista seguem em ordem).
+    Com capturar_erros=True, a lista cuja paginação falhar vem como a exceção, sem afetar as demais.
+    """
+    if not paginas:
+        return []
+
+    def paginar(pagina):
+        try:
+            return _paginar(pagina)
+        except Exception as e:
+            if not capturar_erros:
+                raise
+            return e
+
+    with ThreadPoolExecutor(max_workers=min(len(paginas), MAX_PAGINACOES_PARALELAS)) as executor:
+        return list(executor.map(paginar, paginas))
+
+def _lista_ou_erro(primeira: Dict[str, Any], completas: Iterator[Any]):
+    """(itens, None) de uma lista paginada por _paginar_varios, ou (None, mensagem) se alguma página falhou."""
+    if "error" in primeira:
+        return None, _mensagem_erro(primeira)
+    itens = next(completas)
+    if isinstance(itens, Exception):
+        return None, str(itens)
+    return itens, None
+
+def _formatar_bm(bm: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": bm.get("id"),
+        "nome": bm.get("name"),
+        "status_verificacao": bm.get("verification_status"),
+        "status_compartilhamento": bm.get("sharing_eligibility_status"),
+        "data_criacao": bm.get("created_time")
+    }
+
+def _formatar_conta(account: Dict[str, Any], business_id: Optional[str] = None) -> Dict[str, Any]:
+    if business_id is None:
+        business_id = account.get("business", {}).get("id") if account.get("business") else None
+    return {
+        "identificador_conta": account.get("id").replace("act_", ""),
+        "nome_conta": account.get("name"),
+        "status": account.get("account_status"),
+        "business_id": business_id,
+        "owner": account.get("owner", {}).get("id")
+    }
+
+def _contas_das_bms(access_token: str, business_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Busca as contas de anúncios de várias BMs com requisições ?ids= (50 BMs cada) agrupadas em batch.
+    Retorna {business_id: {"ad_accounts": [...]}} ou {business_id: {"ad_accounts": [], "error": "..."}}.
+    """
+    grupos = [business_ids[i:i + LIMITE_IDS] for i in range(0, len(business_ids), LIMITE_IDS)]
+    corpos = _batch(access_token, [
+        f"?ids={','.join(grupo)}&fields=owned_ad_accounts.limit(500){{{CAMPOS_CONTA}}}"
+        for grupo in grupos
+    ])
+
+    resultado = {}
+    paginas = []
+    for grupo, corpo in zip(grupos, corpos):
+        for business_id in grupo:
+            if "error" in corpo:
+                resultado[business_id] = {"ad_accounts": [], "error": f"Falha ao obter contas de anúncios: {_mensagem_erro(corpo)}"}
+                continue
+            paginas.append((business_id, corpo.get(business_id, {}).get("owned_ad_accounts", {"data": []})))
+
+    for (business_id, _), contas in zip(paginas, _paginar_varios([pagina for _, pagina in paginas], capturar_erros=True)):
+        if isinstance(contas, Exception):
+            resultado[business_id] = {"ad_accounts": [], "error": f"Falha ao obter contas de anúncios: {contas}"}
+            continue
+        resultado[business_id] = {"ad_accounts": [_formatar_conta(conta, business_id) for conta in contas]}
+    return resultado
 
 def get_user_business_managers(access_token: str) -> List[Dict[str, Any]]:
     """
-    Recupera todas as Business Managers às quais o usuário tem acesso.
-    
+    Recupera todas as Business Managers às quais o usuário tem acesso (todas as páginas).
+
     Args:
         access_token: Token de acesso do Facebook
-        
+
     Returns:
         Lista de Business Managers com informações básicas
     """
-    # Primeiro, obtemos o ID do usuário atual
-    me_url = "https://graph.facebook.com/v19.0/me"
-    me_response = requests.get(me_url, params={"access_token": access_token})
-    
-    if not me_response.ok:
-        error_msg = me_response.json().get("error", {}).get("message", "Erro desconhecido")
-        raise Exception(f"Falha ao obter dados do usuário: {error_msg}")
-    
-    user_id = me_response.json().get("id")
-    
-    # Agora, obtemos as Business Managers
-    bm_url = f"https://graph.facebook.com/v19.0/{user_id}/businesses"
-    bm_response = requests.get(bm_url, params={
-        "access_token": access_token,
-        "fields": "id,name,verification_status,sharing_eligibility_status,created_time"
-    })
-    
-    if not bm_response.ok:
-        error_msg = bm_response.json().get("error", {}).get("message", "Erro desconhecido")
-        raise Exception(f"Falha ao obter Business Managers: {error_msg}")
-    
-    business_data = bm_response.json().get("data", [])
-    
-    return [
-        {
-            "id": bm.get("id"),
-            "nome": bm.get("name"),
-            "status_verificacao": bm.get("verification_status"),
-            "status_compartilhamento": bm.get("sharing_eligibility_status"),
-            "data_criacao": bm.get("created_time")
-        }
-        for bm in business_data
-    ]
+    try:
+        pagina = _get(f"{META_GRAPH_URL}/me/businesses", {"access_token": access_token, "fields": CAMPOS_BM, "limit": 100})
+    except Exception as e:
+        raise Exception(f"Falha ao obter Business Managers: {e}")
+    return [_formatar_bm(bm) for bm in _paginar(pagina)]
 
 def get_ad_accounts_from_business(access_token: str, business_id: str) -> List[Dict[str, Any]]:
     """
-    Recupera todas as contas de anúncios associadas a uma Business Manager específica.
-    
+    Recupera todas as contas de anúncios associadas a uma Business Manager específica (todas as páginas).
+
     Args:
         access_token: Token de acesso do Facebook
         business_id: ID da Business Manager
-        
+
     Returns:
         Lista de contas de anúncios
     """
-    url = f"https://graph.facebook.com/v19.0/{business_id}/owned_ad_accounts"
-    response = requests.get(url, params={
-        "access_token": access_token,
-        "fields": "id,name,account_status,amount_spent,currency,business,owner"
-    })
-    
-    if not response.ok:
-        error_msg = response.json().get("error", {}).get("message", "Erro desconhecido")
-        raise Exception(f"Falha ao obter contas de anúncios: {error_msg}")
-    
-    ad_accounts = response.json().get("data", [])
-    
-    return [
-        {
-            "identificador_conta": account.get("id").replace("act_", ""),
-            "nome_conta": account.get("name"),
-            "status": account.get("account_status"),
-            "business_id": business_id,
-            "owner": account.get("owner", {}).get("id")
-        }
-        for account in ad_accounts
-    ]
+    try:
+        pagina = _get(f"{META_GRAPH_URL}/{business_id}/owned_ad_accounts", {"access_token": access_token, "fields": CAMPOS_CONTA, "limit": 500})
+    except Exception as e:
+        raise Exception(f"Falha ao obter contas de anúncios: {e}")
+    return [_formatar_conta(account, business_id) for account in _paginar(pagina)]
 
 def get_all_user_ad_accounts(access_token: str) -> List[Dict[str, Any]]:
     """
     Recupera todas as contas de anúncios às quais o usuário tem acesso diretamente (não via Business Manager).
-    
+
     Args:
         access_token: Token de acesso do Facebook
-        
+
     Returns:
         Lista de contas de anúncios
     """
-    url = "https://graph.facebook.com/v19.0/me/adaccounts"
-    response = requests.get(url, params={
-        "access_token": access_token,
-        "fields": "id,name,account_status,amount_spent,currency,business,owner"
-    })
-    
-    if not response.ok:
-        error_msg = response.json().get("error", {}).get("message", "Erro desconhecido")
-        raise Exception(f"Falha ao obter contas de anúncios: {error_msg}")
-    
-    ad_accounts = response.json().get("data", [])
-    
-    return [
-        {
-            "identificador_conta": account.get("id").replace("act_", ""),
-            "nome_conta": account.get("name"),
-            "status": account.get("account_status"),
-            "business_id": account.get("business", {}).get("id") if account.get("business") else None,
-            "owner": account.get("owner", {}).get("id")
-        }
-        for account in ad_accounts
-    ]
+    try:
+        pagina = _get(f"{META_GRAPH_URL}/me/adaccounts", {"access_token": access_token, "fields": CAMPOS_CONTA, "limit": 500})
+    except Exception as e:
+        raise Exception(f"Falha ao obter contas de anúncios: {e}")
+    return [_formatar_conta(account) for account in _paginar(pagina)]
 
 def get_all_fb_assets(access_token: str) -> Dict[str, Any]:
     """
     Recupera todas as Business Managers e suas respectivas contas de anúncios,
     bem como contas de anúncios acessadas diretamente.
-    
+
+    Usa duas requisições batch (BMs + contas diretas; depois as contas de todas as BMs)
+    e segue a paginação de cada lista em paralelo.
+
     Args:
         access_token: Token de acesso do Facebook
-        
+
     Returns:
         Dicionário com Business Managers e contas de anúncios
     """
     try:
-        # Obter BMs
-        business_managers = get_user_business_managers(access_token)
-        
-        # Para cada BM, obter contas de anúncios
-        for bm in business_managers:
-            try:
-                bm["ad_accounts"] = get_ad_accounts_from_business(access_token, bm["id"])
-            except Exception as e:
-                bm["ad_accounts"] = []
-                bm["error"] = str(e)
-        
-        # Obter contas de anúncios diretas
-        direct_ad_accounts = get_all_user_ad_accounts(access_token)
-        
-        # Filtrar contas diretas que não estão em BMs
-        bm_account_ids = set()
-        for bm in business_managers:
-            for account in bm.get("ad_accounts", []):
-                bm_account_ids.add(account["identificador_conta"])
-        
-        direct_only_accounts = [
-            account for account in direct_ad_accounts 
-            if account["identificador_conta"] not in bm_account_ids
-        ]
-        
+        pagina_bms, pagina_contas = _batch(access_token, [
+            f"me/businesses?fields={CAMPOS_BM}&limit=100",
+            f"me/adaccounts?fields={CAMPOS_CONTA}&limit=500",
+        ])
+    except Exception as e:
         return {
-            "business_managers": business_managers,
-            "direct_ad_accounts": direct_only_accounts
+            "business_managers": [],
+            "direct_ad_accounts": [],
+            "error": str(e)
         }
-    
-    except Exception as e:
-        # Caso falhe a obtenção de BMs, tentar pelo menos as contas diretas
-        try:
-            direct_ad_accounts = get_all_user_ad_accounts(access_token)
-            return {
-                "business_managers": [],
-                "direct_ad_accounts": direct_ad_accounts,
-                "error_bm": str(e)
-            }
-        except Exception as inner_e:
+
+    # Completa a paginação das duas listas em paralelo; falha numa página seguinte conta como falha da lista
+    paginas = [p for p in (pagina_bms, pagina_contas) if "error" not in p]
+    completas = iter(_paginar_varios(paginas, capturar_erros=True))
+    bms_raw, erro_bms = _lista_ou_erro(pagina_bms, completas)
+    contas_raw, erro_contas = _lista_ou_erro(pagina_contas, completas)
+
+    if contas_raw is None:
+        direct_error = f"Falha ao obter contas de anúncios: {erro_contas}"
+    direct_ad_accounts = [_formatar_conta(conta) for conta in contas_raw or []]
+
+    if bms_raw is None:
+        # Caso falhe a obtenção de BMs, retorna pelo menos as contas diretas
+        bm_error = f"Falha ao obter Business Managers: {erro_bms}"
+        if contas_raw is None:
             return {
                 "business_managers": [],
                 "direct_ad_accounts": [],
-                "error": f"BM Error: {str(e)}. Ad Accounts Error: {str(inner_e)}"
-            }
\ No newline at end of file
+                "error": f"BM Error: {bm_error}. Ad Accounts Error: {direct_error}"
+            }
+        return {
+            "business_managers": [],
+            "direct_ad_accounts": direct_ad_accounts,
+            "error_bm": bm_error
+        }
+
+    business_managers = [_formatar_bm(bm) for bm in bms_raw]
+    try:
+        contas_por_bm = _contas_das_bms(access_token, [bm["id"] for bm in business_managers]) if business_managers else {}
+    except Exception as e:
+        contas_por_bm = {bm["id"]: {"ad_accounts": [], "error": str(e)} for bm in business_managers}
+    for bm in business_managers:
+        bm.update(contas_por_bm.get(bm["id"], {"ad_accounts": []}))
+
+    # Filtrar contas diretas que não estão em BMs
+    bm_account_ids = set()
+    for bm in business_managers:
+        for account in bm.get("ad_accounts", []):
+            bm_account_ids.add(account["identificador_conta"])
+
+    direct_only_accounts = [
+        account for account in direct_ad_accounts
+        if account["identificador_conta"] not in bm_account_ids
+    ]
+
+    resultado = {
+        "business_managers": business_managers,
+        "direct_ad_accounts": direct_only_accounts
+    }
+    if contas_raw is None:
+        resultado["error_direct"] = direct_error
+    return resultado
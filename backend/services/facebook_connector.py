@@ -1,8 +1,11 @@
 import json
-import requests
 from database.connection import get_db_connection
 from schemas.connector import FacebookDataConfig, DataSourceCreate
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Union
+from datetime import datetime
+from services.meta_async_reports import iterar_relatorio_assincrono, deve_usar_relatorio_assincrono
+from services.graph_client import get_graph_client, GraphAPIError
+from services import data_source_store
 
 def get_account_token(account_id: str):
     conn = get_db_connection()
@@ -28,7 +31,8 @@ def get_account_token(account_id: str):
         return row[0]
     return None
 
-def fetch_facebook_data(config: FacebookDataConfig) -> List[Dict[str, Any]]:
+def fetch_facebook_data(config: FacebookDataConfig) -> Iterator[List[Dict[str, Any]]]:
+    """Gera os itens da Insights API página a página (a conta inteira nunca fica na memória)."""
     token = get_account_token(config.account_id)
     if not token:
         raise Exception(f"Account {config.account_id} not found or inactive.")
@@ -37,8 +41,6 @@ def fetch_facebook_data(config: FacebookDataConfig) -> List[Dict[str, Any]]:
     if not account_id_str.startswith("act_"):
         account_id_str = f"act_{account_id_str}"
 
-    url = f"https://graph.facebook.com/v19.0/{account_id_str}/insights"
-    
     params = {
         "access_token": token,
         "level": config.level,
@@ -67,82 +69,29 @@ def fetch_facebook_data(config: FacebookDataConfig) -> List[Dict[str, Any]]:
     if config.filtering:
         params["filtering"] = json.dumps(config.filtering)
 
-    all_data = []
-    
-    while url:
-        print(f"Requesting: {url} with params {params}")
-        response = requests.get(url, params=params)
-        data = response.json()
-        
-        if "error" in data:
-            raise Exception(f"Facebook API Error: {data['error'].get('message')}")
-            
-        if "data" in data:
-            all_data.extend(data["data"])
-        
-        # Pagination
-        if "paging" in data and "next" in data["paging"]:
-            url = data["paging"]["next"]
-            params = {} # params are encoded in the next url
-        else:
-            url = None
-            
-    return all_data
+    if config.date_range:
+        dias = (datetime.strptime(config.date_range.until, "%Y-%m-%d") - datetime.strptime(config.date_range.since, "%Y-%m-%d")).days + 1
+        if deve_usar_relatorio_assincrono(dias):
+            # Intervalos longos: report run assíncrono em vez de paginar a chamada síncrona
+            print(f"Requesting async report for {account_id_str} ({dias} days)")
+            yield from iterar_relatorio_assincrono(account_id_str, token, params)
+            return
 
-def save_data_source_db(name: str, config: FacebookDataConfig, data: List[Dict[str, Any]]):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    config_json = config.model_dump_json()
-    data_json = json.dumps(data)
-    
-    cur.execute("""
-        INSERT INTO data_sources (name, source_type, config, data)
-        VALUES (%s, 'facebook_ads', %s, %s)
-        RETURNING id, name, source_type, created_at
-    """, (name, config_json, data_json))
-    
-    # Handle RETURNING for SQLite (it might not support RETURNING in older versions, but wrapper handles it? 
-    # Actually standard SQLite doesn't support RETURNING in older versions. 
-    # The psycopg2 wrapper I wrote doesn't emulate RETURNING perfectly if underlying sqlite doesn't support it.
-    # But Python 3.12 sqlite3 usually supports RETURNING.
-    
+    print(f"Requesting: {account_id_str}/insights with params {params}")
     try:
-        row = cur.fetchone()
-        conn.commit()
-        result = dict(row) if row else {"id": cur.lastrowid, "name": name}
-    except Exception:
-        # Fallback if RETURNING fails
-        conn.commit()
-        result = {"id": cur.lastrowid, "name": name}
-        
-    cur.close()
-    conn.close()
-    return result
+        for data in get_graph_client().paginar(f"{account_id_str}/insights", params, token=token):
+            if data.get("data"):
+                yield data["data"]
+    except GraphAPIError as e:
+        raise Exception(f"Facebook API Error: {e}")
+
+def save_data_source_db(name: str, config: FacebookDataConfig, data: Union[List[Dict[str, Any]], Iterable[List[Dict[str, Any]]]]):
+    """Salva a data source; `data` é a lista de itens ou um iterável de páginas (ex.: fetch_facebook_data)."""
+    paginas = [data] if isinstance(data, list) else data
+    return data_source_store.salvar_data_source(name, "facebook_ads", config.model_dump_json(), paginas)
 
 def list_data_sources():
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=True) # Dictionary cursor
-    cur.execute("SELECT id, name, source_type, created_at, updated_at FROM data_sources ORDER BY created_at DESC")
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    return rows
+    return data_source_store.listar_data_sources()
 
-def get_data_source_by_id(source_id: int):
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=True)
-    cur.execute("SELECT * FROM data_sources WHERE id = %s", (source_id,))
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
-    
-    if row:
-        # Parse JSON fields
-        row_dict = dict(row)
-        if row_dict.get('config'):
-            row_dict['config'] = json.loads(row_dict['config'])
-        if row_dict.get('data'):
-            row_dict['data'] = json.loads(row_dict['data'])
-        return row_dict
-    return None
+def get_data_source_by_id(source_id: int, inicio: int = 0, limite: Optional[int] = None, colunas: Optional[List[str]] = None):
+    return data_source_store.buscar_data_source(source_id, inicio, limite, colunas)
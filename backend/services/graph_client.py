@@ -0,0 +1,173 @@
+import json
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Any, Dict, Iterator, Optional
+from services.token_limiter import slot_token
+from core.config import (
+    META_GRAPH_URL, META_GRAPH_POOL, META_GRAPH_TENTATIVAS, META_GRAPH_TIMEOUT,
+    META_GRAPH_LIMIAR_USO, META_GRAPH_ESPERA_MAXIMA,
+)
+
+# Cliente único para a Graph API: conexões keep-alive reaproveitadas (pool), gzip,
+# novas tentativas com backoff + jitter em erros transitórios e pausa automática
+# quando os cabeçalhos de uso (X-App-Usage, X-Business-Use-Case-Usage, X-Ad-Account-Usage)
+# indicam que o limite está perto.
+
+# Códigos de erro da Graph API que indicam limite de chamadas ou indisponibilidade temporária
+CODIGOS_TRANSITORIOS = {1, 2, 4, 17, 32, 341, 613} | set(range(80000, 80015))
+STATUS_TRANSITORIOS = {429, 500, 502, 503, 504}
+
+
+class GraphAPIError(Exception):
+    def __init__(self, mensagem: str, codigo: Optional[int] = None, status: Optional[int] = None, erro: Optional[Dict[str, Any]] = None):
+        super().__init__(mensagem)
+        self.codigo = codigo
+        self.status = status
+        self.erro = erro or {"message": mensagem, "code": codigo}
+
+    @property
+    def transitorio(self) -> bool:
+        if "reduce the amount of data" in str(self).lower():
+            # Repetir não adianta: é preciso pedir menos dados (ou usar relatório assíncrono)
+            return False
+        return self.codigo in CODIGOS_TRANSITORIOS or self.status in STATUS_TRANSITORIOS
+
+
+def _percentual_uso(headers) -> tuple:
+    """Retorna (maior percentual de uso informado, segundos até recuperar o acesso)."""
+    percentuais = [0.0]
+    espera = 0.0
+    for nome in ("X-App-Usage", "X-Ad-Account-Usage", "X-Business-Use-Case-Usage"):
+        valor = headers.get(nome)
+        if not valor:
+            continue
+        try:
+            uso = json.loads(valor)
+        except ValueError:
+            continue
+        # X-Business-Use-Case-Usage: {business_id: [{type, call_count, total_time, ..., estimated_time_to_regain_access}]}
+        entradas = [e for lista in uso.values() for e in lista] if nome == "X-Business-Use-Case-Usage" else [uso]
+        for entrada in entradas:
+            for chave in ("call_count", "total_time", "total_cputime", "acc_id_util_pct"):
+                if isinstance(entrada.get(chave), (int, float)):
+                    percentuais.append(float(entrada[chave]))
+            # Bloqueio já em vigor: a Graph API informa quanto falta para liberar
+            minutos = entrada.get("estimated_time_to_regain_access") or 0
+            espera = max(espera, float(minutos) * 60)
+            if float(entrada.get("acc_id_util_pct") or 0) >= 100:
+                espera = max(espera, float(entrada.get("reset_time_duration") or 0))
+    return max(percentuais), espera
+
+
+class GraphClient:
+    def __init__(self, base_url: str = META_GRAPH_URL, pool: int = META_GRAPH_POOL, tentativas: int = META_GRAPH_TENTATIVAS,
+                 timeout: float = META_GRAPH_TIMEOUT, limiar_uso: float = META_GRAPH_LIMIAR_USO, espera_maxima: float = META_GRAPH_ESPERA_MAXIMA):
+        self.base_url = base_url.rstrip("/")
+        self.tentativas = tentativas
+        self.timeout = timeout
+        self.limiar_uso = limiar_uso
+        self.espera_maxima = espera_maxima
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool, pool_maxsize=pool, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Accept-Encoding": "gzip, deflate"})
+        self._pausa_ate = {}
+        self._lock = threading.Lock()
+
+    def url(self, caminho: str) -> str:
+        if caminho.startswith("http://") or caminho.startswith("https://"):
+            return caminho
+        return f"{self.base_url}/{caminho.lstrip('/')}" if caminho else self.base_url
+
+    def _aguardar_cota(self, token: Optional[str]):
+        with self._lock:
+            ate = self._pausa_ate.get(token, 0)
+        espera = ate - time.monotonic()
+        if espera > 0:
+            print(f"DEBUG - Graph API perto do limite de uso; aguardando {espera:.1f}s")
+            time.sleep(espera)
+
+    def _registrar_uso(self, token: Optional[str], headers):
+        percentual, espera = _percentual_uso(headers)
+        if espera <= 0 and percentual >= self.limiar_uso:
+            # Desacelera proporcionalmente ao quanto o uso passou do limiar
+            espera = self.espera_maxima * min(1.0, (percentual - self.limiar_uso) / max(1.0, 100 - self.limiar_uso))
+        if espera > 0:
+            with self._lock:
+                self._pausa_ate[token] = max(self._pausa_ate.get(token, 0), time.monotonic() + min(espera, self.espera_maxima))
+
+    def _backoff(self, tentativa: int, response=None) -> float:
+        if response is not None and response.headers.get("Retry-After", "").isdigit():
+            return min(float(response.headers["Retry-After"]), self.espera_maxima)
+        # Backoff exponencial com "full jitter"
+        return random.uniform(0, min(self.espera_maxima, 2 ** tentativa))
+
+    def request(self, metodo: str, caminho: str, params: Optional[Dict[str, Any]] = None,
+                data: Optional[Dict[str, Any]] = None, token: Optional[str] = None) -> Any:
+        """
+        Executa a chamada e retorna o JSON. Erros transitórios (limite de uso, 5xx, falha de conexão)
+        são repetidos até META_GRAPH_TENTATIVAS vezes; os demais levantam GraphAPIError na hora.
+        """
+        url = self.url(caminho)
+        erro = None
+        for tentativa in range(self.tentativas):
+            self._aguardar_cota(token)
+            response = None
+            try:
+                if token:
+                    with slot_token(token):
+                        response = self.session.request(metodo, url, params=params, data=data, timeout=self.timeout)
+                else:
+                    response = self.session.request(metodo, url, params=params, data=data, timeout=self.timeout)
+                self._registrar_uso(token, response.headers)
+                try:
+                    corpo = response.json()
+                except ValueError:
+                    corpo = {"error": {"message": f"Resposta inválida (HTTP {response.status_code})"}}
+                if response.ok and not (isinstance(corpo, dict) and "error" in corpo):
+                    return corpo
+                detalhe = corpo.get("error", {}) if isinstance(corpo, dict) else {}
+                erro = GraphAPIError(detalhe.get("message") or f"HTTP {response.status_code}", detalhe.get("code"), response.status_code, detalhe)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                erro = GraphAPIError(f"Falha de conexão com a Graph API: {e}")
+                erro.status = 503
+            if not erro.transitorio or tentativa == self.tentativas - 1:
+                raise erro
+            espera = self._backoff(tentativa, response)
+            print(f"AVISO: Graph API ({erro}); tentativa {tentativa + 1}/{self.tentativas}, nova tentativa em {espera:.1f}s")
+            time.sleep(espera)
+        raise erro
+
+    def get(self, caminho: str, params: Optional[Dict[str, Any]] = None, token: Optional[str] = None) -> Any:
+        return self.request("GET", caminho, params=params, token=token)
+
+    def post(self, caminho: str, data: Optional[Dict[str, Any]] = None, token: Optional[str] = None) -> Any:
+        return self.request("POST", caminho, data=data, token=token)
+
+    def paginar(self, caminho: str, params: Optional[Dict[str, Any]] = None, token: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Itera pelas páginas de uma listagem seguindo paging.next."""
+        pagina = self.get(caminho, params, token=token)
+        while True:
+            yield pagina
+            proxima = pagina.get("paging", {}).get("next")
+            if not proxima or not pagina.get("data"):
+                return
+            pagina = self.get(proxima, token=token)
+
+
+_cliente = None
+_cliente_lock = threading.Lock()
+
+
+def get_graph_client() -> GraphClient:
+    """Cliente compartilhado por todos os extratores (um pool de conexões por processo)."""
+    global _cliente
+    if _cliente is None:
+        with _cliente_lock:
+            if _cliente is None:
+                _cliente = GraphClient()
+    return _cliente
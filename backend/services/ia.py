@@ -4,47 +4,83 @@ import pandas as pd
 from dotenv import load_dotenv
 import json
 import re
+import threading
+from typing import Iterator, Tuple
 from langdetect import detect
-from database.connection import get_db_connection
+from services.settings_store import obter_setting
+from services.cache_ia import chave_cache, obter_resposta, gravar_resposta
+from services.intencao_grafico import interpretar_pedido_local, operacao_do_pedido, formato_data_do_pedido
+from services.meta_gold import ATRIBUTO_FILTROS, consultar_agregado, resumo_para_pergunta
 
 dotenv_path = os.path.join(os.path.dirname(__file__), '..', '.env')
 load_dotenv(dotenv_path=dotenv_path)
 
+# Cliente do Gemini reaproveitado entre chamadas: genai.configure e o GenerativeModel só são refeitos
+# quando a API key muda (settings em cache: services/settings_store.py)
+_cliente_lock = threading.Lock()
+_chave_configurada = None
+_modelo = None
+
 def get_gemini_api_key():
-    # Try DB first
+    # Try DB first (cache em memória, invalidado por POST /settings)
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=True)
-        cursor.execute("SELECT value FROM settings WHERE key = 'GEMINI_API_KEY'")
-        row = cursor.fetchone()
-        conn.close()
-        if row and row['value']:
-            return row['value']
+        api_key = obter_setting("GEMINI_API_KEY")
+        if api_key:
+            return api_key
     except Exception as e:
         print(f"Erro ao buscar API Key no banco: {e}")
-        pass
     
     # Fallback to env
     return os.getenv("GEMINI_API_KEY")
 
 def configure_genai():
+    global _chave_configurada, _modelo
     api_key = get_gemini_api_key()
-    if api_key:
-        genai.configure(api_key=api_key)
-        return True
-    return False
+    if not api_key:
+        return False
+    if api_key != _chave_configurada:
+        with _cliente_lock:
+            if api_key != _chave_configurada:
+                genai.configure(api_key=api_key)
+                _chave_configurada = api_key
+                # O modelo guarda o cliente da chave antiga
+                _modelo = None
+    return True
 
 def get_gemini_model():
+    global _modelo
     configure_genai()
-    try:
-        return genai.GenerativeModel('gemini-2.5-flash')
-    except:
-        return genai.GenerativeModel('gemini-flash-latest')
-
-def gerar_insight_ia(df: pd.DataFrame, pergunta: str) -> str:
-    if not configure_genai():
-        return "⚠️ API Key do Google Gemini não encontrada. Configure nas Configurações ou no arquivo .env"
-
+    modelo = _modelo
+    if modelo is None:
+        with _cliente_lock:
+            if _modelo is None:
+                try:
+                    _modelo = genai.GenerativeModel('gemini-2.5-flash')
+                except:
+                    _modelo = genai.GenerativeModel('gemini-flash-latest')
+            modelo = _modelo
+    return modelo
+
+AVISO_SEM_CHAVE = "⚠️ API Key do Google Gemini não encontrada. Configure nas Configurações ou no arquivo .env"
+# finish_reason de um pedaço sem texto que indica resposta cortada pelo Gemini (e não fim normal)
+MOTIVOS_BLOQUEIO = ("SAFETY", "RECITATION", "BLOCKLIST", "PROHIBITED_CONTENT", "SPII", "OTHER")
+
+class ErroRespostaIA(Exception):
+    """Falha do Gemini no streaming; a mensagem é a mesma que a resposta sem streaming devolveria."""
+
+def _motivo_bloqueio(pedaco) -> str:
+    """Motivo do bloqueio de um pedaço sem texto, ou "" se ele só encerra a resposta."""
+    feedback = getattr(pedaco, "prompt_feedback", None)
+    if feedback is not None and getattr(feedback, "block_reason", 0):
+        return str(getattr(feedback.block_reason, "name", feedback.block_reason))
+    for candidato in getattr(pedaco, "candidates", None) or []:
+        motivo = getattr(getattr(candidato, "finish_reason", None), "name", "")
+        if motivo in MOTIVOS_BLOQUEIO:
+            return motivo
+    return ""
+
+def _prompt_insight(df: pd.DataFrame, pergunta: str) -> Tuple[str, str]:
+    """Prompt dos insights e os dados enviados nele (impressão digital do cache)."""
     try:
         idioma = detect(pergunta)
     except Exception:
@@ -59,11 +95,20 @@ def gerar_insight_ia(df: pd.DataFrame, pergunta: str) -> str:
     # 50 rows is a safe start for "insight" on structure/sample.
     csv_data = df.head(50).to_csv(index=False)
 
+    # Perguntas por campanha, conjunto ou dia recebem também os totais dos rollups gold
+    # (todas as linhas do período, não só a amostra)
+    try:
+        totais = resumo_para_pergunta(df.attrs.get(ATRIBUTO_FILTROS), pergunta)
+    except Exception as e:
+        print(f"Erro ao consultar rollups gold: {e}")
+        totais = None
+    bloco_totais = f"\n    Totais agregados de todo o período (use-os para totais, somas e comparações):\n\n    {totais}\n" if totais else ""
+
     prompt = f"""
     Abaixo estão os dados de uma planilha (amostra das primeiras 50 linhas):
 
     {csv_data}
-
+{bloco_totais}
     Você é um assistente de análise de dados que responde de forma direta, curta e objetiva.
     Responda sempre em português do Brasil. Não adicione explicações desnecessárias.
     Foque apenas no que foi perguntado.
@@ -71,19 +116,88 @@ def gerar_insight_ia(df: pd.DataFrame, pergunta: str) -> str:
 
     {linguagem_prompt}
     """
+    return prompt, csv_data + bloco_totais
+
+def gerar_insight_ia(df: pd.DataFrame, pergunta: str) -> str:
+    if not configure_genai():
+        return AVISO_SEM_CHAVE
 
+    prompt, dados = _prompt_insight(df, pergunta)
     try:
         model = get_gemini_model()
+        # Mesma pergunta sobre os mesmos dados enviados: resposta do cache, sem chamar o Gemini
+        filtros = df.attrs.get(ATRIBUTO_FILTROS) or {}
+        chave = chave_cache("insight", model.model_name, dados, pergunta)
+        em_cache = obter_resposta(chave)
+        if em_cache is not None:
+            return em_cache
         response = model.generate_content(prompt)
+        gravar_resposta(chave, "insight", response.text, filtros.get("account_id"), filtros.get("user_id"))
         return response.text
     except Exception as e:
         return f"Erro ao processar resposta da IA: {str(e)}"
 
+def gerar_insight_ia_stream(df: pd.DataFrame, pergunta: str) -> Iterator[str]:
+    """
+    Mesma resposta de gerar_insight_ia, em pedaços à medida que o Gemini gera (generate_content com stream=True).
+    Respostas em cache saem num pedaço só; a resposta só entra no cache se o fluxo chegar ao fim.
+    Falta de API key, erro do Gemini (antes ou no meio do fluxo) e resposta bloqueada levantam ErroRespostaIA,
+    para quem consome o fluxo distinguir a resposta de um erro.
+    """
+    if not configure_genai():
+        raise ErroRespostaIA(AVISO_SEM_CHAVE)
+
+    prompt, dados = _prompt_insight(df, pergunta)
+    try:
+        model = get_gemini_model()
+        filtros = df.attrs.get(ATRIBUTO_FILTROS) or {}
+        chave = chave_cache("insight", model.model_name, dados, pergunta)
+        em_cache = obter_resposta(chave)
+        if em_cache is not None:
+            yield em_cache
+            return
+        partes = []
+        for pedaco in model.generate_content(prompt, stream=True):
+            # Pedaços sem texto não têm .text: ou só encerram a resposta, ou indicam bloqueio
+            if not pedaco.parts:
+                motivo = _motivo_bloqueio(pedaco)
+                if motivo:
+                    raise ErroRespostaIA(f"Erro ao processar resposta da IA: resposta bloqueada ({motivo})")
+                continue
+            texto = pedaco.text
+            if texto:
+                partes.append(texto)
+                yield texto
+        if not partes:
+            raise ErroRespostaIA("Erro ao processar resposta da IA: o Gemini não retornou texto")
+        gravar_resposta(chave, "insight", "".join(partes), filtros.get("account_id"), filtros.get("user_id"))
+    except ErroRespostaIA:
+        raise
+    except Exception as e:
+        raise ErroRespostaIA(f"Erro ao processar resposta da IA: {str(e)}") from e
+
 # Alias para manter compatibilidade temporária se necessário, 
 # mas vamos atualizar o import no chat.py
 gerar_insight_ia_together = gerar_insight_ia
 
-def interpretar_pedido_usuario(df: pd.DataFrame, pedido: str) -> dict:
+def assinatura_schema(df: pd.DataFrame) -> str:
+    """Colunas do DataFrame e o tipo geral de cada uma (número, data ou texto), na ordem."""
+    def tipo_geral(serie):
+        if pd.api.types.is_bool_dtype(serie) or pd.api.types.is_numeric_dtype(serie):
+            return "numero"
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            return "data"
+        return "texto"
+    return json.dumps([[str(coluna), tipo_geral(df[coluna])] for coluna in df.columns])
+
+def interpretar_pedido_usuario(df: pd.DataFrame, pedido: str, usar_regras: bool = True) -> dict:
+    # Pedidos comuns ("pizza de gasto por campanha") são resolvidos pelas regras locais, sem chamar o Gemini
+    if usar_regras:
+        params = interpretar_pedido_local(df, pedido)
+        if params is not None:
+            print("DEBUG - Pedido de gráfico interpretado pelas regras locais:", params)
+            return params
+
     if not configure_genai():
         raise RuntimeError("API Key do Google Gemini não configurada.")
 
@@ -127,37 +241,41 @@ def interpretar_pedido_usuario(df: pd.DataFrame, pedido: str) -> dict:
 
     try:
         model = get_gemini_model()
-        response = model.generate_content(prompt)
-        content = response.text
+        # A especificação depende das colunas e do texto do pedido, não dos valores: o cache é por schema
+        # e vale para todos os usuários/contas com as mesmas colunas
+        chave = chave_cache("grafico", model.model_name, assinatura_schema(df), pedido)
+        em_cache = obter_resposta(chave)
+        if em_cache is not None:
+            result = json.loads(em_cache)
+            print("DEBUG - Especificação do gráfico do cache:", result)
+        else:
+            response = model.generate_content(prompt)
+            content = response.text
 
-        print("DEBUG - Resposta bruta da IA:", content)
+            print("DEBUG - Resposta bruta da IA:", content)
 
-        # Limpeza básica de markdown code blocks
-        if "```" in content:
-            content = content.replace("```json", "").replace("```", "")
-        
-        content = content.strip()
-        
-        # Tenta extrair JSON
-        match = re.search(r"\{.*\}", content, re.DOTALL)
-        if match:
-            json_text = match.group(0)
-            result = json.loads(json_text)
-        else:
-            result = json.loads(content)
-
-        # Force update operation if keywords are present in user request
-        keywords_update = ["altera", "muda", "atualiza", "troca", "corrige", "refaz", "ajusta", "formata"]
-        if any(k in pedido.lower() for k in keywords_update):
-            if result.get("operation") != "update":
-                print(f"DEBUG - Forçando operation='update' baseado em keywords no pedido: '{pedido}'")
-                result["operation"] = "update"
-        
-        # Force dateFormat if requested
-        if "dd/mm/yyyy" in pedido.lower():
-             result["dateFormat"] = "%d/%m/%Y"
-        elif "dd/mm" in pedido.lower():
-             result["dateFormat"] = "%d/%m"
+            # Limpeza básica de markdown code blocks
+            if "```" in content:
+                content = content.replace("```json", "").replace("```", "")
+            
+            content = content.strip()
+            
+            # Tenta extrair JSON
+            match = re.search(r"\{.*\}", content, re.DOTALL)
+            if match:
+                json_text = match.group(0)
+                result = json.loads(json_text)
+            else:
+                result = json.loads(content)
+            gravar_resposta(chave, "grafico", json.dumps(result))
+
+        # operation e dateFormat seguem as mesmas regras do parser local
+        if operacao_do_pedido(pedido) == "update" and result.get("operation") != "update":
+            print(f"DEBUG - Forçando operation='update' baseado em keywords no pedido: '{pedido}'")
+            result["operation"] = "update"
+        formato = formato_data_do_pedido(pedido)
+        if formato:
+            result["dateFormat"] = formato
         
         return result
 
@@ -231,28 +349,44 @@ def montar_json_final(df: pd.DataFrame, params: dict) -> dict:
             except:
                 return 0.0
 
+    # Rótulo do eixo X: datas sem hora (date_start vem como datetime64) saem como YYYY-MM-DD
+    def label(val):
+        if isinstance(val, pd.Timestamp) and val == val.normalize():
+            return val.strftime('%Y-%m-%d')
+        return str(val)
+
     # Se houver pedido de agregação, processa o DataFrame
     if aggregation and group_by_real and y_real:
-        print(f"DEBUG - Agregando dados: {aggregation} por {group_by_real}")
         try:
-            # Garante que y_real seja numérico
-            df[y_real] = df[y_real].apply(clean_number)
-            
-            # Se group_by for data, tenta converter para datetime para ordenar corretamente
-            if 'date' in group_by_real.lower() or 'dia' in group_by_real.lower():
-                try:
-                    df[group_by_real] = pd.to_datetime(df[group_by_real])
-                except:
-                    pass
-
-            if aggregation == 'sum':
-                df_agg = df.groupby(group_by_real)[y_real].sum().reset_index()
-            elif aggregation == 'mean':
-                df_agg = df.groupby(group_by_real)[y_real].mean().reset_index()
-            elif aggregation == 'count':
-                df_agg = df.groupby(group_by_real)[y_real].count().reset_index()
+            # Insights do banco: soma/média/contagem de métrica aditiva por dia, campanha ou conjunto
+            # sai pronta dos rollups gold (None quando a pergunta não bate com eles)
+            try:
+                df_agg = consultar_agregado(df.attrs.get(ATRIBUTO_FILTROS), group_by_real, y_real, aggregation)
+            except Exception as e:
+                print(f"Erro ao consultar rollups gold: {e}")
+                df_agg = None
+            if df_agg is not None:
+                print(f"DEBUG - Agregação {aggregation} por {group_by_real} respondida pelos rollups gold")
             else:
-                df_agg = df # Fallback
+                print(f"DEBUG - Agregando dados: {aggregation} por {group_by_real}")
+                # Garante que y_real seja numérico
+                df[y_real] = df[y_real].apply(clean_number)
+
+                # Se group_by for data, tenta converter para datetime para ordenar corretamente
+                if 'date' in group_by_real.lower() or 'dia' in group_by_real.lower():
+                    try:
+                        df[group_by_real] = pd.to_datetime(df[group_by_real])
+                    except:
+                        pass
+
+                if aggregation == 'sum':
+                    df_agg = df.groupby(group_by_real, observed=True)[y_real].sum().reset_index()
+                elif aggregation == 'mean':
+                    df_agg = df.groupby(group_by_real, observed=True)[y_real].mean().reset_index()
+                elif aggregation == 'count':
+                    df_agg = df.groupby(group_by_real, observed=True)[y_real].count().reset_index()
+                else:
+                    df_agg = df # Fallback
 
             # Se convertemos para datetime, volta para string formatada se for dia
             if pd.api.types.is_datetime64_any_dtype(df_agg[group_by_real]):
@@ -278,7 +412,7 @@ def montar_json_final(df: pd.DataFrame, params: dict) -> dict:
         
         result = [
             {
-                x_real: str(row[x_real]),
+                x_real: label(row[x_real]),
                 y_real: clean_number(row[y_real])
             }
             for _, row in data.iterrows()
@@ -306,7 +440,7 @@ def montar_json_final(df: pd.DataFrame, params: dict) -> dict:
     data = df[[x_real, y_real]].dropna().head(50)
     result = [
         {
-            x_real: str(row[x_real]),
+            x_real: label(row[x_real]),
             y_real: clean_number(row[y_real])
         }
         for _, row in data.iterrows()
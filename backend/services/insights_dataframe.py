@@ -0,0 +1,127 @@
+"""
+Tipos dos DataFrames de insights lidos de account_ads_facebook_dataframe (banco ou Parquet).
+
+As linhas lidas viram uma tabela Arrow coluna a coluna, já nos tipos finais, e só então um DataFrame:
+nomes, ids e status como category, contagens em int32, valores decimais em float64, datas como datetime64.
+Sem isso o pandas inferia object/float64 em todas as colunas de texto e número.
+
+formato="arrow" devolve as colunas com pd.ArrowDtype (sem cópia para NumPy), para quem processa com Arrow/pandas 2+.
+"""
+from typing import List, Sequence
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+CATEGORIA = pa.dictionary(pa.int32(), pa.string())
+
+TIPOS_LEITURA = {
+    "id": pa.int64(),
+    "account_id": pa.int64(),
+    "user_id": pa.int64(),
+    "data_extracao": pa.timestamp("s"),
+    "campaign_name": CATEGORIA,
+    "adset_name": CATEGORIA,
+    "ad_name": CATEGORIA,
+    "impressions": pa.int32(),
+    "reach": pa.int32(),
+    "clicks": pa.int32(),
+    # Decimais ficam em float64: em float32 o ruído aparecia nos gráficos (0.33 virava 0.33000001311302185)
+    "cpc": pa.float64(),
+    "spend": pa.float64(),
+    "ad_id": CATEGORIA,
+    "frequency": pa.float64(),
+    "ctr": pa.float64(),
+    "cpm": pa.float64(),
+    "date_start": pa.timestamp("s"),
+    "date_stop": pa.timestamp("s"),
+    "nivel": CATEGORIA,
+    "status": CATEGORIA,
+    "objective": CATEGORIA,
+    "actions": pa.string(),
+    "campaign_id": CATEGORIA,
+    "adset_id": CATEGORIA,
+    "entidade_id": CATEGORIA,
+}
+
+FORMATOS = ("pandas", "arrow")
+
+# Inteiros com nulos viram Int32 (nullable) em vez de float64
+_TIPOS_PANDAS = {pa.int32(): pd.Int32Dtype(), pa.int64(): pd.Int64Dtype()}
+
+
+def _converter(coluna: pa.Array, tipo: pa.DataType) -> pa.Array:
+    if coluna.type == tipo:
+        return coluna
+    if pa.types.is_timestamp(tipo) and (pa.types.is_timestamp(coluna.type) or pa.types.is_date(coluna.type)):
+        # datetime/date vindos do Postgres ou do Parquet; frações de segundo são descartadas
+        return pc.cast(coluna, tipo, safe=False)
+    if pa.types.is_timestamp(tipo) and (pa.types.is_string(coluna.type) or pa.types.is_null(coluna.type)):
+        try:
+            # "YYYY-MM-DD" e "YYYY-MM-DD HH:MM:SS" convertem direto
+            return pc.cast(coluna, tipo)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            pass
+        datas = pd.to_datetime(pd.Series(coluna.to_pylist(), dtype=object), errors="coerce")
+        return pa.array(datas, type=tipo, from_pandas=True)
+    if pa.types.is_dictionary(tipo):
+        if not (pa.types.is_string(coluna.type) or pa.types.is_null(coluna.type)):
+            coluna = pc.cast(coluna, pa.string())
+        return pc.cast(coluna, tipo)
+    try:
+        return pc.cast(coluna, tipo)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        # Texto ("-", "") em coluna numérica vira nulo; inteiro que não cabe em int32 fica int64
+        numeros = pd.to_numeric(pd.Series(coluna.to_pylist(), dtype=object), errors="coerce")
+        if pa.types.is_integer(tipo):
+            numeros = numeros.astype("float64").apply(np.trunc)
+            try:
+                return pa.array(numeros, type=tipo, from_pandas=True, safe=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                return pa.array(numeros, type=pa.int64(), from_pandas=True)
+        return pa.array(numeros, type=tipo, from_pandas=True)
+
+
+def _array(valores: Sequence, tipo: pa.DataType) -> pa.Array:
+    # Texto e datas: o Arrow infere (str no SQLite, datetime no Postgres) e _converter ajusta
+    base = None if pa.types.is_dictionary(tipo) or pa.types.is_timestamp(tipo) else tipo
+    try:
+        coluna = pa.array(valores, type=base)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Valores de tipos misturados (ex.: número gravado como texto): tudo como texto e _converter ajusta
+        coluna = pa.array([None if v is None else str(v) for v in valores], type=pa.string())
+    return _converter(coluna, tipo)
+
+
+def tabela_de_linhas(nomes: List[str], linhas: List[tuple]) -> pa.Table:
+    """Linhas de um cursor (tuplas na ordem de nomes) -> tabela Arrow com os tipos de TIPOS_LEITURA."""
+    colunas = list(zip(*linhas)) if linhas else [()] * len(nomes)
+    arrays = []
+    for nome, valores in zip(nomes, colunas):
+        tipo = TIPOS_LEITURA.get(nome)
+        arrays.append(_array(valores, tipo) if tipo is not None else pa.array(valores))
+    return pa.Table.from_arrays(arrays, names=list(nomes))
+
+
+def tipar_tabela(tabela: pa.Table) -> pa.Table:
+    """Converte as colunas conhecidas de uma tabela Arrow (ex.: lida do Parquet) para os tipos de TIPOS_LEITURA."""
+    for i, nome in enumerate(tabela.column_names):
+        tipo = TIPOS_LEITURA.get(nome)
+        if tipo is not None and tabela.column(i).type != tipo:
+            tabela = tabela.set_column(i, nome, _converter(tabela.column(i).combine_chunks(), tipo))
+    return tabela
+
+
+def para_dataframe(tabela: pa.Table, formato: str = "pandas") -> pd.DataFrame:
+    if formato not in FORMATOS:
+        raise ValueError(f"formato deve ser um de {FORMATOS}")
+    if formato == "arrow":
+        return tabela.to_pandas(types_mapper=pd.ArrowDtype)
+    df = tabela.to_pandas(types_mapper=_TIPOS_PANDAS.get)
+    # O dicionário do Arrow vem na ordem de aparição; groupby/sort_values de category seguem a ordem das
+    # categorias, então elas são ordenadas (mesma ordem alfabética de quando as colunas eram object)
+    for coluna in df.select_dtypes("category").columns:
+        categorias = df[coluna].cat.categories
+        if not categorias.is_monotonic_increasing:
+            df[coluna] = df[coluna].cat.reorder_categories(categorias.sort_values())
+    return df
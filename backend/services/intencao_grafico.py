@@ -0,0 +1,265 @@
+"""
+Interpretação local (sem IA) dos pedidos de gráfico mais comuns.
+
+"gráfico de linha de cliques por dia", "pizza de gasto por campanha", "média de CTR por conjunto": métrica,
+dimensão, agregação e tipo de gráfico saem de um catálogo de sinônimos das colunas de insights (mais os nomes
+das próprias colunas do DataFrame, para planilhas). Devolve a mesma especificação que o Gemini devolveria em
+services/ia.py (type, xKey, yKey, title, aggregation, groupBy, operation, dateFormat).
+
+Só responde quando não há dúvida: exatamente uma métrica e uma dimensão reconhecidas, nenhum tipo de gráfico
+conflitante e, tirando os termos reconhecidos, só palavras de ligação ("gráfico", "de", "por", "mostrar"...).
+Qualquer outra palavra pode ser um filtro, ranking, período ou comparação que a especificação não expressa
+("da campanha X", "em janeiro", "ontem"): nesses casos devolve None e o pedido segue para o Gemini.
+"""
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import pandas as pd
+from services.cache_ia import normalizar_pergunta
+
+# Coluna -> (rótulo no título, sinônimos sem acento, agregação padrão)
+# Taxas (CTR, CPC, CPM, frequência) não se somam: o padrão é a média
+METRICAS = {
+    "clicks": ("Cliques", ("cliques", "clique", "clicks", "click"), "sum"),
+    "impressions": ("Impressões", ("impressoes", "impressao", "impressions"), "sum"),
+    "reach": ("Alcance", ("alcance", "reach", "pessoas alcancadas"), "sum"),
+    "spend": ("Gasto", ("gasto", "gastos", "spend", "investimento", "investido", "valor gasto", "valor investido", "custo total"), "sum"),
+    "ctr": ("CTR", ("ctr", "taxa de cliques", "taxa de clique"), "mean"),
+    "cpc": ("CPC", ("cpc", "custo por clique", "custo por cliques"), "mean"),
+    "cpm": ("CPM", ("cpm", "custo por mil", "custo por mil impressoes"), "mean"),
+    "frequency": ("Frequência", ("frequencia", "frequency"), "mean"),
+}
+
+# Coluna -> (rótulo no título, sinônimos usados depois de "por"/"cada")
+DIMENSOES = {
+    "campaign_name": ("Campanha", ("campanha", "campanhas", "campaign", "campaigns")),
+    "adset_name": ("Conjunto", ("conjunto de anuncios", "conjuntos de anuncios", "conjunto", "conjuntos", "adset", "adsets", "publico", "publicos")),
+    "ad_name": ("Anúncio", ("anuncio", "anuncios", "ad", "ads", "criativo", "criativos")),
+    "objective": ("Objetivo", ("objetivo", "objetivos")),
+    "status": ("Status", ("status",)),
+}
+
+DIMENSAO_DATA = ("Dia", ("dia", "dias", "data", "datas", "tempo"))
+# Sem "por": já indicam agrupamento por data
+TERMOS_DIARIOS = ("diario", "diaria", "diarios", "diarias", "diariamente", "dia a dia")
+TERMOS_EVOLUCAO = ("evolucao", "historico", "tendencia", "ao longo do tempo")
+
+TIPOS_EXPLICITOS = {
+    "line": ("linha", "linhas", "line"),
+    "pie": ("pizza", "pie", "torta", "rosca", "donut"),
+    "bar": ("barra", "barras", "bar", "colunas"),
+}
+# Dicas de tipo usadas só quando nenhum tipo é citado
+TIPOS_SUGERIDOS = {
+    "line": TERMOS_EVOLUCAO,
+    "pie": ("distribuicao", "porcentagem", "percentual", "participacao", "fatia", "fatias"),
+}
+
+AGREGACOES = {
+    "mean": ("media", "medio", "medias", "medios", "average", "avg"),
+    "sum": ("total", "totais", "soma", "somado", "somados", "somatorio", "sum"),
+    "count": ("contagem", "count"),
+}
+
+# Mesmas palavras que o Gemini recebe no prompt para "operation": "update"
+PALAVRAS_ALTERACAO = ("altera", "muda", "atualiza", "troca", "corrige", "refaz", "ajusta", "formata")
+
+FORMATOS_DATA = ("dd/mm/yyyy", "dd/mm")
+
+# Únicas palavras que podem sobrar depois de tirar métrica, dimensão, tipo, agregação e formato de data.
+# A especificação não tem filtro, ranking, período nem comparação: qualquer outra palavra manda o pedido ao Gemini
+PALAVRAS_NEUTRAS = frozenset((
+    "grafico", "graficos", "chart", "de", "do", "da", "dos", "das", "por", "com", "em", "no", "na", "nos", "nas",
+    "o", "a", "os", "as", "ao", "um", "uma", "para", "pra", "pro", "cada", "meu", "meus", "minha", "minhas", "me",
+    "mostrar", "mostre", "mostra", "faca", "fazer", "faz", "gere", "gerar", "crie", "criar", "plotar", "plote",
+    "plota", "ver", "visualizar", "visualizacao", "dividido", "dividida", "divididos", "divididas", "agrupado",
+    "agrupada", "agrupados", "agrupadas", "formato", "datas", "tipo", "favor", "agora",
+    "altera", "altere", "alterar", "muda", "mude", "mudar", "atualiza", "atualize", "atualizar", "troca", "troque",
+    "trocar", "corrige", "corrija", "corrigir", "refaz", "refaca", "refazer", "ajusta", "ajuste", "ajustar",
+    "formata", "formate", "formatar",
+))
+
+# Artigos só são neutros no meio da frase: no fim ou logo depois da dimensão ("cliques por campanha A") são um filtro
+ARTIGOS = frozenset(("o", "a", "os", "as", "um", "uma"))
+# Termos interpretados são trocados por marcadores (fora do alfabeto de _texto), para saber onde estavam
+MARCADOR = "#"
+MARCADOR_DIMENSAO = "#dimensao"
+
+# Termos já interpretados fora da métrica e da dimensão (mais longos primeiro: "dia a dia" antes de "dia")
+TERMOS_RECONHECIDOS = sorted(
+    FORMATOS_DATA + TERMOS_DIARIOS + TERMOS_EVOLUCAO
+    + tuple(t for grupo in (TIPOS_EXPLICITOS, TIPOS_SUGERIDOS, AGREGACOES) for termos in grupo.values() for t in termos),
+    key=len, reverse=True,
+)
+
+
+def _texto(pedido: str) -> str:
+    # "dd/mm" e nomes de coluna com "_" sobrevivem; o resto da pontuação vira espaço
+    return " " + re.sub(r"\s+", " ", re.sub(r"[^a-z0-9_/%]+", " ", normalizar_pergunta(pedido))).strip() + " "
+
+
+@lru_cache(maxsize=4096)
+def _regex(termo: str, prefixo: str = "") -> "re.Pattern":
+    return re.compile(prefixo + r"(?<![a-z0-9_])" + re.escape(termo) + r"(?![a-z0-9_])")
+
+
+def _contem(texto: str, termos) -> bool:
+    return any(_regex(t).search(texto) for t in termos)
+
+
+def _so_palavras_neutras(resto: str) -> bool:
+    for termo in TERMOS_RECONHECIDOS:
+        resto = _regex(termo).sub(f" {MARCADOR} ", resto)
+    palavras = resto.split()
+    for i, palavra in enumerate(palavras):
+        if palavra in (MARCADOR, MARCADOR_DIMENSAO):
+            continue
+        if palavra not in PALAVRAS_NEUTRAS:
+            return False
+        if palavra in ARTIGOS and (i == len(palavras) - 1 or palavras[i - 1] == MARCADOR_DIMENSAO):
+            return False
+    return True
+
+
+def _nome_normalizado(coluna) -> str:
+    return normalizar_pergunta(str(coluna))
+
+
+def operacao_do_pedido(pedido: str) -> str:
+    texto = normalizar_pergunta(pedido)
+    return "update" if any(p in texto for p in PALAVRAS_ALTERACAO) else "create"
+
+
+def formato_data_do_pedido(pedido: str) -> Optional[str]:
+    texto = pedido.lower()
+    if "dd/mm/yyyy" in texto:
+        return "%d/%m/%Y"
+    if "dd/mm" in texto:
+        return "%d/%m"
+    return None
+
+
+def _coluna_de_data(df: pd.DataFrame) -> Optional[str]:
+    if "date_start" in df.columns:
+        return "date_start"
+    for coluna, tipo in zip(df.columns, df.dtypes):
+        if pd.api.types.is_datetime64_any_dtype(tipo):
+            return coluna
+    for coluna in df.columns:
+        nome = _nome_normalizado(coluna)
+        if "date" in nome or "data" in nome or "dia" in nome:
+            return coluna
+    return None
+
+
+def _sinonimos_metricas(df: pd.DataFrame) -> List[Tuple[str, str]]:
+    pares = []
+    for coluna, (_, sinonimos, _) in METRICAS.items():
+        if coluna in df.columns:
+            pares += [(s, coluna) for s in sinonimos]
+    # Planilhas: colunas numéricas pelo próprio nome ("vendas", "receita_liquida" ou "receita liquida")
+    for coluna, tipo in zip(df.columns, df.dtypes):
+        if coluna not in METRICAS and not pd.api.types.is_bool_dtype(tipo) and pd.api.types.is_numeric_dtype(tipo):
+            nome = _nome_normalizado(coluna)
+            pares += [(nome, coluna), (nome.replace("_", " "), coluna)]
+    return pares
+
+
+def _sinonimos_dimensoes(df: pd.DataFrame, coluna_data: Optional[str]) -> List[Tuple[str, str]]:
+    pares = []
+    if coluna_data:
+        pares += [(s, coluna_data) for s in DIMENSAO_DATA[1]]
+    for coluna, (_, sinonimos) in DIMENSOES.items():
+        if coluna in df.columns:
+            pares += [(s, coluna) for s in sinonimos]
+    for coluna, tipo in zip(df.columns, df.dtypes):
+        if coluna not in DIMENSOES and coluna != coluna_data and not pd.api.types.is_numeric_dtype(tipo):
+            nome = _nome_normalizado(coluna)
+            pares += [(nome, coluna), (nome.replace("_", " "), coluna)]
+    return pares
+
+
+def _encontrar(texto: str, pares: List[Tuple[str, str]], prefixo: str = "", marcador: str = MARCADOR) -> Tuple[set, str]:
+    """Colunas citadas no texto; cada trecho reconhecido vira o marcador (sinônimos mais longos primeiro)."""
+    encontradas = set()
+    for termo, coluna in sorted(set(pares), key=lambda p: -len(p[0])):
+        padrao = _regex(termo, prefixo)
+        if padrao.search(texto):
+            encontradas.add(coluna)
+            texto = padrao.sub(f" {marcador} ", texto)
+    return encontradas, texto
+
+
+def _tipo_do_grafico(texto: str) -> Optional[str]:
+    explicitos = {tipo for tipo, termos in TIPOS_EXPLICITOS.items() if _contem(texto, termos)}
+    if len(explicitos) > 1:
+        return None
+    if explicitos:
+        return explicitos.pop()
+    sugeridos = {tipo for tipo, termos in TIPOS_SUGERIDOS.items() if _contem(texto, termos)}
+    if len(sugeridos) > 1:
+        return None
+    if sugeridos:
+        return sugeridos.pop()
+    return "bar"
+
+
+def _titulo(metrica: str, dimensao: str, agregacao: str, coluna_data: Optional[str]) -> str:
+    rotulo = METRICAS[metrica][0] if metrica in METRICAS else str(metrica)
+    padrao = METRICAS[metrica][2] if metrica in METRICAS else "sum"
+    if agregacao == "mean" and padrao != "mean":
+        rotulo = f"Média de {rotulo}"
+    elif agregacao == "count":
+        rotulo = f"Contagem de {rotulo}"
+    if dimensao == coluna_data:
+        eixo = DIMENSAO_DATA[0]
+    else:
+        eixo = DIMENSOES[dimensao][0] if dimensao in DIMENSOES else str(dimensao)
+    return f"{rotulo} por {eixo}"
+
+
+def interpretar_pedido_local(df: pd.DataFrame, pedido: str) -> Optional[Dict[str, str]]:
+    """Especificação do gráfico pelas regras locais, ou None quando o pedido precisa do Gemini."""
+    if df is None or df.empty or not pedido:
+        return None
+    texto = _texto(pedido)
+
+    metricas, resto = _encontrar(texto, _sinonimos_metricas(df))
+    if len(metricas) != 1:
+        return None
+    metrica = metricas.pop()
+
+    coluna_data = _coluna_de_data(df)
+    dimensoes, resto = _encontrar(resto, _sinonimos_dimensoes(df, coluna_data),
+                                  prefixo=r"(?:por|cada)\s+(?:cada\s+)?(?:(?:o|a|os|as|um|uma)\s+)?",
+                                  marcador=MARCADOR_DIMENSAO)
+    if coluna_data and (_contem(resto, TERMOS_DIARIOS) or (not dimensoes and _contem(resto, TERMOS_EVOLUCAO))):
+        dimensoes.add(coluna_data)
+    if len(dimensoes) != 1:
+        return None
+    dimensao = dimensoes.pop()
+    if dimensao == metrica or not _so_palavras_neutras(resto):
+        return None
+
+    tipo = _tipo_do_grafico(texto)
+    if tipo is None:
+        return None
+
+    agregacoes = {nome for nome, termos in AGREGACOES.items() if _contem(texto, termos)}
+    if len(agregacoes) > 1:
+        return None
+    agregacao = agregacoes.pop() if agregacoes else (METRICAS[metrica][2] if metrica in METRICAS else "sum")
+
+    spec = {
+        "operation": operacao_do_pedido(pedido),
+        "type": tipo,
+        "xKey": dimensao,
+        "yKey": metrica,
+        "title": _titulo(metrica, dimensao, agregacao, coluna_data),
+        "aggregation": agregacao,
+        "groupBy": dimensao,
+    }
+    formato = formato_data_do_pedido(pedido)
+    if formato:
+        spec["dateFormat"] = formato
+    return spec
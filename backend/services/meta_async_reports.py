@@ -0,0 +1,91 @@
+import time
+from typing import Any, Dict, Iterator, List, Optional
+from services.graph_client import get_graph_client, GraphAPIError
+from core.config import (
+    META_ASYNC_LIMIAR_DIAS, META_ASYNC_LIMIAR_LINHAS,
+    META_ASYNC_TIMEOUT_SEGUNDOS, META_ASYNC_LIMITE_PAGINA,
+)
+
+# Relatórios assíncronos da Insights API: POST /act_x/insights devolve um report_run_id,
+# que é consultado até "Job Completed" e então baixado em páginas grandes.
+
+STATUS_CONCLUIDO = "Job Completed"
+STATUS_FALHA = {"Job Failed", "Job Skipped"}
+
+# "Dados demais para uma chamada síncrona": código 1 (erro genérico) ou 100 (parâmetro inválido) com a
+# mensagem pedindo para reduzir os dados. O código 2 (serviço indisponível) é transitório e não conta.
+CODIGOS_ERRO_VOLUME = {1, 100}
+MENSAGEM_ERRO_VOLUME = "reduce the amount of data"
+
+
+class ErroRelatorioAssincrono(Exception):
+    pass
+
+
+def deve_usar_relatorio_assincrono(dias: int, linhas_estimadas: Optional[int] = None) -> bool:
+    """Decide o modo de extração a partir do tamanho do intervalo e do volume estimado de linhas."""
+    if dias > META_ASYNC_LIMIAR_DIAS:
+        return True
+    return linhas_estimadas is not None and linhas_estimadas > META_ASYNC_LIMIAR_LINHAS
+
+
+def erro_de_volume(erro: Dict[str, Any]) -> bool:
+    """Indica se o erro de uma chamada síncrona pede para reduzir o volume (e vale tentar o modo assíncrono)."""
+    mensagem = (erro.get("message") or "").lower()
+    return erro.get("code") in CODIGOS_ERRO_VOLUME and MENSAGEM_ERRO_VOLUME in mensagem
+
+
+def _chamar(metodo, caminho: str, token: str, **kwargs) -> Dict[str, Any]:
+    try:
+        return metodo(caminho, token=token, **kwargs)
+    except GraphAPIError as e:
+        raise ErroRelatorioAssincrono(str(e)) from e
+
+
+def submeter_relatorio(account_id_str: str, token: str, params: Dict[str, Any]) -> str:
+    """Cria o report run e retorna o report_run_id."""
+    dados = {k: v for k, v in params.items() if k != "limit"}
+    dados["access_token"] = token
+    report_run_id = _chamar(get_graph_client().post, f"{account_id_str}/insights", token, data=dados).get("report_run_id")
+    if not report_run_id:
+        raise ErroRelatorioAssincrono("A Graph API não retornou report_run_id.")
+    return report_run_id
+
+
+def aguardar_relatorio(report_run_id: str, token: str, timeout: float = None, espera_inicial: float = 1.0, espera_maxima: float = 30.0):
+    """Consulta o status do relatório com backoff exponencial até concluir, falhar ou estourar o timeout."""
+    timeout = timeout or META_ASYNC_TIMEOUT_SEGUNDOS
+    limite = time.monotonic() + timeout
+    espera = espera_inicial
+    while True:
+        data = _chamar(get_graph_client().get, report_run_id, token,
+                       params={"access_token": token, "fields": "async_status,async_percent_completion"})
+        status = data.get("async_status")
+        print(f"DEBUG - Relatório {report_run_id}: {status} ({data.get('async_percent_completion', 0)}%)")
+        if status == STATUS_CONCLUIDO:
+            return
+        if status in STATUS_FALHA:
+            raise ErroRelatorioAssincrono(f"Relatório {report_run_id} terminou com status '{status}'.")
+        if time.monotonic() + espera > limite:
+            raise ErroRelatorioAssincrono(f"Relatório {report_run_id} não concluiu em {timeout}s.")
+        time.sleep(espera)
+        espera = min(espera * 2, espera_maxima)
+
+
+def baixar_relatorio(report_run_id: str, token: str, limite_pagina: int = None) -> Iterator[List[Dict[str, Any]]]:
+    """Baixa o resultado do relatório concluído, uma página por vez."""
+    params = {"access_token": token, "limit": limite_pagina or META_ASYNC_LIMITE_PAGINA}
+    try:
+        for data in get_graph_client().paginar(f"{report_run_id}/insights", params, token=token):
+            if data.get("data"):
+                yield data["data"]
+    except GraphAPIError as e:
+        raise ErroRelatorioAssincrono(str(e)) from e
+
+
+def iterar_relatorio_assincrono(account_id_str: str, token: str, params: Dict[str, Any]) -> Iterator[List[Dict[str, Any]]]:
+    """Submete e aguarda um relatório assíncrono; gera as páginas de itens brutos da Insights API."""
+    report_run_id = submeter_relatorio(account_id_str, token, params)
+    aguardar_relatorio(report_run_id, token)
+    yield from baixar_relatorio(report_run_id, token)
+
@@ -1,246 +1,462 @@
-from database.connection import get_db_connection
+from database.connection import get_db_connection, is_sqlite
+from database.migrations import garantir_schema
 import json
-import requests
+import time
+from itertools import repeat
 from datetime import datetime, timedelta, date
 from services.user_facebook import buscar_usuario_por_facebook_id
+from services.meta_loader import upsert_insights, coagir_numeros, tamanho_colunas, TAMANHO_LOTE_PADRAO, COLUNAS_INSIGHTS, COLUNAS_INTEIRAS, COLUNAS_DECIMAIS
+from services.token_limiter import limite_token
+from services.graph_client import get_graph_client, GraphAPIError
+from concurrent.futures import ThreadPoolExecutor
+from services.pipeline import produzir_em_paralelo
+from services.meta_sync_state import ler_watermarks, gravar_watermark, inicio_incremental, cobre_watermark
+from services.meta_async_reports import iterar_relatorio_assincrono, deve_usar_relatorio_assincrono, erro_de_volume
+from services.parquet_store import gravar_insights_parquet, ler_insights_parquet, conta_completa, desmarcar_conta_completa
+from services.insights_dataframe import tabela_de_linhas, para_dataframe
+from services.meta_gold import atualizar_rollups, dias_do_lote, ATRIBUTO_FILTROS
+from services.cache_ia import invalidar_conta
+from core.config import META_MAX_CONTAS_PARALELAS, META_JANELA_DIAS, META_TENTATIVAS_JANELA, META_JANELA_REATRIBUICAO_DIAS, META_PARQUET_HABILITADO
+
+# Colunas que podem ser lidas por carregar_account_ads_facebook_dataframe
+COLUNAS_LEITURA = ("id", "data_extracao") + COLUNAS_INSIGHTS
+# Colunas usadas pela IA e pelos gráficos: sem as chaves internas do banco
+COLUNAS_ANALISE = tuple(c for c in COLUNAS_LEITURA if c not in ("id", "account_id", "user_id", "entidade_id"))
 
 CAMPOS_VALIDOS = {
-    "ad": {"campaign_name", "adset_name", "ad_name", "impressions", "reach", "clicks", "cpc", "spend", "ad_id", "ctr", "cpm", "frequency", "actions", "objective", "date_start", "date_stop"},
-    "adset": {"campaign_name", "adset_name", "impressions", "reach", "clicks", "cpc", "spend", "adset_id", "ctr", "cpm", "frequency", "actions", "objective", "date_start", "date_stop"},
+    "ad": {"campaign_name", "adset_name", "ad_name", "impressions", "reach", "clicks", "cpc", "spend", "ad_id", "adset_id", "campaign_id", "ctr", "cpm", "frequency", "actions", "objective", "date_start", "date_stop"},
+    "adset": {"campaign_name", "adset_name", "impressions", "reach", "clicks", "cpc", "spend", "adset_id", "campaign_id", "ctr", "cpm", "frequency", "actions", "objective", "date_start", "date_stop"},
     "campaign": {"campaign_name", "impressions", "reach", "clicks", "cpc", "spend", "campaign_id", "configured_status", "effective_status", "ctr", "cpm", "frequency", "actions", "objective", "date_start", "date_stop"}
 }
 
-def buscar_dados_meta(account_id: str, user_facebook_id: str, data_inicial: str = None, data_final: str = None, fields: str = None):
+# Ids sempre pedidos em cada nível: o do próprio nível compõe a chave do upsert (entidade_id)
+# e os dos níveis acima permitem agregar anúncios por conjunto e campanha
+IDS_NIVEL = {
+    "ad": ("ad_id", "adset_id", "campaign_id"),
+    "adset": ("adset_id", "campaign_id"),
+    "campaign": ("campaign_id",),
+}
+
+class ErroJanela(Exception):
+    """Falha ao buscar uma janela de datas; a janela inteira é buscada de novo."""
+
+
+def _repetido_pelo_cliente(erro: BaseException) -> bool:
+    """
+    Indica se a causa do erro é um erro transitório da Graph API: o cliente (services/graph_client.py)
+    já o repetiu META_GRAPH_TENTATIVAS vezes com backoff, e buscar a janela de novo só multiplicaria as chamadas.
+    """
+    while erro is not None:
+        if isinstance(erro, GraphAPIError):
+            return erro.transitorio
+        erro = erro.__cause__
+    return False
+
+
+def dividir_intervalo(since: str, until: str, dias: int) -> list:
+    """Divide [since, until] em janelas consecutivas de no máximo `dias` dias, em ordem cronológica."""
+    inicio = datetime.strptime(since, "%Y-%m-%d").date()
+    fim = datetime.strptime(until, "%Y-%m-%d").date()
+    janelas = []
+    while inicio <= fim:
+        fim_janela = min(inicio + timedelta(days=max(1, dias) - 1), fim)
+        janelas.append({"since": inicio.strftime("%Y-%m-%d"), "until": fim_janela.strftime("%Y-%m-%d")})
+        inicio = fim_janela + timedelta(days=1)
+    return janelas
+
+
+def _campos_nivel(nivel: str, fields: str):
+    """Retorna (campos pedidos, campos enviados à API) para o nível."""
+    campos = set((fields or "").split(","))
+    campos_validos = CAMPOS_VALIDOS[nivel]
+    campos_ignorados = [c for c in campos if c and c not in campos_validos]
+    # Filtro especial para campaign: status fields só podem ir sozinhos
+    if nivel == "campaign":
+        status_fields = {"configured_status", "effective_status"}
+        if status_fields & campos:
+            campos_status_selecionados = [c for c in status_fields if c in campos]
+            outros_campos = [c for c in campos if c not in status_fields]
+            if outros_campos:
+                # Se tiver campos de status misturados com outros, removemos status para evitar erro
+                # Ou poderíamos fazer duas chamadas. Para simplificar, vamos priorizar métricas se houver conflito.
+                # Mas o código original retornava erro. Vamos manter o comportamento permissivo removendo status.
+                pass 
+    
+    fields_filtrados = ",".join([c for c in campos if c in campos_validos])
+    
+    # Se não tiver campos válidos solicitados, usa o padrão
+    if not fields_filtrados:
+         fields_filtrados = ",".join(list(campos_validos)[:10]) # pega os primeiros 10 como default
+    ids = [c for c in IDS_NIVEL[nivel] if c not in fields_filtrados.split(",")]
+    if ids:
+        fields_filtrados = ",".join([fields_filtrados] + ids)
+    return campos | set(IDS_NIVEL[nivel]), fields_filtrados
+
+
+# Métricas que ficam 0 quando a API não as devolve (as demais ficam nulas)
+METRICAS_ZERADAS = ("impressions", "reach", "clicks", "cpc", "spend")
+
+
+def _normalizar_pagina(itens: list, campos: set, nivel: str) -> dict:
+    """
+    Normaliza uma página da Insights API por colunas ({coluna: valores}): cada campo é lido
+    numa passada pela página e as métricas são convertidas de uma vez (coagir_numeros),
+    já no tipo gravado no banco, em vez de item a item.
+    """
+    def coluna(nome, padrao):
+        return list(map(dict.get, itens, repeat(nome), repeat(padrao)))
+
+    colunas = {campo: coluna(campo, "-") for campo in sorted(campos) if campo}
+    colunas["campaign_name"] = coluna("campaign_name", "")
+    colunas["adset_name"] = [item.get("adset_name", "") or item.get("addset_name", "") for item in itens]
+    colunas["ad_name"] = coluna("ad_name", "")
+    colunas["status"] = coluna("status", "ACTIVE")
+    for metrica in METRICAS_ZERADAS:
+        colunas[metrica] = coagir_numeros(coluna(metrica, None), inteiro=metrica in COLUNAS_INTEIRAS, padrao=0)
+    for metrica in COLUNAS_DECIMAIS:
+        if metrica in colunas and metrica not in METRICAS_ZERADAS:
+            colunas[metrica] = coagir_numeros(colunas[metrica])
+    colunas["date_start"] = coluna("date_start", "")
+    colunas["date_stop"] = coluna("date_stop", "")
+    colunas["nivel"] = [nivel] * len(itens)
+    return colunas
+
+
+def _juntar_paginas(paginas: list) -> dict:
+    # Páginas de níveis diferentes têm colunas diferentes (ids do nível): a coluna que falta fica None
+    lote = {nome: [] for pagina in paginas for nome in pagina}
+    for pagina in paginas:
+        tamanho = tamanho_colunas(pagina)
+        for nome, valores in lote.items():
+            if nome in pagina:
+                valores.extend(pagina[nome])
+            else:
+                valores.extend([None] * tamanho)
+    return lote
+
+
+def _registros(colunas: dict) -> list:
+    """Colunas -> lista de dicts, para as respostas JSON."""
+    nomes = list(colunas)
+    return [dict(zip(nomes, valores)) for valores in zip(*colunas.values())]
+
+
+def _paginas_janela(account_id_str: str, token: str, nivel: str, fields: str, time_range: dict, assincrono: bool = False):
+    """
+    Gera, página a página, os insights normalizados de um nível dentro de uma janela de datas,
+    paginando a chamada síncrona ou, em modo assíncrono, via report run.
+    Erros da API levantam ErroJanela.
+    """
+    campos, fields_filtrados = _campos_nivel(nivel, fields)
+    params = {
+        "access_token": token,
+        "level": nivel,
+        "fields": fields_filtrados,
+        "limit": 200,
+        "time_increment": "1",
+        "time_range": json.dumps(time_range),
+    }
+
+    if assincrono:
+        print(f'DEBUG - Relatório assíncrono ({nivel}): {time_range["since"]} -> {time_range["until"]}')
+        for itens in iterar_relatorio_assincrono(account_id_str, token, params):
+            yield _normalizar_pagina(itens, campos, nivel)
+        return
+
+    print(f'DEBUG - Buscando intervalo ({nivel}): {time_range["since"]} -> {time_range["until"]}')
+
+    entregues = 0
+    try:
+        for data in get_graph_client().paginar(f"{account_id_str}/insights", params, token=token):
+            if data.get("data"):
+                entregues += 1
+                yield _normalizar_pagina(data["data"], campos, nivel)
+    except GraphAPIError as e:
+        if erro_de_volume(e.erro) and not entregues:
+            # Volume grande demais para a chamada síncrona: refaz a janela como relatório assíncrono
+            print(f"AVISO: {e} - refazendo {time_range} ({nivel}) em modo assíncrono")
+            yield from _paginas_janela(account_id_str, token, nivel, fields, time_range, assincrono=True)
+            return
+        raise ErroJanela(str(e)) from e
+
+
+def _gravar_lote(conn, lote, account_db_id, user_id, resumo):
+    """
+    Upsert do lote no banco, recálculo dos rollups gold dos dias do lote e, com META_PARQUET_HABILITADO,
+    gravação nas partições Parquet da conta.
+    """
+    resumo = upsert_insights(conn, lote, account_db_id, user_id, resumo=resumo)
+    try:
+        atualizar_rollups(conn, account_db_id, user_id, dias_do_lote(lote))
+    except Exception as e:
+        # Os fatos já estão gravados; os rollups podem ser refeitos com `python -m services.meta_gold reconstruir`
+        print(f"[ERRO] Falha ao atualizar os rollups gold da conta {account_db_id}: {e}")
+    if META_PARQUET_HABILITADO and tamanho_colunas(lote):
+        try:
+            gravar_insights_parquet(lote, account_db_id, user_id)
+        except Exception as e:
+            # O banco continua sendo a fonte principal; o Parquet pode ser refeito com `python -m services.parquet_store exportar`
+            print(f"[ERRO] Falha ao gravar lote no Parquet da conta {account_db_id}: {e}")
+            # Com o lote faltando, as leituras da conta voltam para o banco até a próxima exportação
+            desmarcar_conta_completa(account_db_id)
+    return resumo
+
+
+def _estimar_linhas(cur, account_db_id, dias: int) -> int:
+    """Estima quantas linhas a extração vai trazer a partir da média diária já gravada para a conta."""
+    cur.execute("""
+        SELECT COUNT(*), COUNT(DISTINCT date_start) FROM account_ads_facebook_dataframe
+        WHERE account_id = %s
+    """, (account_db_id,))
+    total, dias_gravados = cur.fetchone()
+    if not dias_gravados:
+        return 0
+    return int(total / dias_gravados * dias)
+
+
+def _paginas_janela_com_retentativa(account_id_str: str, token: str, nivel: str, fields: str, time_range: dict, assincrono: bool = False):
+    """
+    Gera as páginas da janela; se a busca falhar, busca de novo só essa janela (até META_TENTATIVAS_JANELA vezes),
+    pulando as páginas já entregues. Erros transitórios da Graph API não são repetidos aqui: o cliente já os repetiu.
+    """
+    entregues = 0
+    for tentativa in range(1, META_TENTATIVAS_JANELA + 1):
+        try:
+            for indice, pagina in enumerate(_paginas_janela(account_id_str, token, nivel, fields, time_range, assincrono)):
+                if indice < entregues:
+                    continue
+                entregues += 1
+                yield pagina
+            return
+        except Exception as e:
+            print(f"AVISO: Erro no intervalo {time_range} ({nivel}), tentativa {tentativa}/{META_TENTATIVAS_JANELA}: {e}")
+            if tentativa == META_TENTATIVAS_JANELA or _repetido_pelo_cliente(e):
+                raise
+            time.sleep(2 ** (tentativa - 1))
+
+
+def extrair_dados_meta(account_id: str, user_facebook_id: str, data_inicial: str = None, data_final: str = None, fields: str = None, janela_dias: int = None, sincronizacao_completa: bool = False):
+    """
+    Extrai os insights da conta nos níveis ad, adset e campaign e grava no banco, em fluxo.
+
+    Gera ("registros", colunas do lote) a cada lote gravado e, por último, ("resumo", resposta) com os totais
+    da ingestão. As páginas buscadas esperam a gravação numa fila limitada (META_FILA_MAXIMA_PAGINAS),
+    então a memória usada não cresce com o tamanho da conta.
+
+    Sem datas explícitas a sincronização é incremental: cada nível parte do watermark do usuário
+    (meta_sync_state) menos META_JANELA_REATRIBUICAO_DIAS. sincronizacao_completa=True ignora
+    o watermark e busca o ano inteiro.
+    """
     # Busca o id do usuário
     user = buscar_usuario_por_facebook_id(user_facebook_id)
     if not user or not user.get('id'):
-        return {"erro": "Usuário não encontrado para o facebook_id informado"}
+        yield "resumo", {"erro": "Usuário não encontrado para o facebook_id informado"}
+        return
     user_id = user['id']
 
     # Conecta ao banco e busca a conta com identificador correspondente
     conn = get_db_connection()
     cur = conn.cursor()
-    cur.execute("""
-        SELECT id, token FROM accounts_ads_facebook
-        WHERE TRIM(identificador_conta) = %s AND plataforma = 'Facebook Ads' AND ativo = true
-        LIMIT 1
-    """, (account_id,))
-    row = cur.fetchone()
-    if not row:
+    try:
+        cur.execute("""
+            SELECT id, token FROM accounts_ads_facebook
+            WHERE TRIM(identificador_conta) = %s AND plataforma = 'Facebook Ads' AND ativo = true
+            LIMIT 1
+        """, (account_id,))
+        row = cur.fetchone()
+        if not row:
+            yield "resumo", {"erro": "Conta não encontrada ou inativa"}
+            return
+        account_db_id, token = row
+
+        account_id_str = str(account_id)
+        if not account_id_str.startswith("act_"):
+            account_id_str = f"act_{account_id_str}"
+
+        niveis = ["ad", "adset", "campaign"]
+
+        today = date.today()
+        until = data_final if (data_inicial and data_final) else today.strftime("%Y-%m-%d")
+        incremental = not (data_inicial and data_final) and not sincronizacao_completa
+        watermarks = ler_watermarks(conn, account_db_id, user_id)
+        intervalos = {}
+        for nivel in niveis:
+            if data_inicial and data_final:
+                intervalos[nivel] = data_inicial
+            elif incremental:
+                # Só o que mudou desde o último sync completo do nível (menos a janela de reatribuição)
+                intervalos[nivel] = inicio_incremental(watermarks.get(nivel), f"{today.year}-01-01", META_JANELA_REATRIBUICAO_DIAS)
+            else:
+                # GERA INTERVALO APENAS PARA O ANO ATUAL
+                intervalos[nivel] = f"{today.year}-01-01"
+
+        # Intervalos longos são lentos na Graph API (e às vezes expiram): quebramos em janelas menores
+        tarefas = []
+        for nivel in niveis:
+            janelas = dividir_intervalo(intervalos[nivel], until, janela_dias or META_JANELA_DIAS)
+            print(f'DEBUG - Nível {nivel}: {len(janelas)} janelas ({intervalos[nivel]} -> {until})')
+            tarefas.extend((nivel, janela) for janela in janelas)
+
+        # Intervalos ou volumes grandes vão para relatórios assíncronos da Insights API
+        dias = max((datetime.strptime(until, "%Y-%m-%d") - datetime.strptime(since, "%Y-%m-%d")).days + 1 for since in intervalos.values())
+        assincrono = deve_usar_relatorio_assincrono(dias, _estimar_linhas(cur, account_db_id, dias))
+        print(f'DEBUG - Modo de extração: {"assíncrono" if assincrono else "síncrono"} ({dias} dias)')
+
+        # Níveis e janelas são independentes: buscamos tudo em paralelo e gravamos em lotes conforme as páginas chegam.
+        # A concorrência real de chamadas HTTP é limitada por token (services/token_limiter.py).
+        janelas_com_falha = []
+        resumo = None
+        paginas_pendentes = []
+        linhas_pendentes = 0
+        paginas = produzir_em_paralelo(
+            tarefas,
+            lambda tarefa: _paginas_janela_com_retentativa(account_id_str, token, tarefa[0], fields, tarefa[1], assincrono),
+            len(niveis) * limite_token(token),
+        )
+        for (nivel, janela), pagina, erro in paginas:
+            if erro is not None:
+                janelas_com_falha.append({"nivel": nivel, **janela, "erro": str(erro)})
+                continue
+            paginas_pendentes.append(pagina)
+            linhas_pendentes += tamanho_colunas(pagina)
+            if linhas_pendentes >= TAMANHO_LOTE_PADRAO:
+                # INSERIR NO BANCO em lotes (INSERT ... ON CONFLICT DO UPDATE)
+                lote = _juntar_paginas(paginas_pendentes)
+                resumo = _gravar_lote(conn, lote, account_db_id, user_id, resumo)
+                yield "registros", lote
+                paginas_pendentes, linhas_pendentes = [], 0
+        lote = _juntar_paginas(paginas_pendentes)
+        resumo = _gravar_lote(conn, lote, account_db_id, user_id, resumo)
+        if paginas_pendentes:
+            yield "registros", lote
+        print(f'[DEBUG] account_id={account_db_id}, user_id={user_id} | Inseridos: {resumo["inseridos"]} | Atualizados: {resumo["atualizados"]} | Pulados: {resumo["pulados"]} | Falhas: {resumo["falhas"]}')
+        if resumo["inseridos"] or resumo["atualizados"]:
+            # Respostas da IA sobre os dados antigos da conta deixam de valer
+            invalidar_conta(account_db_id, user_id)
+
+        # Avança o watermark dos níveis que buscaram todas as janelas sem buracos e foram gravados sem falhas
+        niveis_com_falha = {falha["nivel"] for falha in janelas_com_falha}
+        sincronizacao = {}
+        for nivel in niveis:
+            since = intervalos[nivel]
+            completo = nivel not in niveis_com_falha and resumo["falhas"] == 0
+            if completo and (since <= f"{today.year}-01-01" or cobre_watermark(watermarks.get(nivel), since)):
+                gravar_watermark(conn, account_db_id, user_id, nivel, until)
+            sincronizacao[nivel] = {"since": since, "until": until, "incremental": incremental and nivel in watermarks, "completo": completo}
+
+        resposta = {"ingestao": resumo, "sincronizacao": sincronizacao, "modo_extracao": "assincrono" if assincrono else "sincrono"}
+        if janelas_com_falha:
+            resposta["janelas_com_falha"] = janelas_com_falha
+        yield "resumo", resposta
+    finally:
         cur.close()
         conn.close()
-        return {"erro": "Conta não encontrada ou inativa"}
-    account_db_id, token = row
-
-    account_id_str = str(account_id)
-    if not account_id_str.startswith("act_"):
-        account_id_str = f"act_{account_id_str}"
-
-    url_base = f"https://graph.facebook.com/v19.0/{account_id_str}/insights"
-    niveis = ["ad", "adset", "campaign"]
-    resultado = []
-    for nivel in niveis:
-        campos = set((fields or "").split(","))
-        campos_validos = CAMPOS_VALIDOS[nivel]
-        campos_ignorados = [c for c in campos if c and c not in campos_validos]
-        # Filtro especial para campaign: status fields só podem ir sozinhos
-        if nivel == "campaign":
-            status_fields = {"configured_status", "effective_status"}
-            if status_fields & campos:
-                campos_status_selecionados = [c for c in status_fields if c in campos]
-                outros_campos = [c for c in campos if c not in status_fields]
-                if outros_campos:
-                    # Se tiver campos de status misturados com outros, removemos status para evitar erro
-                    # Ou poderíamos fazer duas chamadas. Para simplificar, vamos priorizar métricas se houver conflito.
-                    # Mas o código original retornava erro. Vamos manter o comportamento permissivo removendo status.
-                    pass 
-        
-        fields_filtrados = ",".join([c for c in campos if c in campos_validos])
-        
-        # Se não tiver campos válidos solicitados, usa o padrão
-        if not fields_filtrados:
-             fields_filtrados = ",".join(list(campos_validos)[:10]) # pega os primeiros 10 como default
-
-        # Base params without time_range
-        base_params = {
-            "access_token": token,
-            "level": nivel,
-            "fields": fields_filtrados,
-            "limit": 200,
-            "time_increment": "1"
-        }
-        
-        date_ranges = []
-        if data_inicial and data_final:
-            date_ranges.append({"since": data_inicial, "until": data_final})
+
+def buscar_dados_meta(account_id: str, user_facebook_id: str, data_inicial: str = None, data_final: str = None, fields: str = None, janela_dias: int = None, sincronizacao_completa: bool = False, incluir_dados: bool = True):
+    """
+    Executa extrair_dados_meta até o fim e retorna o resumo da ingestão.
+    Com incluir_dados=True o resumo traz também todos os registros em "dados" (formato antigo da resposta;
+    a memória volta a crescer com o tamanho da conta).
+    """
+    dados = []
+    resposta = {}
+    for tipo, conteudo in extrair_dados_meta(account_id, user_facebook_id, data_inicial, data_final, fields, janela_dias, sincronizacao_completa):
+        if tipo == "registros":
+            if incluir_dados:
+                dados.extend(_registros(conteudo))
+        else:
+            resposta = conteudo
+    if incluir_dados and "erro" not in resposta:
+        resposta = {"dados": dados, **resposta}
+    return resposta
+
+def stream_dados_meta(account_id: str, user_facebook_id: str, data_inicial: str = None, data_final: str = None, fields: str = None, janela_dias: int = None, sincronizacao_completa: bool = False):
+    """NDJSON: uma linha por registro gravado e, por último, {"resumo": {...}}."""
+    for tipo, conteudo in extrair_dados_meta(account_id, user_facebook_id, data_inicial, data_final, fields, janela_dias, sincronizacao_completa):
+        if tipo == "registros":
+            yield "".join(json.dumps(registro) + "\n" for registro in _registros(conteudo))
         else:
-            # GERA INTERVALO APENAS PARA O ANO ATUAL (2025)
-            today = date.today()
-            start = f"{today.year}-01-01"
-            end = today.strftime("%Y-%m-%d")
-            date_ranges.append({"since": start, "until": end})
-        
-        print(f'DEBUG - Tentando nível: {nivel} com {len(date_ranges)} intervalos')
-
-        for time_range in date_ranges:
-            params = base_params.copy()
-            params["time_range"] = json.dumps(time_range)
-            
-            print(f'DEBUG - Buscando intervalo: {time_range["since"]} -> {time_range["until"]}')
-            
-            url = url_base
-            while url:
-                try:
-                    response = requests.get(url, params=params if '?' not in url else {})
-                    data = response.json()
-                    
-                    if not response.ok or "error" in data:
-                        print(f"AVISO: Erro no intervalo {time_range}: {data.get('error', {}).get('message')}")
-                        break
-                    
-                    if not data.get("data"):
-                        break
-                        
-                    for item in data.get("data", []):
-                        registro = {}
-                        for campo in campos:
-                            if campo:
-                                registro[campo] = item.get(campo, "-")
-                        registro["campaign_name"] = item.get("campaign_name", "")
-                        registro["adset_name"] = item.get("adset_name", "") or item.get("addset_name", "")
-                        registro["ad_name"] = item.get("ad_name", "")
-                        registro["status"] = item.get("status", "ACTIVE")
-                        registro["impressions"] = int(float(item.get("impressions", 0) or 0)) if item.get("impressions") not in [None, "-"] else 0
-                        registro["reach"] = int(float(item.get("reach", 0) or 0)) if item.get("reach") not in [None, "-"] else 0
-                        registro["clicks"] = int(float(item.get("clicks", 0) or 0)) if item.get("clicks") not in [None, "-"] else 0
-                        registro["cpc"] = float(item.get("cpc", 0) or 0) if item.get("cpc") not in [None, "-"] else 0
-                        registro["spend"] = float(item.get("spend", 0) or 0) if item.get("spend") not in [None, "-"] else 0
-                        registro["date_start"] = item.get("date_start", "")
-                        registro["date_stop"] = item.get("date_stop", "")
-                        for campo in campos:
-                            if campo and campo not in registro:
-                                registro[campo] = "-"
-                        registro["nivel"] = nivel
-                        resultado.append(registro)
-                    
-                    next_url = data.get("paging", {}).get("next")
-                    if not next_url:
-                        break
-                    url = next_url
-                    params = None
-                except Exception as e:
-                    print(f"ERRO EXCEÇÃO: {e}")
-                    break
-        # Não faz return aqui, continua para juntar todos os níveis
-    # INSERIR NO BANCO, evitando duplicatas
-    print(f'[DEBUG] Tentando inserir {len(resultado)} registros no banco para account_id={account_db_id}, user_id={user_id}')
-    inseridos = 0
-    pulados = 0
-    for registro in resultado:
-        ad_id = registro.get("ad_id")
-        date_start = registro.get("date_start")
-        date_stop = registro.get("date_stop")
-        # Verifica duplicata
+            yield json.dumps({"resumo": conteudo}, default=str) + "\n"
+
+def buscar_dados_meta_contas(account_ids: list, user_facebook_id: str, data_inicial: str = None, data_final: str = None, fields: str = None, janela_dias: int = None, sincronizacao_completa: bool = False, incluir_dados: bool = False):
+    """
+    Sincroniza várias contas ao mesmo tempo (até META_MAX_CONTAS_PARALELAS).
+    Contas que compartilham o mesmo token continuam respeitando o limite de concorrência do token.
+    Por padrão retorna só o resumo de cada conta.
+    """
+    def sincronizar(account_id):
         try:
-            cur.execute("""
-                SELECT 1 FROM account_ads_facebook_dataframe
-                WHERE account_id = %s AND user_id = %s AND ad_id = %s AND date_start = %s AND date_stop = %s
-            """, (account_db_id, user_id, ad_id, date_start, date_stop))
-            if cur.fetchone():
-                pulados += 1
-                continue
-            # Prepara campos numéricos
-            impressions = int_or_none(registro.get("impressions"))
-            reach = int_or_none(registro.get("reach"))
-            clicks = int_or_none(registro.get("clicks"))
-            cpc = parse_numeric(registro.get("cpc"))
-            spend = parse_numeric(registro.get("spend"))
-            frequency = parse_numeric(registro.get("frequency"))
-            ctr = parse_numeric(registro.get("ctr"))
-            cpm = parse_numeric(registro.get("cpm"))
-            # Insert
-            cur.execute("""
-                INSERT INTO account_ads_facebook_dataframe (
-                    account_id, user_id, data_extracao, campaign_name, adset_name, ad_name,
-                    impressions, reach, clicks, cpc, spend, ad_id, frequency, ctr, cpm, date_start, date_stop, nivel, status, objective, actions
-                ) VALUES (%s, %s, CURRENT_TIMESTAMP, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """,
-            (
-                account_db_id,
-                user_id,
-                registro.get("campaign_name"),
-                registro.get("adset_name"),
-                registro.get("ad_name"),
-                impressions,
-                reach,
-                clicks,
-                cpc,
-                spend,
-                ad_id,
-                frequency,
-                ctr,
-                cpm,
-                registro.get("date_start"),
-                registro.get("date_stop"),
-                registro.get("nivel"),
-                registro.get("status"),
-                registro.get("objective"),
-                json.dumps(registro.get("actions")) if registro.get("actions") else None,
-            ))
-            inseridos += 1
+            return buscar_dados_meta(account_id, user_facebook_id, data_inicial, data_final, fields, janela_dias, sincronizacao_completa, incluir_dados)
         except Exception as e:
-            print(f"[ERRO] Falha ao inserir registro no banco: {e}\n\nRegistro: {registro}")
-    print(f'[DEBUG] Inseridos: {inseridos} | Pulados (duplicatas): {pulados}')
-    conn.commit()
-    cur.close()
-    conn.close()
-    return {"dados": resultado}
-
-def parse_numeric(value):
-    try:
-        if value in (None, '', '-', 'null'):
-            return None
-        return float(value)
-    except Exception:
-        return None
+            print(f"[ERRO] Falha ao sincronizar conta {account_id}: {e}")
+            return {"erro": str(e)}
 
-def int_or_none(value):
-    try:
-        if value in (None, '', '-', 'null'):
-            return None
-        return int(float(value))
-    except Exception:
-        return None
+    with ThreadPoolExecutor(max_workers=max(1, min(META_MAX_CONTAS_PARALELAS, len(account_ids)))) as executor:
+        resultados = list(executor.map(sincronizar, account_ids))
+    return {"contas": dict(zip(account_ids, resultados))}
 
-def carregar_account_ads_facebook_dataframe(account_id=None, user_id=None, limit=5000):
+def carregar_account_ads_facebook_dataframe(account_id=None, user_id=None, limit=5000, fonte=None, colunas=None, data_inicial=None, data_final=None, formato="pandas"):
     """
     Lê os dados da tabela account_ads_facebook_dataframe e retorna um DataFrame pandas.
-    Pode filtrar por account_id e/ou user_id. Por padrão, retorna até 5000 linhas.
+    Pode filtrar por account_id e/ou user_id. Por padrão, retorna até 5000 linhas (limit=None: todas).
+    colunas limita as colunas lidas e data_inicial/data_final filtram date_start.
+    fonte: "banco", "parquet" ou None (Parquet quando META_PARQUET_HABILITADO, a leitura é de uma conta e a conta
+    foi exportada por inteiro; leituras só por usuário e contas parciais vêm do banco).
+    As colunas já vêm tipadas (services/insights_dataframe.py); formato="arrow" devolve colunas pd.ArrowDtype.
+    Os filtros usados ficam em df.attrs["insights"].
     """
-    import pandas as pd
+    if fonte is None:
+        fonte = "parquet" if META_PARQUET_HABILITADO and account_id and conta_completa(account_id) else "banco"
+    filtros_leitura = {"account_id": account_id, "user_id": user_id, "data_inicial": data_inicial, "data_final": data_final}
+    if fonte == "parquet":
+        df = ler_insights_parquet(account_id, user_id, colunas, data_inicial, data_final, limit, formato)
+        df.attrs[ATRIBUTO_FILTROS] = filtros_leitura
+        return df
+
     conn = get_db_connection()
-    query = "SELECT * FROM account_ads_facebook_dataframe"
-    filtros = []
-    params = []
-    if account_id:
-        filtros.append("account_id = %s")
-        params.append(account_id)
-    if user_id:
-        filtros.append("user_id = %s")
-        params.append(user_id)
-    if filtros:
-        query += " WHERE " + " AND ".join(filtros)
-    
-    # Ordena pela extração mais recente (lote) e depois pela data do dado (cronológico)
-    query += f" ORDER BY data_extracao DESC, date_start ASC LIMIT {limit}"
-    
-    df = pd.read_sql(query, conn, params=params)
-    conn.close()
-    # Conversão explícita dos campos numéricos
-    campos_numericos = ["impressions", "reach", "clicks", "cpc", "spend", "ctr", "cpm", "frequency"]
-    for col in campos_numericos:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors="coerce")
+    try:
+        garantir_schema(conn)
+        # Só nomes conhecidos entram no SELECT
+        nomes = [c for c in (colunas or COLUNAS_LEITURA) if c in COLUNAS_LEITURA] or list(COLUNAS_LEITURA)
+        if is_sqlite(conn):
+            # CAST: sem o tipo declarado o sqlite3 não converte data_extracao linha a linha (PARSE_DECLTYPES);
+            # a conversão é feita de uma vez pelo Arrow
+            selecionadas = ", ".join("CAST(data_extracao AS TEXT) AS data_extracao" if c == "data_extracao" else c for c in nomes)
+        else:
+            selecionadas = ", ".join(nomes)
+        query = f"SELECT {selecionadas} FROM account_ads_facebook_dataframe"
+        filtros = []
+        params = []
+        if account_id:
+            filtros.append("account_id = %s")
+            params.append(account_id)
+        if user_id:
+            filtros.append("user_id = %s")
+            params.append(user_id)
+        if data_inicial:
+            filtros.append("date_start >= %s")
+            params.append(data_inicial)
+        if data_final:
+            filtros.append("date_start <= %s")
+            params.append(data_final)
+        if filtros:
+            query += " WHERE " + " AND ".join(filtros)
+
+        # Ordena pela extração mais recente (lote) e depois pela data do dado (cronológico)
+        query += " ORDER BY data_extracao DESC, date_start ASC"
+        if limit:
+            query += " LIMIT %s"
+            params.append(int(limit))
+
+        cur = conn.cursor()
+        cur.execute(query, params)
+        linhas = cur.fetchall()
+        cur.close()
+    finally:
+        conn.close()
+    df = para_dataframe(tabela_de_linhas(nomes, linhas), formato)
+    # Gráficos e insights usam os filtros para consultar os rollups gold (services/meta_gold.py)
+    df.attrs[ATRIBUTO_FILTROS] = filtros_leitura
     return df
 
 def buscar_id_conta_por_identificador(identificador_conta: str):
@@ -0,0 +1,222 @@
+"""
+Camada Gold: rollups diários por campanha e por conjunto (tabelas criadas em database/migrations.py, versão 007).
+
+A ingestão recalcula, a cada lote gravado, os dias da conta que o lote tocou (apaga e reinsere a partir de
+account_ads_facebook_dataframe), então os totais sempre refletem o estado atual da tabela de fatos.
+Gráficos e insights usam os rollups quando a pergunta é uma soma/média/contagem por dia, campanha ou conjunto
+de uma métrica aditiva; o resto continua agregando o DataFrame em pandas.
+
+Uso (refazer os rollups a partir dos fatos, ex.: depois de editar a tabela à mão):
+    python -m services.meta_gold reconstruir          # todas as contas
+    python -m services.meta_gold reconstruir 3        # só a conta de id 3
+"""
+import sys
+from typing import Any, Dict, Iterable, List, Optional
+import pandas as pd
+from database.connection import get_db_connection
+from database.migrations import METRICAS_ADITIVAS, ROLLUPS, garantir_schema, sql_popular_rollup
+
+# Chave de DataFrame.attrs com os filtros usados na leitura dos insights (services/meta_extractor.py);
+# é por ela que gráficos e insights sabem de qual conta/usuário consultar os rollups
+ATRIBUTO_FILTROS = "insights"
+
+DIAS_POR_COMANDO = 500
+
+# Coluna do DataFrame de insights -> (tabela do rollup, coluna agrupada)
+AGRUPAMENTOS = {
+    "date_start": ("gold_campanha_diario", "dia"),
+    "date_stop": ("gold_campanha_diario", "dia"),
+    "campaign_name": ("gold_campanha_diario", "campaign_name"),
+    "campaign_id": ("gold_campanha_diario", "campaign_id"),
+    "adset_name": ("gold_conjunto_diario", "adset_name"),
+    "adset_id": ("gold_conjunto_diario", "adset_id"),
+}
+
+AGREGACOES = ("sum", "mean", "count")
+
+
+def dias_do_lote(colunas: Dict[str, list]) -> List[str]:
+    """Dias (date_start) das linhas de nível "ad" de um lote normalizado ({coluna: valores})."""
+    niveis = colunas.get("nivel") or []
+    return sorted({dia for dia, nivel in zip(colunas.get("date_start") or [], niveis) if nivel == "ad" and dia})
+
+
+def atualizar_rollups(conn, account_db_id, user_id, dias: Iterable[str]):
+    """Recalcula os rollups dos dias informados da conta/usuário (apaga e reinsere numa transação)."""
+    dias = sorted(set(dias))
+    if not dias:
+        return
+    garantir_schema(conn)
+    cur = conn.cursor()
+    try:
+        for inicio in range(0, len(dias), DIAS_POR_COMANDO):
+            parte = dias[inicio:inicio + DIAS_POR_COMANDO]
+            marcadores = ", ".join(["%s"] * len(parte))
+            for tabela in ROLLUPS:
+                cur.execute(
+                    f"DELETE FROM {tabela} WHERE account_id = %s AND user_id = %s AND dia IN ({marcadores})",
+                    [account_db_id, user_id] + parte,
+                )
+                cur.execute(
+                    sql_popular_rollup(tabela, f"AND account_id = %s AND user_id = %s AND date_start IN ({marcadores})"),
+                    [account_db_id, user_id] + parte,
+                )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def reconstruir_rollups(conn, account_db_id=None):
+    """Refaz os rollups inteiros (de uma conta ou de todas) a partir da tabela de fatos."""
+    garantir_schema(conn)
+    cur = conn.cursor()
+    try:
+        for tabela in ROLLUPS:
+            if account_db_id is None:
+                cur.execute(f"DELETE FROM {tabela}")
+                cur.execute(sql_popular_rollup(tabela))
+            else:
+                cur.execute(f"DELETE FROM {tabela} WHERE account_id = %s", (account_db_id,))
+                cur.execute(sql_popular_rollup(tabela, "AND account_id = %s"), (account_db_id,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def _filtros_sql(filtros: Dict[str, Any]):
+    condicoes = []
+    params = []
+    if filtros.get("account_id"):
+        condicoes.append("account_id = %s")
+        params.append(filtros["account_id"])
+    if filtros.get("user_id"):
+        condicoes.append("user_id = %s")
+        params.append(filtros["user_id"])
+    if filtros.get("data_inicial"):
+        condicoes.append("dia >= %s")
+        params.append(filtros["data_inicial"])
+    if filtros.get("data_final"):
+        condicoes.append("dia <= %s")
+        params.append(filtros["data_final"])
+    return " AND ".join(condicoes), params
+
+
+def _consultar(sql: str, params: list) -> pd.DataFrame:
+    conn = get_db_connection()
+    try:
+        garantir_schema(conn)
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        nomes = [d[0] for d in cur.description]
+        linhas = cur.fetchall()
+        cur.close()
+    finally:
+        conn.close()
+    return pd.DataFrame.from_records(linhas, columns=nomes)
+
+
+def consultar_agregado(filtros: Optional[Dict[str, Any]], group_by: str, metrica: str, agregacao: str) -> Optional[pd.DataFrame]:
+    """
+    Responde "agregacao de metrica por group_by" pelos rollups, com as colunas [group_by, metrica] ordenadas
+    por group_by (como o groupby do pandas). Retorna None quando a pergunta não bate com os rollups
+    (sem filtros de insights, métrica não aditiva, agrupamento sem rollup) ou quando não há linhas.
+    mean e count são por linha de anúncio/dia.
+    """
+    if not filtros or not filtros.get("user_id") or agregacao not in AGREGACOES:
+        return None
+    if metrica not in METRICAS_ADITIVAS or group_by not in AGRUPAMENTOS:
+        return None
+    tabela, coluna = AGRUPAMENTOS[group_by]
+    valor = {
+        "sum": f"SUM({metrica})",
+        "mean": f"CAST(SUM({metrica}) AS REAL) / SUM(linhas)",
+        "count": "SUM(linhas)",
+    }[agregacao]
+    where, params = _filtros_sql(filtros)
+    df = _consultar(f"""
+        SELECT {coluna} AS chave, {valor} AS valor FROM {tabela}
+        WHERE {where}
+        GROUP BY {coluna}
+        ORDER BY {coluna}
+    """, params)
+    if df.empty:
+        return None
+    df.columns = [group_by, metrica]
+    if coluna == "dia":
+        df[group_by] = pd.to_datetime(df[group_by])
+    df[metrica] = pd.to_numeric(df[metrica])
+    return df
+
+
+# Palavras da pergunta -> rollup anexado ao prompt dos insights
+_TERMOS_RESUMO = {
+    "campanha": ("campanha", "campanhas", "campaign"),
+    "conjunto": ("conjunto", "conjuntos", "adset", "público", "publico"),
+    "dia": ("dia", "dias", "diário", "diario", "diária", "diaria", "data", "datas", "evolução", "evolucao", "semana", "tendência", "tendencia"),
+}
+
+LINHAS_RESUMO = 50
+
+
+def _taxas(df: pd.DataFrame) -> pd.DataFrame:
+    impressoes = df["impressions"].where(df["impressions"] > 0)
+    cliques = df["clicks"].where(df["clicks"] > 0)
+    return df.assign(
+        ctr=(df["clicks"] / impressoes * 100).round(2),
+        cpc=(df["spend"] / cliques).round(2),
+        cpm=(df["spend"] / impressoes * 1000).round(2),
+        spend=df["spend"].round(2),
+    )
+
+
+def resumo_para_pergunta(filtros: Optional[Dict[str, Any]], pergunta: str) -> Optional[str]:
+    """
+    CSV com os totais dos rollups que a pergunta pede (por campanha, por conjunto e/ou por dia),
+    para o prompt dos insights responder com os totais do período em vez de uma amostra de linhas.
+    None quando a pergunta não fala de nenhum desses agrupamentos.
+    """
+    if not filtros or not filtros.get("user_id"):
+        return None
+    palavras = set(pergunta.lower().replace("?", " ").replace(",", " ").split())
+    pedidos = [nome for nome, termos in _TERMOS_RESUMO.items() if palavras & set(termos)]
+    if not pedidos:
+        return None
+    where, params = _filtros_sql(filtros)
+    somas = ", ".join(f"SUM({c}) AS {c}" for c in METRICAS_ADITIVAS)
+    consultas = {
+        "campanha": ("Totais por campanha", f"SELECT campaign_name, {somas} FROM gold_campanha_diario WHERE {where} GROUP BY campaign_name ORDER BY SUM(spend) DESC"),
+        "conjunto": ("Totais por conjunto de anúncios", f"SELECT adset_name, campaign_name, {somas} FROM gold_conjunto_diario WHERE {where} GROUP BY adset_name, campaign_name ORDER BY SUM(spend) DESC"),
+        "dia": ("Totais por dia", f"SELECT dia, {somas} FROM gold_campanha_diario WHERE {where} GROUP BY dia ORDER BY dia DESC"),
+    }
+    partes = []
+    for pedido in pedidos:
+        titulo, sql = consultas[pedido]
+        df = _consultar(f"{sql} LIMIT {LINHAS_RESUMO}", params)
+        if not df.empty:
+            partes.append(f"{titulo} (todo o período, somando os anúncios):\n{_taxas(df).to_csv(index=False)}")
+    return "\n".join(partes) or None
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] != "reconstruir":
+        print(__doc__)
+        return 1
+    conta = int(argv[1]) if len(argv) > 1 else None
+    conn = get_db_connection()
+    try:
+        reconstruir_rollups(conn, conta)
+    finally:
+        conn.close()
+    print("Rollups reconstruídos.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+import json
+import numpy as np
+import pandas as pd
+from itertools import repeat
+from typing import Any, Dict, List, Union
+from database.connection import is_sqlite
+from database.migrations import garantir_schema
+
+TABELA_INSIGHTS = "account_ads_facebook_dataframe"
+
+# Chave natural usada pelo ON CONFLICT: a entidade do nível da linha (anúncio, conjunto ou campanha) e o período;
+# o índice único que a sustenta é criado pelas migrações (database/migrations.py)
+CHAVE_INSIGHTS = ("account_id", "user_id", "nivel", "entidade_id", "date_start", "date_stop")
+
+COLUNAS_INSIGHTS = (
+    "account_id", "user_id", "campaign_name", "adset_name", "ad_name",
+    "impressions", "reach", "clicks", "cpc", "spend", "ad_id", "frequency", "ctr", "cpm",
+    "date_start", "date_stop", "nivel", "status", "objective", "actions",
+    "campaign_id", "adset_id", "entidade_id",
+)
+
+# Campo de id e de nome da entidade de cada nível
+ID_POR_NIVEL = {
+    "ad": ("ad_id", "ad_name"),
+    "adset": ("adset_id", "adset_name"),
+    "campaign": ("campaign_id", "campaign_name"),
+}
+
+COLUNAS_INTEIRAS = ("impressions", "reach", "clicks")
+COLUNAS_DECIMAIS = ("cpc", "spend", "frequency", "ctr", "cpm")
+
+# Colunas comparadas para decidir se um registro existente realmente mudou
+COLUNAS_ATUALIZAVEIS = tuple(c for c in COLUNAS_INSIGHTS if c not in CHAVE_INSIGHTS)
+
+TAMANHO_LOTE_PADRAO = 500
+
+# Codificador reaproveitado: evita recriar o JSONEncoder a cada json.dumps
+_codificar_json = json.JSONEncoder().encode
+
+
+def _json_ou_none(valor):
+    return _codificar_json(valor) if isinstance(valor, (list, dict)) and valor else None
+
+
+def tamanho_colunas(colunas: Dict[str, list]) -> int:
+    return len(next(iter(colunas.values()))) if colunas else 0
+
+
+def coagir_numeros(valores: list, inteiro: bool = False, padrao=None) -> list:
+    """
+    Converte uma coluna inteira para número de uma vez (NumPy), truncando quando inteiro=True.
+    Valores inválidos ("-", "", None) viram `padrao`; só colunas que os contêm passam pelo
+    pd.to_numeric(errors="coerce"), mais lento.
+    """
+    try:
+        numeros = np.asarray(valores, dtype=np.float64)
+    except (TypeError, ValueError):
+        numeros = pd.to_numeric(pd.Series(valores, dtype=object), errors="coerce").to_numpy(dtype=np.float64)
+    invalidos = np.isnan(numeros)
+    if inteiro:
+        numeros = np.trunc(np.where(invalidos, 0, numeros)).astype(np.int64)
+    convertidos = numeros.tolist()
+    if not invalidos.any():
+        return convertidos
+    return [padrao if invalido else valor for valor, invalido in zip(convertidos, invalidos.tolist())]
+
+
+def colunas_de_registros(registros: List[Dict[str, Any]]) -> Dict[str, list]:
+    """Lista de dicts -> {coluna: valores}."""
+    nomes = {}
+    for registro in registros:
+        nomes.update(dict.fromkeys(registro))
+    return {nome: [registro.get(nome) for registro in registros] for nome in nomes}
+
+
+def _id_valido(valor) -> bool:
+    return valor is not None and valor != "" and valor != "-"
+
+
+def entidades(colunas: Dict[str, list]) -> list:
+    """
+    entidade_id de cada registro: o id do nível (ad_id, adset_id ou campaign_id). Sem o id (pedido sem o campo ou
+    linha antiga), a entidade é identificada pelo nome do nível ("nome:<nome>"); sem nenhum dos dois, None.
+    """
+    total = tamanho_colunas(colunas)
+    vazio = [None] * total
+    niveis = colunas.get("nivel") or vazio
+    ids = {nivel: colunas.get(campo_id) or vazio for nivel, (campo_id, _) in ID_POR_NIVEL.items()}
+    nomes = {nivel: colunas.get(campo_nome) or vazio for nivel, (_, campo_nome) in ID_POR_NIVEL.items()}
+    resultado = []
+    for i, nivel in enumerate(niveis):
+        nivel = nivel if nivel in ID_POR_NIVEL else "ad"
+        valor = ids[nivel][i]
+        if _id_valido(valor):
+            resultado.append(str(valor))
+        else:
+            nome = nomes[nivel][i]
+            resultado.append(f"nome:{nome}" if nome else None)
+    return resultado
+
+
+def preparar_linhas(colunas: Dict[str, list], account_db_id, user_id) -> List[tuple]:
+    """
+    Converte os registros normalizados ({coluna: valores}) nas tuplas de valores de COLUNAS_INSIGHTS.
+    As conversões numéricas são feitas por coluna; valores inválidos ("-", "") viram NULL.
+    """
+    total = tamanho_colunas(colunas)
+    valores = []
+    for coluna in COLUNAS_INSIGHTS:
+        if coluna == "account_id":
+            valores.append(repeat(account_db_id, total))
+        elif coluna == "user_id":
+            valores.append(repeat(user_id, total))
+        elif coluna == "entidade_id":
+            valores.append(entidades(colunas))
+        elif coluna == "nivel":
+            valores.append([nivel or "ad" for nivel in colunas["nivel"]] if "nivel" in colunas else repeat("ad", total))
+        elif coluna not in colunas:
+            valores.append(repeat(None, total))
+        elif coluna in COLUNAS_INTEIRAS or coluna in COLUNAS_DECIMAIS:
+            valores.append(coagir_numeros(colunas[coluna], inteiro=coluna in COLUNAS_INTEIRAS))
+        elif coluna == "actions":
+            valores.append([_json_ou_none(v) for v in colunas[coluna]])
+        else:
+            valores.append(colunas[coluna])
+    return list(zip(*valores))
+
+
+def _sql_upsert(sqlite: bool) -> str:
+    colunas = ", ".join(("data_extracao",) + COLUNAS_INSIGHTS)
+    chave = ", ".join(CHAVE_INSIGHTS)
+    atualizacoes = ", ".join(["data_extracao = CURRENT_TIMESTAMP"] + [f"{c} = excluded.{c}" for c in COLUNAS_ATUALIZAVEIS])
+    atuais = ", ".join(f"{TABELA_INSIGHTS}.{c}" for c in COLUNAS_ATUALIZAVEIS)
+    novos = ", ".join(f"excluded.{c}" for c in COLUNAS_ATUALIZAVEIS)
+    distinto = "IS NOT" if sqlite else "IS DISTINCT FROM"
+    # No Postgres, xmax = 0 identifica linhas recém-inseridas; no SQLite comparamos o id com o MAX(id) anterior
+    retorno = "id" if sqlite else "(xmax = 0)"
+    return f"""
+        INSERT INTO {TABELA_INSIGHTS} ({colunas})
+        VALUES {{valores}}
+        ON CONFLICT ({chave}) DO UPDATE SET {atualizacoes}
+        WHERE ({atuais}) {distinto} ({novos})
+        RETURNING {retorno}
+    """
+
+
+def _deduplicar_lote(linhas: List[tuple]) -> List[tuple]:
+    # Dentro de um mesmo INSERT a mesma chave não pode aparecer duas vezes (o Postgres rejeita);
+    # a última ocorrência vence.
+    posicoes = [COLUNAS_INSIGHTS.index(c) for c in CHAVE_INSIGHTS]
+    pos_entidade = COLUNAS_INSIGHTS.index("entidade_id")
+    unicos = {}
+    for i, linha in enumerate(linhas):
+        if linha[pos_entidade] is None:
+            # Sem entidade o índice único não se aplica (NULL nunca conflita)
+            unicos[("sem_chave", i)] = linha
+        else:
+            unicos[tuple(linha[p] for p in posicoes)] = linha
+    return list(unicos.values())
+
+
+def _upsert_lote_sqlite(conn, linhas: List[tuple]):
+    cur = conn.cursor()
+    cur.execute(f"SELECT COALESCE(MAX(id), 0) FROM {TABELA_INSIGHTS}")
+    max_id = cur.fetchone()[0]
+    marcador = "(CURRENT_TIMESTAMP, " + ", ".join(["%s"] * len(COLUNAS_INSIGHTS)) + ")"
+    sql = _sql_upsert(sqlite=True).format(valores=", ".join([marcador] * len(linhas)))
+    cur.execute(sql, [v for linha in linhas for v in linha])
+    ids = [row[0] for row in cur.fetchall()]
+    cur.close()
+    inseridos = sum(1 for i in ids if i > max_id)
+    return inseridos, len(ids) - inseridos
+
+
+def _upsert_lote_postgres(conn, linhas: List[tuple]):
+    from psycopg2.extras import execute_values
+    cur = conn.cursor()
+    template = "(CURRENT_TIMESTAMP, " + ", ".join(["%s"] * len(COLUNAS_INSIGHTS)) + ")"
+    retornos = execute_values(
+        cur, _sql_upsert(sqlite=False).format(valores="%s"), linhas,
+        template=template, page_size=len(linhas), fetch=True,
+    )
+    cur.close()
+    inseridos = sum(1 for (novo,) in retornos if novo)
+    return inseridos, len(retornos) - inseridos
+
+
+def upsert_insights(conn, registros: Union[Dict[str, list], List[Dict[str, Any]]], account_db_id, user_id, tamanho_lote: int = TAMANHO_LOTE_PADRAO, resumo: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Grava os registros (lista de dicts ou colunas {coluna: valores}) em account_ads_facebook_dataframe com INSERT ... ON CONFLICT DO UPDATE
+    multi-linha, um comando por lote.
+
+    Retorna os totais de inseridos, atualizados e pulados (duplicados no lote ou sem alteração),
+    além do detalhamento por lote. Um lote que falha é registrado em "falhas" e não interrompe os demais.
+    Passando o resumo de uma chamada anterior, os totais são acumulados nele (gravação em fluxo).
+    """
+    garantir_schema(conn)
+    upsert_lote = _upsert_lote_sqlite if is_sqlite(conn) else _upsert_lote_postgres
+
+    if resumo is None:
+        resumo = {"inseridos": 0, "atualizados": 0, "pulados": 0, "falhas": 0, "lotes": []}
+    if isinstance(registros, list):
+        registros = colunas_de_registros(registros)
+    todas = preparar_linhas(registros, account_db_id, user_id)
+    for inicio in range(0, len(todas), tamanho_lote):
+        linhas = todas[inicio:inicio + tamanho_lote]
+        unicas = _deduplicar_lote(linhas)
+        try:
+            inseridos, atualizados = upsert_lote(conn, unicas)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"[ERRO] Falha ao gravar lote de {len(linhas)} registros no banco: {e}")
+            resumo["lotes"].append({"registros": len(linhas), "erro": str(e)})
+            resumo["falhas"] += len(linhas)
+            continue
+        pulados = len(linhas) - inseridos - atualizados
+        resumo["lotes"].append({"registros": len(linhas), "inseridos": inseridos, "atualizados": atualizados, "pulados": pulados})
+        resumo["inseridos"] += inseridos
+        resumo["atualizados"] += atualizados
+        resumo["pulados"] += pulados
+    return resumo
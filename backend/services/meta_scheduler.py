@@ -0,0 +1,331 @@
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from database.connection import get_db_connection
+from services.meta_extractor import buscar_dados_meta
+from core.config import (
+    META_SYNC_INTERVALO_MINUTOS, META_SYNC_JITTER_SEGUNDOS, META_SYNC_CONTAS_POR_TOKEN,
+    META_SYNC_VERIFICACAO_SEGUNDOS, META_MAX_CONTAS_PARALELAS, META_SYNC_TRAVA,
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Sincronização periódica de todas as contas ativas de accounts_ads_facebook.
+# Cada usuário (tenant) tem sua fila de contas vencidas e as filas são atendidas em rodízio,
+# para que um usuário com muitas contas não atrase os demais. Contas do mesmo token não rodam
+# juntas além de META_SYNC_CONTAS_POR_TOKEN, e o próximo horário de cada conta leva um jitter
+# para as sincronizações não se concentrarem no mesmo instante.
+# Os insights são gravados por usuário: a execução de uma conta sincroniza, em sequência, todos os
+# usuários vinculados a ela (a conta entra na fila do dono, o menor user_id).
+# Um único agendador por máquina: cada processo (worker do uvicorn, execução de desenvolvimento) tenta a
+# trava de arquivo META_SYNC_TRAVA e só quem consegue sincroniza; com vários servidores, ligue
+# META_SYNC_AUTOMATICO em apenas um deles.
+
+
+def _travar_arquivo(caminho: str):
+    """
+    Trava exclusiva do arquivo enquanto o processo viver (o sistema operacional solta se ele morrer).
+    Retorna o arquivo aberto, ou None se outro processo já tem a trava.
+    """
+    arquivo = open(caminho, "a+")
+    try:
+        if fcntl:
+            fcntl.flock(arquivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            arquivo.seek(0)
+            msvcrt.locking(arquivo.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        arquivo.close()
+        return None
+    arquivo.seek(0)
+    arquivo.truncate()
+    arquivo.write(str(os.getpid()))
+    arquivo.flush()
+    return arquivo
+
+
+def _agora_iso() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def listar_contas_sincronizaveis() -> List[Dict[str, Any]]:
+    """Contas ativas do Facebook Ads com o usuário dono (menor user_id associado) e todos os usuários vinculados."""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT a.id, TRIM(a.identificador_conta), a.nome_conta, a.token, uf.id, uf.facebook_id
+        FROM accounts_ads_facebook a
+        JOIN user_accounts ua ON ua.account_id = a.id
+        JOIN user_facebook uf ON uf.id = ua.user_id
+        WHERE a.plataforma = 'Facebook Ads' AND a.ativo = true AND uf.facebook_id IS NOT NULL
+        ORDER BY a.id, uf.id
+    """)
+    rows = cur.fetchall()
+    cur.close()
+    conn.close()
+    contas = {}
+    for account_db_id, identificador, nome, token, user_id, facebook_id in rows:
+        conta = contas.setdefault(account_db_id, {
+            "account_db_id": account_db_id,
+            "identificador_conta": identificador,
+            "nome_conta": nome,
+            "token": token,
+            "user_id": user_id,
+            "user_facebook_id": facebook_id,
+            "usuarios": [],
+        })
+        conta["usuarios"].append({"user_id": user_id, "user_facebook_id": facebook_id})
+    return list(contas.values())
+
+
+def _resultado_usuario(resposta: Dict[str, Any]) -> Dict[str, Any]:
+    if "erro" in resposta:
+        return {"estado": "erro", "erro": resposta["erro"]}
+    ingestao = resposta.get("ingestao", {})
+    return {
+        "estado": "erro" if resposta.get("janelas_com_falha") or ingestao.get("falhas") else "ok",
+        "erro": f"{len(resposta['janelas_com_falha'])} janelas com falha" if resposta.get("janelas_com_falha") else None,
+        "linhas": {k: ingestao.get(k, 0) for k in ("inseridos", "atualizados", "pulados", "falhas")},
+        "modo_extracao": resposta.get("modo_extracao"),
+    }
+
+
+class AgendadorSincronizacao:
+    def __init__(self, intervalo_segundos: float = None, jitter_segundos: float = None, workers: int = None,
+                 contas_por_token: int = None, verificacao_segundos: float = None):
+        self.intervalo = intervalo_segundos if intervalo_segundos is not None else META_SYNC_INTERVALO_MINUTOS * 60
+        self.jitter = jitter_segundos if jitter_segundos is not None else META_SYNC_JITTER_SEGUNDOS
+        self.workers = workers or META_MAX_CONTAS_PARALELAS
+        self.contas_por_token = contas_por_token or META_SYNC_CONTAS_POR_TOKEN
+        self.verificacao = verificacao_segundos or META_SYNC_VERIFICACAO_SEGUNDOS
+        self._contas = {}
+        self._status = {}
+        self._proxima = {}
+        self._filas = OrderedDict()
+        self._enfileiradas = set()
+        self._em_execucao = set()
+        self._execucoes_por_token = {}
+        self._cond = threading.Condition()
+        self._parar = threading.Event()
+        self._executor = None
+        self._thread = None
+        self._trava = None
+
+    # --- ciclo de vida ---
+
+    def iniciar(self, trava: str = None):
+        """Inicia o agendador se este processo conseguir a trava (um agendador por máquina). Retorna se iniciou."""
+        if self._thread and self._thread.is_alive():
+            return True
+        caminho = trava or META_SYNC_TRAVA
+        if self._trava is None:
+            self._trava = _travar_arquivo(caminho)
+            if self._trava is None:
+                print(f"[SYNC] Agendador já ativo em outro processo ({caminho}); este processo não sincroniza")
+                return False
+        self._parar.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="meta-sync")
+        self._thread = threading.Thread(target=self._loop, name="meta-sync-agendador", daemon=True)
+        self._thread.start()
+        print(f"[SYNC] Agendador iniciado: a cada {self.intervalo:.0f}s (jitter ±{self.jitter:.0f}s), {self.workers} contas em paralelo")
+        return True
+
+    def parar(self):
+        self._parar.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=5)
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._trava:
+            self._trava.close()
+            self._trava = None
+
+    @property
+    def ativo(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    # --- agendamento ---
+
+    def _com_jitter(self, segundos: float) -> float:
+        return max(0.0, segundos + random.uniform(-self.jitter, self.jitter))
+
+    def _atualizar_contas(self):
+        try:
+            contas = {c["account_db_id"]: c for c in listar_contas_sincronizaveis()}
+        except Exception as e:
+            print(f"[SYNC] Falha ao listar contas: {e}")
+            return
+        agora = time.monotonic()
+        with self._cond:
+            for account_db_id in contas.keys() - self._contas.keys():
+                # Primeira execução espalhada dentro da janela de jitter
+                self._proxima[account_db_id] = agora + random.uniform(0, self.jitter)
+                self._status[account_db_id] = {"estado": "agendada", "execucoes": 0}
+            for account_db_id in self._contas.keys() - contas.keys():
+                self._proxima.pop(account_db_id, None)
+                if account_db_id not in self._em_execucao:
+                    self._status.pop(account_db_id, None)
+            self._contas = contas
+
+    def _enfileirar_vencidas(self):
+        agora = time.monotonic()
+        with self._cond:
+            for account_db_id, quando in sorted(self._proxima.items(), key=lambda item: item[1]):
+                if quando > agora or account_db_id in self._enfileiradas or account_db_id in self._em_execucao:
+                    continue
+                conta = self._contas[account_db_id]
+                self._filas.setdefault(conta["user_id"], deque()).append(account_db_id)
+                self._enfileiradas.add(account_db_id)
+                self._status[account_db_id]["estado"] = "na_fila"
+
+    def _proxima_conta(self) -> Optional[Dict[str, Any]]:
+        """Rodízio entre usuários: pega a primeira conta de cada fila cujo token ainda tem vaga."""
+        for _ in range(len(self._filas)):
+            user_id, fila = next(iter(self._filas.items()))
+            self._filas.move_to_end(user_id)
+            for account_db_id in list(fila):
+                conta = self._contas.get(account_db_id)
+                if conta is None:
+                    fila.remove(account_db_id)
+                    self._enfileiradas.discard(account_db_id)
+                    continue
+                if self._execucoes_por_token.get(conta["token"], 0) < self.contas_por_token:
+                    fila.remove(account_db_id)
+                    self._enfileiradas.discard(account_db_id)
+                    if not fila:
+                        del self._filas[user_id]
+                    return conta
+            if not fila:
+                del self._filas[user_id]
+        return None
+
+    def _despachar(self):
+        with self._cond:
+            while len(self._em_execucao) < self.workers:
+                conta = self._proxima_conta()
+                if conta is None:
+                    return
+                token = conta["token"]
+                self._execucoes_por_token[token] = self._execucoes_por_token.get(token, 0) + 1
+                self._em_execucao.add(conta["account_db_id"])
+                self._status[conta["account_db_id"]].update({"estado": "executando", "inicio": _agora_iso()})
+                self._executor.submit(self._executar, conta)
+
+    def _executar(self, conta: Dict[str, Any]):
+        account_db_id = conta["account_db_id"]
+        inicio = time.monotonic()
+        resultado = {}
+        try:
+            usuarios = {}
+            for usuario in conta["usuarios"]:
+                try:
+                    resposta = buscar_dados_meta(conta["identificador_conta"], usuario["user_facebook_id"], incluir_dados=False)
+                    usuarios[usuario["user_id"]] = _resultado_usuario(resposta)
+                except Exception as e:
+                    print(f"[SYNC] Falha ao sincronizar conta {conta['identificador_conta']} (usuário {usuario['user_id']}): {e}")
+                    usuarios[usuario["user_id"]] = {"estado": "erro", "erro": str(e)}
+            erros = [f"usuário {user_id}: {r['erro']}" for user_id, r in usuarios.items() if r["estado"] == "erro"]
+            resultado = {
+                "estado": "erro" if erros else "ok",
+                "erro": "; ".join(erros) if erros else None,
+                "linhas": {k: sum(r.get("linhas", {}).get(k, 0) for r in usuarios.values())
+                           for k in ("inseridos", "atualizados", "pulados", "falhas")},
+                "modo_extracao": next((r["modo_extracao"] for r in usuarios.values() if r.get("modo_extracao")), None),
+                "usuarios": usuarios,
+            }
+        except Exception as e:
+            print(f"[SYNC] Falha ao sincronizar conta {conta['identificador_conta']}: {e}")
+            resultado = {"estado": "erro", "erro": str(e)}
+        finally:
+            duracao = time.monotonic() - inicio
+            with self._cond:
+                token = conta["token"]
+                self._execucoes_por_token[token] -= 1
+                if not self._execucoes_por_token[token]:
+                    del self._execucoes_por_token[token]
+                self._em_execucao.discard(account_db_id)
+                if account_db_id in self._contas:
+                    self._proxima[account_db_id] = time.monotonic() + self._com_jitter(self.intervalo)
+                status = self._status.setdefault(account_db_id, {"execucoes": 0})
+                status.update(resultado)
+                status.update({"fim": _agora_iso(), "duracao_segundos": round(duracao, 2), "execucoes": status.get("execucoes", 0) + 1})
+                self._cond.notify_all()
+            print(f"[SYNC] Conta {conta['identificador_conta']}: {status['estado']} em {duracao:.1f}s")
+
+    def _loop(self):
+        ultima_atualizacao = 0.0
+        while not self._parar.is_set():
+            if time.monotonic() - ultima_atualizacao >= self.verificacao:
+                self._atualizar_contas()
+                ultima_atualizacao = time.monotonic()
+            self._enfileirar_vencidas()
+            self._despachar()
+            with self._cond:
+                # Acorda quando uma conta termina (libera vaga) ou na próxima verificação
+                proximas = [quando for account_db_id, quando in self._proxima.items() if account_db_id not in self._em_execucao]
+                espera = min([self.verificacao] + [max(0.0, quando - time.monotonic()) for quando in proximas])
+                if not self._parar.is_set():
+                    self._cond.wait(timeout=max(espera, 0.05))
+
+    # --- consulta e disparo manual ---
+
+    def executar_agora(self, account_db_id: int = None) -> int:
+        """Antecipa a próxima execução de uma conta (ou de todas). Retorna quantas foram antecipadas."""
+        with self._cond:
+            alvos = [account_db_id] if account_db_id is not None else list(self._proxima)
+            antecipadas = 0
+            for alvo in alvos:
+                if alvo in self._proxima:
+                    self._proxima[alvo] = time.monotonic()
+                    antecipadas += 1
+            self._cond.notify_all()
+        return antecipadas
+
+    def status(self) -> Dict[str, Any]:
+        agora = time.monotonic()
+        with self._cond:
+            contas = []
+            for account_db_id, conta in sorted(self._contas.items()):
+                status = dict(self._status.get(account_db_id, {}))
+                proxima = self._proxima.get(account_db_id)
+                if proxima is not None and account_db_id not in self._em_execucao:
+                    status["proxima_em_segundos"] = round(max(0.0, proxima - agora), 1)
+                contas.append({
+                    "account_id": account_db_id,
+                    "identificador_conta": conta["identificador_conta"],
+                    "nome_conta": conta["nome_conta"],
+                    "user_id": conta["user_id"],
+                    "user_ids": [usuario["user_id"] for usuario in conta["usuarios"]],
+                    **status,
+                })
+            return {
+                "ativo": self.ativo,
+                "intervalo_segundos": self.intervalo,
+                "jitter_segundos": self.jitter,
+                "em_execucao": len(self._em_execucao),
+                "na_fila": len(self._enfileiradas),
+                "contas": contas,
+            }
+
+
+_agendador = None
+_agendador_lock = threading.Lock()
+
+
+def get_agendador() -> AgendadorSincronizacao:
+    global _agendador
+    with _agendador_lock:
+        if _agendador is None:
+            _agendador = AgendadorSincronizacao()
+        return _agendador
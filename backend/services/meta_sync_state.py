@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from database.migrations import garantir_schema
+
+# Guarda, por conta, usuário e nível, o último date_stop sincronizado por completo (watermark).
+# As próximas sincronizações partem daí, menos a janela de reatribuição.
+# É por usuário porque os insights são gravados e lidos por usuário: quem acabou de vincular uma conta
+# já sincronizada por outra pessoa ainda não tem nenhum dado dela.
+# A tabela meta_sync_state é criada pelas migrações (database/migrations.py).
+
+
+def ler_watermarks(conn, account_db_id, user_id) -> Dict[str, str]:
+    """Retorna {nivel: last_date_stop} da conta para o usuário."""
+    garantir_schema(conn)
+    cur = conn.cursor()
+    cur.execute("SELECT nivel, last_date_stop FROM meta_sync_state WHERE account_id = %s AND user_id = %s",
+                (account_db_id, user_id))
+    rows = cur.fetchall()
+    cur.close()
+    return {nivel: last_date_stop for nivel, last_date_stop in rows}
+
+
+def gravar_watermark(conn, account_db_id, user_id, nivel: str, last_date_stop: str):
+    """Avança o watermark do nível (nunca retrocede)."""
+    garantir_schema(conn)
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO meta_sync_state (account_id, user_id, nivel, last_date_stop, updated_at)
+        VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP)
+        ON CONFLICT (account_id, user_id, nivel) DO UPDATE SET
+            last_date_stop = excluded.last_date_stop,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE excluded.last_date_stop > meta_sync_state.last_date_stop
+    """, (account_db_id, user_id, nivel, last_date_stop))
+    conn.commit()
+    cur.close()
+
+
+def inicio_incremental(watermark: Optional[str], inicio_padrao: str, janela_reatribuicao_dias: int) -> str:
+    """
+    Data inicial de uma sincronização incremental: o watermark menos a janela de reatribuição
+    (a Meta ainda revisa conversões de dias recentes). Sem watermark, usa inicio_padrao.
+    inicio_padrao não limita a janela: na virada do ano (padrão = 1º de janeiro) os últimos dias
+    de dezembro ainda são buscados de novo.
+    """
+    if not watermark:
+        return inicio_padrao
+    inicio = datetime.strptime(watermark, "%Y-%m-%d").date() - timedelta(days=janela_reatribuicao_dias)
+    return inicio.strftime("%Y-%m-%d")
+
+
+def cobre_watermark(watermark: Optional[str], since: str) -> bool:
+    """Um intervalo só avança o watermark se começar até o dia seguinte a ele (sem buracos)."""
+    if not watermark:
+        return False
+    seguinte = datetime.strptime(watermark, "%Y-%m-%d").date() + timedelta(days=1)
+    return since <= seguinte.strftime("%Y-%m-%d")
@@ -0,0 +1,211 @@
+"""
+Cópia colunar de account_ads_facebook_dataframe em Parquet, particionada por conta e mês:
+
+    META_PARQUET_DIR/account_id=3/mes=2025-01/insights.parquet
+
+Cada partição é um arquivo só, regravado (atomicamente) quando um lote traz linhas daquele mês.
+A chave e as regras do upsert do banco valem aqui também: a mesma chave substitui a linha anterior e
+data_extracao só muda quando algum valor mudou.
+
+As leituras usam pyarrow.dataset: só as partições das contas/meses pedidos são abertas, o filtro de data
+vai para o leitor do Parquet e só as colunas pedidas são lidas.
+
+As leituras sem fonte explícita (services/meta_extractor.py) só vêm do Parquet para contas exportadas por
+inteiro: exportar_do_banco grava o marcador ".completo" no diretório da conta, e uma falha ao gravar um lote
+da conta no Parquet apaga o marcador (a conta volta a ser lida do banco até a próxima exportação).
+
+Uso (exportar o que já está no banco):
+    python -m services.parquet_store exportar            # todas as contas
+    python -m services.parquet_store exportar 3          # só a conta de id 3
+"""
+import os
+import sys
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from core.config import META_PARQUET_DIR
+from services.insights_dataframe import tipar_tabela, para_dataframe
+from services.meta_loader import COLUNAS_INSIGHTS, COLUNAS_INTEIRAS, COLUNAS_DECIMAIS, CHAVE_INSIGHTS, COLUNAS_ATUALIZAVEIS, preparar_linhas, entidades
+
+ARQUIVO_PARTICAO = "insights.parquet"
+# Marcador de conta com todo o histórico do banco no Parquet ("." na frente: o pyarrow.dataset ignora)
+MARCADOR_COMPLETO = ".completo"
+
+SCHEMA = pa.schema(
+    [("data_extracao", pa.timestamp("us"))]
+    + [
+        (coluna, pa.int64() if coluna in COLUNAS_INTEIRAS or coluna in ("account_id", "user_id")
+         else pa.float64() if coluna in COLUNAS_DECIMAIS
+         else pa.string())
+        for coluna in COLUNAS_INSIGHTS
+    ]
+)
+PARTICOES = pa.schema([("account_id", pa.int64()), ("mes", pa.string())])
+# Colunas gravadas no arquivo (account_id fica no nome do diretório)
+SCHEMA_ARQUIVO = pa.schema([campo for campo in SCHEMA if campo.name != "account_id"])
+
+_locks: Dict[str, threading.Lock] = {}
+_locks_lock = threading.Lock()
+
+
+def diretorio_base() -> str:
+    if os.path.isabs(META_PARQUET_DIR):
+        return META_PARQUET_DIR
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), META_PARQUET_DIR)
+
+
+def _diretorio_particao(account_db_id, mes: str) -> str:
+    return os.path.join(_diretorio_conta(account_db_id), f"mes={mes}")
+
+
+def _lock_particao(caminho: str) -> threading.Lock:
+    with _locks_lock:
+        return _locks.setdefault(caminho, threading.Lock())
+
+
+def _diretorio_conta(account_db_id) -> str:
+    return os.path.join(diretorio_base(), f"account_id={int(account_db_id)}")
+
+
+def conta_completa(account_db_id) -> bool:
+    """Indica se a conta foi exportada por inteiro (e nenhum lote falhou desde então)."""
+    return os.path.exists(os.path.join(_diretorio_conta(account_db_id), MARCADOR_COMPLETO))
+
+
+def marcar_conta_completa(account_db_id):
+    os.makedirs(_diretorio_conta(account_db_id), exist_ok=True)
+    with open(os.path.join(_diretorio_conta(account_db_id), MARCADOR_COMPLETO), "w") as f:
+        f.write(datetime.now().isoformat(timespec="seconds"))
+
+
+def desmarcar_conta_completa(account_db_id):
+    try:
+        os.remove(os.path.join(_diretorio_conta(account_db_id), MARCADOR_COMPLETO))
+    except FileNotFoundError:
+        pass
+
+
+def _mesclar(antigo: Optional[pd.DataFrame], novo: pd.DataFrame) -> pd.DataFrame:
+    """Aplica as regras do upsert: a última linha de cada chave vence; sem mudança, fica a linha (e data_extracao) antiga."""
+    chave = [c for c in CHAVE_INSIGHTS if c != "account_id"]
+    comparadas = chave + [c for c in COLUNAS_ATUALIZAVEIS if c not in chave]
+    partes = [novo.assign(_novo=True)]
+    if antigo is not None and not antigo.empty:
+        if "entidade_id" not in antigo:
+            # Partição gravada antes da chave por nível: calcula a entidade das linhas antigas
+            antigo = antigo.assign(nivel=antigo["nivel"].fillna("ad"))
+            valores = {c: antigo[c].astype(object).where(antigo[c].notna(), None).tolist() for c in ("nivel", "ad_id", "ad_name", "adset_name", "campaign_name")}
+            antigo = antigo.assign(entidade_id=entidades(valores))
+        partes.insert(0, antigo.assign(_novo=False))
+    combinado = pd.concat(partes, ignore_index=True)
+    # Sem entidade a chave não se aplica (como o NULL no índice único do banco): essas linhas ficam todas
+    sem_chave = combinado["entidade_id"].isna()
+    com_chave = combinado[~sem_chave]
+    inalteradas = com_chave["_novo"] & com_chave.duplicated(comparadas, keep="first")
+    com_chave = com_chave[~inalteradas].drop_duplicates(chave, keep="last")
+    return pd.concat([com_chave, combinado[sem_chave]], ignore_index=True).drop(columns="_novo")
+
+
+def gravar_insights_parquet(colunas: Dict[str, list], account_db_id, user_id) -> int:
+    """Grava um lote de registros normalizados ({coluna: valores}) nas partições da conta. Retorna as linhas gravadas."""
+    linhas = preparar_linhas(colunas, account_db_id, user_id)
+    if not linhas:
+        return 0
+    df = pd.DataFrame.from_records(linhas, columns=COLUNAS_INSIGHTS)
+    df.insert(0, "data_extracao", pd.Timestamp(datetime.now().replace(microsecond=0)))
+    return gravar_dataframe_parquet(df, account_db_id)
+
+
+def gravar_dataframe_parquet(df: pd.DataFrame, account_db_id) -> int:
+    df = df.drop(columns=["account_id", "id"], errors="ignore")
+    df["data_extracao"] = pd.to_datetime(df["data_extracao"])
+    meses = df["date_start"].fillna("").astype(str).str[:7].replace("", "sem-data")
+    for mes, parte in df.groupby(meses, sort=False):
+        diretorio = _diretorio_particao(account_db_id, mes)
+        caminho = os.path.join(diretorio, ARQUIVO_PARTICAO)
+        with _lock_particao(caminho):
+            antigo = pq.read_table(caminho).to_pandas() if os.path.exists(caminho) else None
+            mesclado = _mesclar(antigo, parte.reset_index(drop=True))
+            tabela = pa.Table.from_pandas(mesclado[SCHEMA_ARQUIVO.names], schema=SCHEMA_ARQUIVO, preserve_index=False)
+            os.makedirs(diretorio, exist_ok=True)
+            # Arquivo temporário com "." na frente: o pyarrow.dataset ignora enquanto não é renomeado
+            temporario = os.path.join(diretorio, f".{ARQUIVO_PARTICAO}.{threading.get_ident()}.tmp")
+            pq.write_table(tabela, temporario, compression="zstd")
+            os.replace(temporario, caminho)
+    return len(df)
+
+
+def ler_insights_parquet(account_id=None, user_id=None, colunas: Optional[List[str]] = None,
+                         data_inicial: str = None, data_final: str = None, limit: Optional[int] = 5000,
+                         formato: str = "pandas") -> pd.DataFrame:
+    """
+    Lê os insights das partições (mesma ordem do banco: extração mais recente primeiro, depois date_start).
+    colunas limita as colunas lidas; data_inicial/data_final filtram date_start (YYYY-MM-DD).
+    As colunas saem com os mesmos tipos da leitura do banco (services/insights_dataframe.py).
+    """
+    base = diretorio_base()
+    pedidas = [c for c in (colunas or SCHEMA.names) if c in SCHEMA.names] or SCHEMA.names
+    if not os.path.isdir(base):
+        return para_dataframe(tipar_tabela(SCHEMA.empty_table().select(pedidas)), formato)
+
+    dataset = ds.dataset(base, format="parquet", partitioning=ds.partitioning(PARTICOES, flavor="hive"), schema=pa.unify_schemas([SCHEMA_ARQUIVO, PARTICOES]))
+    filtro = None
+    condicoes = []
+    if account_id:
+        condicoes.append(ds.field("account_id") == int(account_id))
+    if user_id:
+        condicoes.append(ds.field("user_id") == int(user_id))
+    if data_inicial:
+        # Partição pelo mês poda os arquivos; o date_start filtra as linhas dentro deles
+        condicoes += [ds.field("mes") >= data_inicial[:7], ds.field("date_start") >= data_inicial]
+    if data_final:
+        condicoes += [ds.field("mes") <= data_final[:7], ds.field("date_start") <= data_final]
+    for condicao in condicoes:
+        filtro = condicao if filtro is None else filtro & condicao
+
+    ordenacao = ["data_extracao", "date_start"]
+    lidas = list(dict.fromkeys(pedidas + ordenacao))
+    tabela = dataset.to_table(columns=lidas, filter=filtro)
+    tabela = tabela.sort_by([("data_extracao", "descending"), ("date_start", "ascending")])
+    if limit:
+        tabela = tabela.slice(0, int(limit))
+    return para_dataframe(tipar_tabela(tabela.select(pedidas)), formato)
+
+
+def exportar_do_banco(account_db_id=None, tamanho_lote: int = 50000) -> int:
+    """
+    Copia para o Parquet o que já está em account_ads_facebook_dataframe e marca as contas exportadas como
+    completas. Retorna as linhas exportadas.
+    """
+    from database.connection import get_db_connection
+    conn = get_db_connection()
+    try:
+        query = "SELECT * FROM account_ads_facebook_dataframe"
+        params = []
+        if account_db_id is not None:
+            query += " WHERE account_id = %s"
+            params.append(account_db_id)
+        query += " ORDER BY account_id, id"
+        total = 0
+        contas = set()
+        for bloco in pd.read_sql(query, conn, params=params, chunksize=tamanho_lote):
+            for conta, parte in bloco.groupby("account_id"):
+                total += gravar_dataframe_parquet(parte[SCHEMA.names].copy(), conta)
+                contas.add(conta)
+        for conta in contas:
+            marcar_conta_completa(conta)
+        return total
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "exportar":
+        print(__doc__)
+        sys.exit(1)
+    conta = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    print(f"{exportar_do_banco(conta)} linhas exportadas para {diretorio_base()}")
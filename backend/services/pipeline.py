@@ -0,0 +1,108 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, Optional
+from core.config import META_FILA_MAXIMA_PAGINAS
+
+# Peças para montar extrações em fluxo (buscar página -> normalizar -> gravar lote) com memória limitada:
+# produtores e consumidor conversam por uma fila de tamanho fixo, então quando a gravação atrasa
+# as buscas ficam bloqueadas em vez de acumular páginas.
+
+_FIM = object()
+
+
+class _Falha:
+    def __init__(self, excecao: Exception):
+        self.excecao = excecao
+
+
+class _FilaCancelavel:
+    def __init__(self, capacidade: Optional[int] = None):
+        self.fila = queue.Queue(maxsize=capacidade or META_FILA_MAXIMA_PAGINAS)
+        self.cancelado = threading.Event()
+
+    def colocar(self, item) -> bool:
+        """Bloqueia enquanto a fila estiver cheia; retorna False se o consumidor desistiu."""
+        while not self.cancelado.is_set():
+            try:
+                self.fila.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def retirar(self):
+        return self.fila.get()
+
+
+def produzir_em_paralelo(tarefas: list, gerar: Callable[[Any], Iterable], max_workers: int, capacidade: Optional[int] = None) -> Iterator[tuple]:
+    """
+    Executa o gerador gerar(tarefa) de cada tarefa em threads e entrega, conforme chegam,
+    tuplas (tarefa, item, None). Uma tarefa que falha entrega (tarefa, None, excecao) e as demais seguem.
+    Se o consumidor parar de iterar, os produtores são encerrados.
+    """
+    if not tarefas:
+        return
+    fila = _FilaCancelavel(capacidade)
+
+    def executar(tarefa):
+        gerador = iter(gerar(tarefa))
+        try:
+            for item in gerador:
+                if not fila.colocar((tarefa, item, None)):
+                    return
+        except Exception as e:
+            fila.colocar((tarefa, None, e))
+        finally:
+            if hasattr(gerador, "close"):
+                gerador.close()
+            fila.colocar(_FIM)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tarefas))))
+    try:
+        for tarefa in tarefas:
+            executor.submit(executar, tarefa)
+        pendentes = len(tarefas)
+        while pendentes:
+            evento = fila.retirar()
+            if evento is _FIM:
+                pendentes -= 1
+                continue
+            yield evento
+    finally:
+        fila.cancelado.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def executar_em_thread(fabrica: Callable[[], Iterable], capacidade: Optional[int] = None) -> Iterator:
+    """
+    Roda o gerador criado por fabrica() inteiro numa thread própria e repassa os itens por uma fila limitada.
+    Usado nas respostas em streaming: o Starlette avança geradores síncronos a cada item numa thread
+    diferente do pool, e conexões SQLite não podem trocar de thread.
+    """
+    fila = _FilaCancelavel(capacidade)
+
+    def executar():
+        gerador = iter(fabrica())
+        try:
+            for item in gerador:
+                if not fila.colocar(item):
+                    return
+        except Exception as e:
+            fila.colocar(_Falha(e))
+        finally:
+            if hasattr(gerador, "close"):
+                gerador.close()
+            fila.colocar(_FIM)
+
+    threading.Thread(target=executar, daemon=True).start()
+    try:
+        while True:
+            item = fila.retirar()
+            if item is _FIM:
+                return
+            if isinstance(item, _Falha):
+                raise item.excecao
+            yield item
+    finally:
+        fila.cancelado.set()
@@ -0,0 +1,49 @@
+import threading
+import time
+from typing import Dict, Optional
+from database.connection import get_db_connection
+from core.config import SETTINGS_CACHE_SEGUNDOS
+
+# Cache em memória da tabela settings: uma consulta carrega todas as chaves, e as leituras seguintes
+# (ex.: a API key do Gemini a cada chamada à IA) não abrem conexão. POST /settings chama invalidar_settings();
+# SETTINGS_CACHE_SEGUNDOS limita por quanto tempo uma alteração feita fora deste processo fica invisível.
+
+_settings: Optional[Dict[str, str]] = None
+_carregado_em = 0.0
+_lock = threading.Lock()
+
+
+def _carregar() -> Dict[str, str]:
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT key, value FROM settings")
+        linhas = cur.fetchall()
+        cur.close()
+    finally:
+        conn.close()
+    return {key: value for key, value in linhas}
+
+
+def obter_settings() -> Dict[str, str]:
+    """Todas as configurações ({key: value}), do cache quando ainda válido."""
+    global _settings, _carregado_em
+    settings = _settings
+    if settings is not None and time.monotonic() - _carregado_em < SETTINGS_CACHE_SEGUNDOS:
+        return settings
+    with _lock:
+        if _settings is None or time.monotonic() - _carregado_em >= SETTINGS_CACHE_SEGUNDOS:
+            _settings = _carregar()
+            _carregado_em = time.monotonic()
+        return _settings
+
+
+def obter_setting(key: str, padrao: Optional[str] = None) -> Optional[str]:
+    return obter_settings().get(key) or padrao
+
+
+def invalidar_settings():
+    """Descarta o cache; a próxima leitura vai ao banco."""
+    global _settings
+    with _lock:
+        _settings = None
@@ -0,0 +1,42 @@
+import threading
+from contextlib import contextmanager
+from core.config import META_MAX_CONCORRENCIA_POR_TOKEN
+
+# Um semáforo por access token: limita as chamadas simultâneas à Graph API feitas com o mesmo token,
+# não importa quantas contas ou níveis estejam sendo extraídos em paralelo.
+_limites = {}
+_semaforos = {}
+_lock = threading.Lock()
+
+
+def definir_limite_token(token: str, limite: int):
+    """Define o limite de concorrência de um token específico (sobrepõe META_MAX_CONCORRENCIA_POR_TOKEN)."""
+    if limite < 1:
+        raise ValueError("O limite de concorrência deve ser pelo menos 1.")
+    with _lock:
+        _limites[token] = limite
+        _semaforos[token] = threading.BoundedSemaphore(limite)
+
+
+def limite_token(token: str) -> int:
+    return _limites.get(token, META_MAX_CONCORRENCIA_POR_TOKEN)
+
+
+def _semaforo(token: str) -> threading.BoundedSemaphore:
+    with _lock:
+        semaforo = _semaforos.get(token)
+        if semaforo is None:
+            semaforo = threading.BoundedSemaphore(limite_token(token))
+            _semaforos[token] = semaforo
+        return semaforo
+
+
+@contextmanager
+def slot_token(token: str):
+    """Ocupa uma vaga de concorrência do token enquanto o bloco executa."""
+    semaforo = _semaforo(token)
+    semaforo.acquire()
+    try:
+        yield
+    finally:
+        semaforo.release()
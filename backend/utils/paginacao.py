@@ -0,0 +1,80 @@
+import base64
+import json
+from datetime import date, datetime, time
+from typing import Any, Dict, Iterable, Iterator, List
+import pandas as pd
+
+# Paginação por cursor e respostas em fluxo para endpoints que devolvem muitas linhas.
+# Os blocos são listas de linhas já codificadas em JSON: a resposta é montada e enviada bloco a bloco,
+# sem nunca existir inteira na memória.
+
+LINHAS_POR_BLOCO = 1000
+
+
+def codificar_cursor(posicao: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(posicao, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str) -> Dict[str, Any]:
+    """Cursor opaco -> posição. ValueError se o cursor for inválido."""
+    try:
+        posicao = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("cursor inválido")
+    if not isinstance(posicao, dict):
+        raise ValueError("cursor inválido")
+    return posicao
+
+
+def _padrao_json(valor: Any) -> str:
+    # Datas em ISO 8601, como o encoder do FastAPI nas respostas que não são em fluxo ("2026-10-18T17:01:39")
+    if isinstance(valor, (datetime, date, time)):
+        return valor.isoformat()
+    return str(valor)
+
+
+def linhas_json(linhas: List[Dict[str, Any]]) -> List[str]:
+    return [json.dumps(linha, default=_padrao_json) for linha in linhas]
+
+
+def blocos_dataframe(df: pd.DataFrame, inicio: int = 0, fim: int = None, tamanho: int = LINHAS_POR_BLOCO) -> Iterator[List[str]]:
+    """Linhas [inicio, fim) do DataFrame codificadas em JSON, um bloco por vez (NaN vira null)."""
+    fim = len(df) if fim is None else min(fim, len(df))
+    for de in range(inicio, fim, tamanho):
+        texto = df.iloc[de:min(de + tamanho, fim)].to_json(orient="records", lines=True, date_format="iso", force_ascii=False)
+        yield texto.splitlines()
+
+
+def fluxo_lista_json(blocos: Iterable[List[str]]) -> Iterator[str]:
+    """[linha, linha, ...] enviado bloco a bloco."""
+    yield "["
+    primeiro = True
+    for bloco in blocos:
+        if not bloco:
+            continue
+        yield ("" if primeiro else ",") + ",".join(bloco)
+        primeiro = False
+    yield "]"
+
+
+def fluxo_objeto_json(campos: Dict[str, Any], chave: str, blocos: Iterable[List[str]]) -> Iterator[str]:
+    """{...campos, chave: [linhas]} com a lista enviada bloco a bloco."""
+    cabecalho = json.dumps(campos, default=_padrao_json)
+    yield cabecalho[:-1] + ("," if campos else "") + json.dumps(chave) + ":"
+    yield from fluxo_lista_json(blocos)
+    yield "}"
+
+
+def fluxo_ndjson(blocos: Iterable[List[str]]) -> Iterator[str]:
+    for bloco in blocos:
+        if bloco:
+            yield "\n".join(bloco) + "\n"
+
+
+# Server-sent events (text/event-stream): um evento por chamada
+CABECALHOS_SSE = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def evento_sse(evento: str, dados: Any) -> str:
+    """event: <evento> / data: <dados em JSON>, numa linha só (quebras de linha do texto vão escapadas no JSON)."""
+    return f"event: {evento}\ndata: {json.dumps(dados, ensure_ascii=False, default=_padrao_json)}\n\n"